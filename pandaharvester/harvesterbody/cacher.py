@@ -88,6 +88,7 @@ class Cacher(AgentBase):
                 mainLog.debug('refresh cache')
                 for inputs in itemsList:
                     _refresh_cache(inputs)
+            mainLog.debug('cache stats {0}'.format(self.dbProxy.get_cache_stats()))
             mainLog.debug('done')
 
 
@@ -72,12 +72,28 @@ class JobFetcher(AgentBase):
                                                   'harvester-{0}'.format(harvester_config.master.harvester_id))
                         if queueConfig.zipPerMB is not None and jobSpec.zipPerMB is None:
                             jobSpec.zipPerMB = queueConfig.zipPerMB
-                        for tmpLFN, fileAttrs in iteritems(jobSpec.get_input_file_attributes()):
-                            # check file status
-                            if tmpLFN not in fileStatMap:
+                        jobSpecs.append(jobSpec)
+                    # check status of all input files at once
+                    inFileAttrsList = [jobSpec.get_input_file_attributes() for jobSpec in jobSpecs]
+                    inLFNs = set()
+                    for inFileAttrs in inFileAttrsList:
+                        inLFNs.update(inFileAttrs)
+                    if len(inLFNs) > 0:
+                        tmpFileStatMap = self.dbProxy.get_file_status_bulk(inLFNs, 'input',
+                                                                           queueConfig.ddmEndpointIn,
+                                                                           'starting')
+                        if tmpFileStatMap is not None:
+                            fileStatMap = tmpFileStatMap
+                        else:
+                            # fall back to lookups per LFN
+                            for tmpLFN in inLFNs:
                                 fileStatMap[tmpLFN] = self.dbProxy.get_file_status(tmpLFN, 'input',
                                                                                    queueConfig.ddmEndpointIn,
                                                                                    'starting')
+                    for jobSpec, inFileAttrs in zip(jobSpecs, inFileAttrsList):
+                        for tmpLFN, fileAttrs in iteritems(inFileAttrs):
+                            if tmpLFN not in fileStatMap:
+                                fileStatMap[tmpLFN] = dict()
                             # make file spec
                             fileSpec = FileSpec()
                             fileSpec.PandaID = jobSpec.PandaID
@@ -97,7 +113,6 @@ class JobFetcher(AgentBase):
                             fileSpec.fileType = 'input'
                             jobSpec.add_in_file(fileSpec)
                         jobSpec.trigger_propagation()
-                        jobSpecs.append(jobSpec)
                     # insert to DB
                     tmpLog.debug("Converting of {0} jobs {1}".format(len(jobs),sw_startconvert.get_elapsed_time()))
                     sw_insertdb =core_utils.get_stopwatch()
@@ -4,6 +4,7 @@ import collections
 import random
 import itertools
 from future.utils import iteritems
+from concurrent.futures import ThreadPoolExecutor
 
 from pandaharvester.harvesterconfig import harvester_config
 from pandaharvester.harvestercore import core_utils
@@ -55,6 +56,18 @@ class Monitor(AgentBase):
             fifoProtectiveDequeue = harvester_config.monitor.fifoProtectiveDequeue
         except AttributeError:
             fifoProtectiveDequeue = True
+        try:
+            fifoMaxChunksPerDequeue = harvester_config.monitor.fifoMaxChunksPerDequeue
+        except AttributeError:
+            fifoMaxChunksPerDequeue = 1
+        try:
+            lockWorkersInBulk = harvester_config.monitor.lockWorkersInBulk
+        except AttributeError:
+            lockWorkersInBulk = False
+        try:
+            watchAccessPoints = harvester_config.payload_interaction.watchAccessPoints
+        except AttributeError:
+            watchAccessPoints = False
         last_DB_cycle_timestamp = 0
         monitor_fifo = self.monitor_fifo
         sleepTime = (fifoSleepTimeMilli / 1000.0) \
@@ -72,10 +85,14 @@ class Monitor(AgentBase):
                 sw_db = core_utils.get_stopwatch()
                 mainLog.debug('starting run with DB')
                 mainLog.debug('getting workers to monitor')
-                workSpecsPerQueue = self.dbProxy.get_workers_to_update(harvester_config.monitor.maxWorkers,
-                                                                       harvester_config.monitor.checkInterval,
-                                                                       harvester_config.monitor.lockInterval,
-                                                                       lockedBy)
+                if lockWorkersInBulk:
+                    get_workers_to_update = self.dbProxy.get_workers_to_update_bulk
+                else:
+                    get_workers_to_update = self.dbProxy.get_workers_to_update
+                workSpecsPerQueue = get_workers_to_update(harvester_config.monitor.maxWorkers,
+                                                          harvester_config.monitor.checkInterval,
+                                                          harvester_config.monitor.lockInterval,
+                                                          lockedBy)
                 mainLog.debug('got {0} queues'.format(len(workSpecsPerQueue)))
                 # loop over all workers
                 for queueName, configIdWorkSpecs in iteritems(workSpecsPerQueue):
@@ -131,17 +148,43 @@ class Monitor(AgentBase):
                         mainLog.debug('FIFO size is {0}'.format(fifo_size))
                         mainLog.debug('starting run with FIFO')
                         try:
-                            obj_gotten = monitor_fifo.get(timeout=1, protective=fifoProtectiveDequeue)
+                            obj_gotten_list = monitor_fifo.get_many(fifoMaxChunksPerDequeue, timeout=1,
+                                                                    protective=fifoProtectiveDequeue,
+                                                                    max_score=time.time())
                         except Exception as errStr:
                             mainLog.error('failed to get object from FIFO: {0}'.format(errStr))
                         else:
-                            if obj_gotten is not None:
+                            if len(obj_gotten_list) == 0:
+                                mainLog.debug('got nothing in FIFO')
+                            else:
+                                mainLog.debug('got {0} chunks from FIFO'.format(len(obj_gotten_list)))
+                            for i_obj, obj_gotten in enumerate(obj_gotten_list):
+                                if to_break:
+                                    # put back chunks not to be checked in this cycle
+                                    try:
+                                        monitor_fifo.put_many([(_obj.item, _obj.score)
+                                                               for _obj in obj_gotten_list[i_obj:]])
+                                    except Exception as errStr:
+                                        mainLog.error('failed to put back objects to FIFO: {0}'.format(errStr))
+                                    if fifoProtectiveDequeue:
+                                        obj_dequeued_id_list.extend([_obj.id for _obj in obj_gotten_list[i_obj:]])
+                                    break
                                 sw_fifo = core_utils.get_stopwatch()
                                 if fifoProtectiveDequeue:
                                     obj_dequeued_id_list.append(obj_gotten.id)
-                                queueName, workSpecsList = obj_gotten.item
+                                queueName, workSpecsList = obj_gotten.item[:2]
+                                # chunks pushed by access point watcher are checked only once
+                                isOneShot = len(obj_gotten.item) > 2 and obj_gotten.item[2]
                                 mainLog.debug('got a chunk of {0} workers of {1} from FIFO'.format(len(workSpecsList), queueName) + sw.get_elapsed_time())
                                 sw.reset()
+                                # take workers from DB not to check with stale copies when access point watcher
+                                # pushes workers in regular chunks to FIFO
+                                if watchAccessPoints or isOneShot:
+                                    tmpWorkSpecsList = self.refresh_workers(workSpecsList, mainLog)
+                                    if tmpWorkSpecsList is None:
+                                        mainLog.error('failed to reload workers from DB. Use workers from FIFO')
+                                    else:
+                                        workSpecsList = tmpWorkSpecsList
                                 configID = None
                                 for workSpecs in workSpecsList:
                                     if configID is None and len(workSpecs) > 0:
@@ -154,10 +197,17 @@ class Monitor(AgentBase):
                                             else:
                                                 workSpec.pandaid_list = []
                                             workSpec.force_update('pandaid_list')
-                                retVal = self.monitor_agent_core(lockedBy, queueName, workSpecsList, from_fifo=True,
-                                                                 config_id=configID)
+                                if workSpecsList:
+                                    retVal = self.monitor_agent_core(lockedBy, queueName, workSpecsList, from_fifo=True,
+                                                                     config_id=configID)
+                                else:
+                                    mainLog.debug('no active worker in the chunk')
+                                    retVal = None
                                 if retVal is not None:
                                     workSpecsToEnqueue, workSpecsToEnqueueToHead, timeNow_timestamp, fifoCheckInterval = retVal
+                                    if isOneShot:
+                                        # workers are still in regular chunks. Only ones to be post-processed go to head
+                                        workSpecsToEnqueue = []
                                     try:
                                         if len(obj_to_enqueue_dict[queueName][0]) + len(workSpecsToEnqueue) <= fifoMaxWorkersPerChunk:
                                             obj_to_enqueue_dict[queueName][0].extend(workSpecsToEnqueue)
@@ -180,7 +230,9 @@ class Monitor(AgentBase):
                                     except Exception as errStr:
                                         mainLog.error('failed to gather workers for FIFO head: {0}'.format(errStr))
                                         to_break = True
-                                    mainLog.debug('checked {0} workers from FIFO'.format(len(workSpecsList)) + sw.get_elapsed_time())
+                                    mainLog.debug('checked {0} workers from FIFO{1}'.format(len(workSpecsList),
+                                                                                            ' once' if isOneShot else '')
+                                                  + sw.get_elapsed_time())
                                 else:
                                     mainLog.debug('monitor_agent_core returned None. Skipped putting to FIFO')
                                 if sw_fifo.get_elapsed_time_in_sec() > harvester_config.monitor.lockInterval:
@@ -188,10 +240,8 @@ class Monitor(AgentBase):
                                 else:
                                     mainLog.debug('done a FIFO cycle' + sw_fifo.get_elapsed_time())
                                     n_loops_hit += 1
-                                if to_break:
-                                    break
-                            else:
-                                mainLog.debug('got nothing in FIFO')
+                            if to_break:
+                                break
                     else:
                         mainLog.debug('workers in FIFO too young to check. Skipped')
                         if self.singleMode:
@@ -323,11 +373,10 @@ class Monitor(AgentBase):
                     nJobsToReFill = tmpOut['nJobsToReFill']
                     pandaIDs = tmpOut['pandaIDs']
                     isChecked = tmpOut['isChecked']
-                    tmpStr = 'newStatus={0} monitoredStatus={1} diag={2} '
-                    tmpStr += 'postProcessed={3} files={4}'
-                    tmpLog.debug(tmpStr.format(newStatus, monStatus, diagMessage,
-                                               workSpec.is_post_processed(),
-                                               str(filesToStageOut)))
+                    tmpStr = 'newStatus=%s monitoredStatus=%s diag=%s '
+                    tmpStr += 'postProcessed=%s files=%s'
+                    tmpLog.debug(tmpStr, newStatus, monStatus, diagMessage,
+                                 workSpec.is_post_processed(), filesToStageOut)
                     iWorker += 1
                     # check status
                     if newStatus not in WorkSpec.ST_LIST:
@@ -419,7 +468,7 @@ class Monitor(AgentBase):
                             tmpLog = self.make_logger(_logger,
                                                       'id={0} PandaID={1}'.format(lockedBy, jobSpec.PandaID),
                                                       method_name='run')
-                            tmpLog.debug('new status={0} subStatus={1} status_in_metadata={2}'.format(
+                            tmpLog.debug(lambda: 'new status={0} subStatus={1} status_in_metadata={2}'.format(
                                 jobSpec.status,
                                 jobSpec.subStatus,
                                 jobSpec.get_job_status_from_attributes()))
@@ -503,6 +552,89 @@ class Monitor(AgentBase):
         tmpQueLog.debug('done')
         return retVal
 
+    # reload workers in a chunk dequeued from FIFO since they could have been updated by other chunks,
+    # e.g. ones pushed by access point watcher. Only parameters to schedule FIFO checks are taken
+    # from the dequeued copies. Return None if failed
+    def refresh_workers(self, workSpecsList, tmp_log):
+        workerIDs = [workSpec.workerID for workSpecs in workSpecsList for workSpec in workSpecs]
+        workSpecsMap = self.dbProxy.get_workers_with_ids(workerIDs)
+        if workSpecsMap is None:
+            return None
+        newWorkSpecsList = []
+        for workSpecs in workSpecsList:
+            newWorkSpecs = []
+            for workSpec in workSpecs:
+                newWorkSpec = workSpecsMap.get(workSpec.workerID)
+                if newWorkSpec is None or newWorkSpec.is_final_status():
+                    tmp_log.debug('skipped workerID=%s which is gone or already in final status', workSpec.workerID)
+                    continue
+                for tmpKey in ['lastCheckAt', 'lastForceEnqueueAt', 'startFifoPreemptAt']:
+                    _bool, tmpVal = workSpec.get_work_params(tmpKey)
+                    if _bool:
+                        newWorkSpec.set_work_params({tmpKey: tmpVal})
+                newWorkSpec.modificationTime = workSpec.modificationTime
+                newWorkSpec.force_update('modificationTime')
+                newWorkSpec.lockedBy = None
+                newWorkSpec.force_update('lockedBy')
+                newWorkSpec.pandaid_list = workSpec.pandaid_list
+                newWorkSpecs.append(newWorkSpec)
+            if newWorkSpecs:
+                newWorkSpecsList.append(newWorkSpecs)
+        return newWorkSpecsList
+
+    # check if job is requested by a worker waiting for jobs
+    def get_job_requested(self, messenger, workspec):
+        if workspec.has_work_params('finalMonStatus'):
+            return None
+        if (workspec.hasJob == 0 and workspec.mapType != WorkSpec.MT_NoJob) \
+                or workspec.nJobsToReFill in [0, None]:
+            return messenger.job_requested(workspec)
+        return None
+
+    # get information from messenger for a worker
+    def get_messenger_info(self, messenger, workspec, worker_heartbeat_limit):
+        retMap = dict()
+        retMap['killRequested'] = messenger.kill_requested(workspec)
+        if worker_heartbeat_limit:
+            retMap['isAlive'] = messenger.is_alive(workspec, worker_heartbeat_limit)
+        retMap['workAttributes'] = messenger.get_work_attributes(workspec)
+        retMap['filesToStageOut'] = messenger.get_files_to_stage_out(workspec)
+        if workspec.eventsRequest in [WorkSpec.EV_useEvents, WorkSpec.EV_requestEvents]:
+            retMap['eventsToUpdate'] = messenger.events_to_update(workspec)
+        if workspec.eventsRequest == WorkSpec.EV_useEvents:
+            retMap['eventsRequestParams'] = messenger.events_requested(workspec)
+        # PandaIDs for pull model
+        if workspec.mapType == WorkSpec.MT_NoJob:
+            retMap['pandaIDs'] = messenger.get_panda_ids(workspec)
+        return retMap
+
+    # call messenger for workers or chunks of workers with threads, keeping the order
+    def map_messenger_calls(self, func, messenger, workspec_list, n_threads):
+        if n_threads <= 1 or len(workspec_list) <= 1:
+            return [func(messenger, workSpec) for workSpec in workspec_list]
+        with ThreadPoolExecutor(min(n_threads, len(workspec_list))) as pool:
+            return list(pool.map(lambda _workspec: func(messenger, _workspec), workspec_list))
+
+    # get information from messenger for workers, using the bulk method if the messenger has it
+    def get_messenger_info_list(self, messenger, workspec_list, worker_heartbeat_limit, n_threads):
+        if not hasattr(messenger, 'get_monitor_info'):
+            return self.map_messenger_calls(
+                lambda _messenger, _workspec: self.get_messenger_info(_messenger, _workspec, worker_heartbeat_limit),
+                messenger, workspec_list, n_threads)
+        return self.map_messenger_bulk_calls(
+            lambda _messenger, _workspecs: _messenger.get_monitor_info(_workspecs, worker_heartbeat_limit),
+            messenger, workspec_list, n_threads)
+
+    # call a bulk messenger method for a chunk of workers per thread, keeping the order
+    def map_messenger_bulk_calls(self, func, messenger, workspec_list, n_threads):
+        chunkSize = max(1, -(-len(workspec_list) // max(n_threads, 1)))
+        retList = []
+        for tmpList in self.map_messenger_calls(func, messenger,
+                                                list(core_utils.create_shards(workspec_list, chunkSize)),
+                                                n_threads):
+            retList += tmpList
+        return retList
+
     # wrapper for checkWorkers
     def check_workers(self, mon_core, messenger, all_workers, queue_config, tmp_log, from_fifo):
         # check timeout value
@@ -517,6 +649,41 @@ class Monitor(AgentBase):
             workerQueueTimeLimit = harvester_config.monitor.workerQueueTimeLimit
         except AttributeError:
             workerQueueTimeLimit = 172800
+        # number of threads for messenger I/O
+        try:
+            nMessengerThreads = int(queue_config.messenger['monitor_threads'])
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            if isinstance(e, (TypeError, ValueError)):
+                tmp_log.warning('invalid monitor_threads={0} in queue config. Use default'.format(
+                    queue_config.messenger['monitor_threads']))
+            try:
+                nMessengerThreads = int(harvester_config.monitor.nMessengerThreads)
+            except (AttributeError, TypeError, ValueError):
+                nMessengerThreads = 1
+        # check if the queue configuration requires checking for worker heartbeat
+        try:
+            worker_heartbeat_limit = int(queue_config.messenger['worker_heartbeat'])
+        except (AttributeError, KeyError):
+            worker_heartbeat_limit = None
+        # job requests to check before the plugin
+        sw_messenger = core_utils.get_stopwatch()
+        useBulkMessenger = hasattr(messenger, 'get_monitor_info') and hasattr(messenger, 'get_job_requested_bulk')
+        if useBulkMessenger:
+            # take job requests only of workers without jobs since get_monitor_info reads and renames other files.
+            # Those of workers checked by the plugin are taken later from the same snapshots as other information
+            workersToProbe = [workSpec for workSpec in all_workers
+                              if not workSpec.has_work_params('finalMonStatus')
+                              and workSpec.hasJob == 0 and workSpec.mapType != WorkSpec.MT_NoJob]
+            jobRequestedMap = dict(zip([workSpec.workerID for workSpec in workersToProbe],
+                                       self.map_messenger_bulk_calls(
+                                           lambda _messenger, _workspecs: _messenger.get_job_requested_bulk(_workspecs),
+                                           messenger, workersToProbe, nMessengerThreads)))
+        else:
+            jobRequestedMap = dict(zip([workSpec.workerID for workSpec in all_workers],
+                                       self.map_messenger_calls(self.get_job_requested, messenger, all_workers,
+                                                                nMessengerThreads)))
+        messengerTime = sw_messenger.get_elapsed_time_in_sec(True)
+        refillWorkerIDs = set()
         workersToCheck = []
         thingsToPostProcess = []
         retMap = dict()
@@ -537,7 +704,7 @@ class Monitor(AgentBase):
                 # job-level late binding
                 if workSpec.hasJob == 0 and workSpec.mapType != WorkSpec.MT_NoJob:
                     # check if job is requested
-                    jobRequested = messenger.job_requested(workSpec)
+                    jobRequested = jobRequestedMap[workSpec.workerID]
                     if jobRequested:
                         # set ready when job is requested
                         workStatus = WorkSpec.ST_ready
@@ -545,9 +712,12 @@ class Monitor(AgentBase):
                         workStatus = workSpec.status
                 elif workSpec.nJobsToReFill in [0, None]:
                     # check if job is requested to refill free slots
-                    jobRequested = messenger.job_requested(workSpec)
-                    if jobRequested:
-                        nJobsToReFill = jobRequested
+                    if useBulkMessenger:
+                        refillWorkerIDs.add(workSpec.workerID)
+                    else:
+                        jobRequested = jobRequestedMap[workSpec.workerID]
+                        if jobRequested:
+                            nJobsToReFill = jobRequested
                     workersToCheck.append(workSpec)
                 else:
                     workersToCheck.append(workSpec)
@@ -566,6 +736,7 @@ class Monitor(AgentBase):
         # check workers
         tmp_log.debug('checking workers with plugin')
         try:
+            sw_plugin = core_utils.get_stopwatch()
             if workersToCheck:
                 tmpStat, tmpOut = mon_core.check_workers(workersToCheck)
                 if not tmpStat:
@@ -577,12 +748,20 @@ class Monitor(AgentBase):
             else:
                 tmp_log.debug('Nothing to be checked with plugin')
                 tmpOut = []
+            pluginTime = sw_plugin.get_elapsed_time_in_sec(True)
+            # get information from messenger after checking with plugin not to miss outputs of finished workers
+            sw_messenger.reset()
+            workersAndStatus = list(itertools.chain(zip(workersToCheck, tmpOut), thingsToPostProcess))
+            messengerInfoList = self.get_messenger_info_list(messenger,
+                                                             [workSpec for workSpec, _ in workersAndStatus],
+                                                             worker_heartbeat_limit, nMessengerThreads)
+            messengerTime += sw_messenger.get_elapsed_time_in_sec(True)
+            tmp_log.debug('{0} workers : messenger took {1:.3f} sec with {2} threads, plugin took {3:.3f} sec'.format(
+                len(all_workers), messengerTime, nMessengerThreads, pluginTime))
             timeNow = datetime.datetime.utcnow()
-            for workSpec, (newStatus, diagMessage) in itertools.chain(
-                    zip(workersToCheck, tmpOut), thingsToPostProcess):
+            for (workSpec, (newStatus, diagMessage)), messengerInfo in zip(workersAndStatus, messengerInfoList):
                 workerID = workSpec.workerID
-                tmp_log.debug('Going to check workerID={0}'.format(workerID))
-                pandaIDs = []
+                tmp_log.debug('Going to check workerID=%s', workerID)
                 if workerID in retMap:
                     # failed to check status
                     if newStatus is None:
@@ -601,7 +780,7 @@ class Monitor(AgentBase):
                             # use original status
                             newStatus = workSpec.status
                     # request kill
-                    if messenger.kill_requested(workSpec):
+                    if messengerInfo['killRequested']:
                         tmp_log.debug('kill workerID={0} as requested'.format(workerID))
                         self.dbProxy.kill_worker(workSpec.workerID)
                     # stuck queuing for too long
@@ -613,41 +792,25 @@ class Monitor(AgentBase):
                         diagMessage = 'Killed by Harvester due to worker queuing too long' + diagMessage
                         workSpec.set_pilot_error(PilotErrors.ERR_FAILEDBYSERVER, diagMessage)
                     # expired heartbeat - only when requested in the configuration
-                    try:
-                        # check if the queue configuration requires checking for worker heartbeat
-                        worker_heartbeat_limit = int(queue_config.messenger['worker_heartbeat'])
-                    except (AttributeError, KeyError):
-                        worker_heartbeat_limit = None
-                    tmp_log.debug(
-                        'workerID={0} heartbeat limit is configured to {1}'.format(workerID,
-                                                                                   worker_heartbeat_limit))
+                    tmp_log.debug('workerID=%s heartbeat limit is configured to %s',
+                                  workerID, worker_heartbeat_limit)
                     if worker_heartbeat_limit:
-                        if messenger.is_alive(workSpec, worker_heartbeat_limit):
-                            tmp_log.debug('heartbeat for workerID={0} is valid'.format(workerID))
+                        if messengerInfo['isAlive']:
+                            tmp_log.debug('heartbeat for workerID=%s is valid', workerID)
                         else:
                             tmp_log.debug('heartbeat for workerID={0} expired: sending kill request'.format(
                                 workerID))
                             self.dbProxy.kill_worker(workSpec.workerID)
                             diagMessage = 'Killed by Harvester due to worker heartbeat expired. ' + diagMessage
                             workSpec.set_pilot_error(PilotErrors.ERR_FAILEDBYSERVER, diagMessage)
-                    # get work attributes
-                    workAttributes = messenger.get_work_attributes(workSpec)
-                    retMap[workerID]['workAttributes'] = workAttributes
-                    # get output files
-                    filesToStageOut = messenger.get_files_to_stage_out(workSpec)
-                    retMap[workerID]['filesToStageOut'] = filesToStageOut
-                    # get events to update
-                    if workSpec.eventsRequest in [WorkSpec.EV_useEvents, WorkSpec.EV_requestEvents]:
-                        eventsToUpdate = messenger.events_to_update(workSpec)
-                        retMap[workerID]['eventsToUpdate'] = eventsToUpdate
-                    # request events
-                    if workSpec.eventsRequest == WorkSpec.EV_useEvents:
-                        eventsRequestParams = messenger.events_requested(workSpec)
-                        retMap[workerID]['eventsRequestParams'] = eventsRequestParams
-                    # get PandaIDs for pull model
-                    if workSpec.mapType == WorkSpec.MT_NoJob:
-                        pandaIDs = messenger.get_panda_ids(workSpec)
-                    retMap[workerID]['pandaIDs'] = pandaIDs
+                    # work attributes, output files, events, and PandaIDs from messenger
+                    for tmpKey in ['workAttributes', 'filesToStageOut', 'eventsToUpdate', 'eventsRequestParams',
+                                   'pandaIDs']:
+                        if tmpKey in messengerInfo:
+                            retMap[workerID][tmpKey] = messengerInfo[tmpKey]
+                    # job request to refill free slots
+                    if workerID in refillWorkerIDs and messengerInfo['jobRequested']:
+                        retMap[workerID]['nJobsToReFill'] = messengerInfo['jobRequested']
                     # keep original new status
                     retMap[workerID]['monStatus'] = newStatus
                     # set running or idle while there are events to update or files to stage out
@@ -678,7 +841,7 @@ class Monitor(AgentBase):
                     retMap[workerID]['newStatus'] = newStatus
                     retMap[workerID]['diagMessage'] = diagMessage
                 else:
-                    tmp_log.debug('workerID={0} not in retMap'.format(workerID))
+                    tmp_log.debug('workerID=%s not in retMap', workerID)
             return True, retMap
         except Exception:
             core_utils.dump_error_message(tmp_log)
@@ -1,5 +1,7 @@
 import datetime
 
+from future.utils import iteritems
+
 from pandaharvester.harvesterconfig import harvester_config
 from pandaharvester.harvestercore import core_utils
 from pandaharvester.harvestercore.db_proxy_pool import DBProxyPool as DBProxy
@@ -118,8 +120,9 @@ class Preparator(AgentBase):
                                                                 lockedBy,
                                                                 'preparing')
             mainLog.debug('got {0} jobs to prepare'.format(len(jobsToTrigger)))
+            # get status and groups of all preparing files at once
+            fileStatMap, groupMap = self.get_file_status_maps(jobsToTrigger)
             # loop over all jobs
-            fileStatMap = dict()
             for jobSpec in jobsToTrigger:
                 tmpLog = self.make_logger(_logger, 'PandaID={0}'.format(jobSpec.PandaID),
                                           method_name='run')
@@ -163,8 +166,11 @@ class Preparator(AgentBase):
                                 # the file is ready
                                 fileSpec.status = 'ready'
                                 # set group info if any
-                                groupInfo = self.dbProxy.get_group_for_file(fileSpec.lfn, 'input',
-                                                                            queueConfig.ddmEndpointIn)
+                                if queueConfig.ddmEndpointIn in groupMap:
+                                    groupInfo = groupMap[queueConfig.ddmEndpointIn].get(fileSpec.lfn)
+                                else:
+                                    groupInfo = self.dbProxy.get_group_for_file(fileSpec.lfn, 'input',
+                                                                                queueConfig.ddmEndpointIn)
                                 if groupInfo is not None:
                                     fileSpec.groupID = groupInfo['groupID']
                                     fileSpec.groupStatus = groupInfo['groupStatus']
@@ -231,3 +237,37 @@ class Preparator(AgentBase):
             if self.terminated(harvester_config.preparator.sleepTime):
                 mainLog.debug('terminated')
                 return
+
+    # get status counts and groups of preparing files of jobs with bulk queries per endpoint
+    def get_file_status_maps(self, job_spec_list):
+        lfnsMap = dict()
+        for jobSpec in job_spec_list:
+            configID = jobSpec.configID
+            if not core_utils.dynamic_plugin_change():
+                configID = None
+            if not self.queueConfigMapper.has_queue(jobSpec.computingSite, configID):
+                continue
+            queueConfig = self.queueConfigMapper.get_queue(jobSpec.computingSite, configID)
+            lfnsMap.setdefault(queueConfig.ddmEndpointIn, set())
+            for fileSpec in jobSpec.inFiles:
+                if fileSpec.status == 'preparing':
+                    lfnsMap[queueConfig.ddmEndpointIn].add(fileSpec.lfn)
+        fileStatMap = dict()
+        groupMap = dict()
+        for endpoint, lfns in iteritems(lfnsMap):
+            fileStatMap[endpoint] = dict()
+            if len(lfns) == 0:
+                continue
+            tmpFileStatMap = self.dbProxy.get_file_status_bulk(lfns, 'input', endpoint, 'starting')
+            if tmpFileStatMap is None:
+                continue
+            fileStatMap[endpoint] = tmpFileStatMap
+            # groups are needed only for ready files
+            readyLFNs = [lfn for lfn, statMap in iteritems(tmpFileStatMap) if 'ready' in statMap]
+            if len(readyLFNs) > 0:
+                tmpGroupMap = self.dbProxy.get_groups_for_files(readyLFNs, 'input', endpoint)
+            else:
+                tmpGroupMap = dict()
+            if tmpGroupMap is not None:
+                groupMap[endpoint] = tmpGroupMap
+        return fileStatMap, groupMap
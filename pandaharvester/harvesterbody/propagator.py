@@ -73,14 +73,14 @@ class Propagator(AgentBase):
                 mainLog.debug('update_jobs for {0} jobs took {1}'.format(len(jobListToUpdate),
                                                                               sw.get_elapsed_time()))
                 # logging
+                jobListToRelease = []
                 for tmpJobSpec, tmpRet in zip(jobListToSkip+jobListToCheck+jobListToUpdate, retList):
                     if tmpRet['StatusCode'] == 0:
                         if tmpJobSpec in jobListToUpdate:
-                            mainLog.debug('updated PandaID={0} status={1}'.format(tmpJobSpec.PandaID,
-                                                                                  tmpJobSpec.status))
+                            mainLog.debug('updated PandaID=%s status=%s', tmpJobSpec.PandaID, tmpJobSpec.status)
                         else:
-                            mainLog.debug('skip updating PandaID={0} status={1}'.format(tmpJobSpec.PandaID,
-                                                                                        tmpJobSpec.status))
+                            mainLog.debug('skip updating PandaID=%s status=%s', tmpJobSpec.PandaID,
+                                          tmpJobSpec.status)
                         # release job
                         tmpJobSpec.propagatorLock = None
                         if tmpJobSpec.is_final_status() and tmpJobSpec.status == tmpJobSpec.get_status():
@@ -113,10 +113,22 @@ class Propagator(AgentBase):
                                                                PilotErrors.pilotError[PilotErrors.ERR_PANDAKILL])
                                     tmpJobSpec.stateChangeTime = datetime.datetime.utcnow()
                                     tmpJobSpec.trigger_propagation()
-                        self.dbProxy.update_job(tmpJobSpec, {'propagatorLock': self.get_pid()})
+                        jobListToRelease.append(tmpJobSpec)
                     else:
                         mainLog.error('failed to update PandaID={0} status={1}'.format(tmpJobSpec.PandaID,
                                                                                        tmpJobSpec.status))
+                # update jobs in local database
+                sw.reset()
+                tmpRetList = self.dbProxy.update_jobs_bulk(jobListToRelease, {'propagatorLock': self.get_pid()})
+                if tmpRetList is None:
+                    mainLog.error('failed to release {0} jobs in local database'.format(len(jobListToRelease)))
+                else:
+                    for tmpJobSpec, nRow in zip(jobListToRelease, tmpRetList):
+                        if nRow == 0:
+                            mainLog.warning('failed to release PandaID={0} since locked by another'.format(
+                                tmpJobSpec.PandaID))
+                mainLog.debug('update_jobs_bulk for {0} jobs took {1}'.format(len(jobListToRelease),
+                                                                              sw.get_elapsed_time()))
             mainLog.debug('getting workers to propagate')
             sw.reset()
             workSpecs = self.dbProxy.get_workers_to_propagate(harvester_config.propagator.maxWorkers,
@@ -134,10 +146,11 @@ class Propagator(AgentBase):
                 if retList is None:
                     mainLog.error('failed to update workers with {0}'.format(tmpErrStr))
                 else:
+                    workListToUpdate = []
                     for tmpWorkSpec, tmpRet in zip(workList, retList):
                         if tmpRet:
-                            mainLog.debug('updated workerID={0} status={1}'.format(tmpWorkSpec.workerID,
-                                                                                   tmpWorkSpec.status))
+                            mainLog.debug('updated workerID=%s status=%s', tmpWorkSpec.workerID,
+                                          tmpWorkSpec.status)
                             # update logs
                             for logFilePath, logOffset, logSize, logRemoteName in \
                                     tmpWorkSpec.get_log_files_to_upload():
@@ -149,10 +162,20 @@ class Propagator(AgentBase):
                             # disable further update
                             if tmpWorkSpec.is_final_status():
                                 tmpWorkSpec.disable_propagation()
-                            self.dbProxy.update_worker(tmpWorkSpec, {'workerID': tmpWorkSpec.workerID})
+                            workListToUpdate.append(tmpWorkSpec)
                         else:
                             mainLog.error('failed to update workerID={0} status={1}'.format(tmpWorkSpec.workerID,
                                                                                             tmpWorkSpec.status))
+                    # update workers in local database
+                    tmpRetList = self.dbProxy.update_workers_bulk(workListToUpdate)
+                    if tmpRetList is None:
+                        mainLog.error('failed to update {0} workers in local database'.format(
+                            len(workListToUpdate)))
+                    else:
+                        for tmpWorkSpec, nRow in zip(workListToUpdate, tmpRetList):
+                            if nRow == 0:
+                                mainLog.warning('failed to update workerID={0} in local database'.format(
+                                    tmpWorkSpec.workerID))
             mainLog.debug('update_workers for {0} workers took {1}'.format(iWorkers,
                                                                       sw.get_elapsed_time()))
             mainLog.debug('getting commands')
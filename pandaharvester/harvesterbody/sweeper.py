@@ -1,4 +1,7 @@
+import threading
 from future.utils import iteritems
+from concurrent.futures import ThreadPoolExecutor
+
 from pandaharvester.harvesterconfig import harvester_config
 from pandaharvester.harvestercore import core_utils
 from pandaharvester.harvestercore.db_proxy_pool import DBProxyPool as DBProxy
@@ -93,6 +96,11 @@ class Sweeper(AgentBase):
                                 }
             workersForCleanup = self.dbProxy.get_workers_for_cleanup(harvester_config.sweeper.maxWorkers,
                                                                      statusTimeoutMap)
+            # number of threads to sweep workers and to clean up messenger stuff
+            try:
+                nCleanupThreads = harvester_config.sweeper.nCleanupThreads
+            except AttributeError:
+                nCleanupThreads = 1
             mainLog.debug('got {0} queues for workers cleanup'.format(len(workersForCleanup)))
             sw = core_utils.get_stopwatch()
             for queueName, configIdWorkSpecList in iteritems(workersForCleanup):
@@ -122,21 +130,24 @@ class Sweeper(AgentBase):
                         core_utils.dump_error_message(mainLog)
                     mainLog.debug('made sure workers to clean up are all terminated')
                     # start cleanup
-                    for workspec in workspec_list:
-                        tmpLog = self.make_logger(_logger, 'workerID={0}'.format(workspec.workerID),
-                                                  method_name='run')
-                        try:
-                            tmpLog.debug('start cleaning up one worker')
-                            # sweep worker
-                            tmpStat, tmpOut = sweeperCore.sweep_worker(workspec)
-                            tmpLog.debug('swept_worker with status={0} diag={1}'.format(tmpStat, tmpOut))
-                            tmpLog.debug('start messenger cleanup')
-                            mc_tmpStat, mc_tmpOut = messenger.clean_up(workspec)
-                            tmpLog.debug('messenger cleaned up with status={0} diag={1}'.format(mc_tmpStat, mc_tmpOut))
-                            if tmpStat:
-                                self.dbProxy.delete_worker(workspec.workerID)
-                        except Exception:
-                            core_utils.dump_error_message(tmpLog)
+                    if nCleanupThreads > 1 and n_workers > 1:
+                        # plugins used in each thread
+                        threadLocal = threading.local()
+                        with ThreadPoolExecutor(min(nCleanupThreads, n_workers)) as pool:
+                            tmpList = list(pool.map(lambda _workspec: self.clean_up_worker_in_thread(threadLocal,
+                                                                                                     queueConfig,
+                                                                                                     sweeperCore,
+                                                                                                     messenger,
+                                                                                                     _workspec),
+                                                    workspec_list))
+                    else:
+                        tmpList = [self.clean_up_worker(sweeperCore, messenger, workspec)
+                                   for workspec in workspec_list]
+                    mainLog.debug('swept {0} workers'.format(n_workers) + sw.get_elapsed_time())
+                    # delete swept workers from DB
+                    workerIDs = [workspec.workerID for workspec, tmpStat in zip(workspec_list, tmpList) if tmpStat]
+                    if len(workerIDs) > 0 and not self.dbProxy.delete_workers(workerIDs):
+                        mainLog.error('failed to delete {0} workers'.format(len(workerIDs)))
                     mainLog.debug('done cleaning up {0} workers'.format(n_workers) + sw.get_elapsed_time())
             mainLog.debug('done all cleanup' + sw_cleanup.get_elapsed_time())
             # old-job-deletion stage
@@ -153,3 +164,42 @@ class Sweeper(AgentBase):
             if self.terminated(harvester_config.sweeper.sleepTime):
                 mainLog.debug('terminated')
                 return
+
+    # get a plugin to use in a cleanup thread. The same instance is used only if thread-safe. Otherwise an instance
+    # is made for each thread, or is taken from instances cached by the plugin factory for the thread
+    def get_plugin_for_thread(self, plugin_conf, impl):
+        if getattr(impl, 'threadSafe', False):
+            return impl
+        return self.pluginFactory.get_plugin(plugin_conf)
+
+    # sweep a worker and clean up messenger stuff in a cleanup thread with plugins for the thread
+    def clean_up_worker_in_thread(self, thread_local, queue_config, sweeper_core, messenger, workspec):
+        try:
+            sweeperCore, tmpMessenger = thread_local.plugins
+        except AttributeError:
+            try:
+                sweeperCore = self.get_plugin_for_thread(queue_config.sweeper, sweeper_core)
+                tmpMessenger = self.get_plugin_for_thread(queue_config.messenger, messenger)
+            except Exception:
+                tmpLog = self.make_logger(_logger, 'workerID={0}'.format(workspec.workerID),
+                                          method_name='clean_up_worker_in_thread')
+                core_utils.dump_error_message(tmpLog)
+                return False
+            thread_local.plugins = (sweeperCore, tmpMessenger)
+        return self.clean_up_worker(sweeperCore, tmpMessenger, workspec)
+
+    # sweep a worker and clean up messenger stuff. Return True if the worker can be deleted from DB
+    def clean_up_worker(self, sweeper_core, messenger, workspec):
+        tmpLog = self.make_logger(_logger, 'workerID={0}'.format(workspec.workerID), method_name='clean_up_worker')
+        try:
+            tmpLog.debug('start cleaning up one worker')
+            # sweep worker
+            tmpStat, tmpOut = sweeper_core.sweep_worker(workspec)
+            tmpLog.debug('swept_worker with status={0} diag={1}'.format(tmpStat, tmpOut))
+            tmpLog.debug('start messenger cleanup')
+            mc_tmpStat, mc_tmpOut = messenger.clean_up(workspec)
+            tmpLog.debug('messenger cleaned up with status={0} diag={1}'.format(mc_tmpStat, mc_tmpOut))
+            return tmpStat
+        except Exception:
+            core_utils.dump_error_message(tmpLog)
+            return False
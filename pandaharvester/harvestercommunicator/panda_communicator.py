@@ -8,16 +8,24 @@ try:
     ssl.HAS_SNI = False
 except Exception:
     pass
+import os
 import sys
 import json
+import gzip
 import pickle
 import zlib
 import uuid
 import inspect
 import datetime
+import threading
 import requests
 import traceback
 from future.utils import iteritems
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
 # TO BE REMOVED for python2.7
 import requests.packages.urllib3
 try:
@@ -30,6 +38,19 @@ from pandaharvester.harvesterconfig import harvester_config
 from .base_communicator import BaseCommunicator
 
 
+# gzip compression
+def gzip_compress(data):
+    try:
+        return gzip.compress(data)
+    except AttributeError:
+        # python 2
+        from io import BytesIO
+        buf = BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+            f.write(data)
+        return buf.getvalue()
+
+
 # connection class
 class PandaCommunicator(BaseCommunicator):
     # constructor
@@ -42,6 +63,102 @@ class PandaCommunicator(BaseCommunicator):
                 self.useInspect = True
         else:
             self.verbose = False
+        # keep-alive sessions
+        try:
+            self.useSession = harvester_config.pandacon.useSession
+        except AttributeError:
+            self.useSession = False
+        try:
+            self.sessionPoolSize = harvester_config.pandacon.sessionPoolSize
+        except AttributeError:
+            self.sessionPoolSize = 2
+        try:
+            self.gzipRequest = harvester_config.pandacon.gzipRequest
+        except AttributeError:
+            self.gzipRequest = False
+        self.sessions = dict()
+        self.sessionLock = threading.Lock()
+        # chunk size and concurrency of update_jobs
+        try:
+            self.updateJobsChunkSize = harvester_config.pandacon.updateJobsChunkSize
+        except AttributeError:
+            self.updateJobsChunkSize = 100
+        try:
+            self.nUpdateJobsThreads = harvester_config.pandacon.nUpdateJobsThreads
+        except AttributeError:
+            self.nUpdateJobsThreads = 1
+
+    # get modification times of certificate files to rotate sessions
+    def get_cert_stamp(self, cert):
+        stamp = []
+        fileNames = [harvester_config.pandacon.ca_cert]
+        if isinstance(cert, (tuple, list)):
+            fileNames += list(cert)
+        else:
+            fileNames.append(cert)
+        for fileName in fileNames:
+            try:
+                stamp.append(os.path.getmtime(fileName))
+            except Exception:
+                stamp.append(None)
+        return tuple(stamp)
+
+    # get a session for the certificate, or requests module if sessions are disabled
+    def get_session(self, cert=None):
+        if not self.useSession:
+            return requests
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        stamp = self.get_cert_stamp(cert)
+        with self.sessionLock:
+            if cert in self.sessions:
+                session, oldStamp = self.sessions[cert]
+                if oldStamp == stamp:
+                    return session
+                # certificate files were changed
+                self._close_session(cert)
+            session = requests.Session()
+            # enough connections for concurrent updates
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                    pool_maxsize=max(self.sessionPoolSize,
+                                                                     self.nUpdateJobsThreads),
+                                                    max_retries=1)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self.sessions[cert] = (session, stamp)
+            return session
+
+    # close a session
+    def close_session(self, cert=None):
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        with self.sessionLock:
+            self._close_session(cert)
+
+    # close a session without lock
+    def _close_session(self, cert):
+        if cert in self.sessions:
+            session, stamp = self.sessions.pop(cert)
+            try:
+                session.close()
+            except Exception:
+                pass
+
+    # close all sessions
+    def close_sessions(self):
+        for cert in list(self.sessions):
+            self.close_session(cert)
+
+    # make request headers and body
+    def make_request(self, data):
+        headers = {"Accept": "application/json"}
+        if not self.useSession:
+            headers["Connection"] = "close"
+        if self.gzipRequest:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers["Content-Encoding"] = "gzip"
+            data = gzip_compress(urlencode(data, doseq=True).encode('utf-8'))
+        return headers, data
 
     # POST with http
     def post(self, path, data):
@@ -56,11 +173,16 @@ class PandaCommunicator(BaseCommunicator):
             url = '{0}/{1}'.format(harvester_config.pandacon.pandaURL, path)
             if self.verbose:
                 tmpLog.debug('exec={0} URL={1} data={2}'.format(tmpExec, url, str(data)))
-            res = requests.post(url,
-                                data=data,
-                                headers={"Accept": "application/json",
-                                         "Connection": "close"},
-                                timeout=harvester_config.pandacon.timeout)
+            headers, body = self.make_request(data)
+            try:
+                res = self.get_session().post(url,
+                                              data=body,
+                                              headers=headers,
+                                              timeout=harvester_config.pandacon.timeout)
+            except Exception:
+                # not to reuse broken connections
+                self.close_session()
+                raise
             if self.verbose:
                 tmpLog.debug('exec={0} code={1} return={2}'.format(tmpExec, res.status_code, res.text))
             if res.status_code == 200:
@@ -91,13 +213,18 @@ class PandaCommunicator(BaseCommunicator):
                 cert = (harvester_config.pandacon.cert_file,
                         harvester_config.pandacon.key_file)
             sw = core_utils.get_stopwatch()
-            res = requests.post(url,
-                                data=data,
-                                headers={"Accept": "application/json",
-                                         "Connection": "close"},
-                                timeout=harvester_config.pandacon.timeout,
-                                verify=harvester_config.pandacon.ca_cert,
-                                cert=cert)
+            headers, body = self.make_request(data)
+            try:
+                res = self.get_session(cert).post(url,
+                                                  data=body,
+                                                  headers=headers,
+                                                  timeout=harvester_config.pandacon.timeout,
+                                                  verify=harvester_config.pandacon.ca_cert,
+                                                  cert=cert)
+            except Exception:
+                # not to reuse broken connections
+                self.close_session(cert)
+                raise
             if self.verbose:
                 tmpLog.debug('exec={0} code={1} {3}. return={2}'.format(tmpExec, res.status_code, res.text,
                                                                         sw.get_elapsed_time()))
@@ -129,11 +256,16 @@ class PandaCommunicator(BaseCommunicator):
             if cert is None:
                 cert = (harvester_config.pandacon.cert_file,
                         harvester_config.pandacon.key_file)
-            res = requests.post(url,
-                                files=files,
-                                timeout=harvester_config.pandacon.timeout,
-                                verify=harvester_config.pandacon.ca_cert,
-                                cert=cert)
+            try:
+                res = self.get_session(cert).post(url,
+                                                  files=files,
+                                                  timeout=harvester_config.pandacon.timeout,
+                                                  verify=harvester_config.pandacon.ca_cert,
+                                                  cert=cert)
+            except Exception:
+                # not to reuse broken connections
+                self.close_session(cert)
+                raise
             if self.verbose:
                 tmpLog.debug('exec={0} code={1} return={2}'.format(tmpExec, res.status_code, res.text))
             if res.status_code == 200:
@@ -194,6 +326,64 @@ class PandaCommunicator(BaseCommunicator):
                 errStr = core_utils.dump_error_message(tmpLog, tmpRes)
         return [], errStr
 
+    # make data of a job to update
+    def make_job_data_for_update(self, jobSpec):
+        data = jobSpec.get_job_attributes_for_panda()
+        data['jobId'] = jobSpec.PandaID
+        data['siteName'] = jobSpec.computingSite
+        data['state'] = jobSpec.get_status()
+        data['attemptNr'] = jobSpec.attemptNr
+        data['jobSubStatus'] = jobSpec.subStatus
+        # change cancelled to failed to be accepted by panda server
+        if data['state'] in ['cancelled', 'missed']:
+            if jobSpec.is_pilot_closed():
+                data['jobSubStatus'] = 'pilot_closed'
+            else:
+                data['jobSubStatus'] = data['state']
+            data['state'] = 'failed'
+        if jobSpec.startTime is not None and 'startTime' not in data:
+            data['startTime'] = jobSpec.startTime.strftime('%Y-%m-%d %H:%M:%S')
+        if jobSpec.endTime is not None and 'endTime' not in data:
+            data['endTime'] = jobSpec.endTime.strftime('%Y-%m-%d %H:%M:%S')
+        if 'coreCount' not in data and jobSpec.nCore is not None:
+            data['coreCount'] = jobSpec.nCore
+        if jobSpec.is_final_status() and jobSpec.status == jobSpec.get_status():
+            if jobSpec.metaData is not None:
+                data['metaData'] = json.dumps(jobSpec.metaData)
+            if jobSpec.outputFilesToReport is not None:
+                data['xml'] = jobSpec.outputFilesToReport
+        return data
+
+    # send a chunk of jobs to updateJobsInBulk and return a list of serialized results
+    def update_jobs_chunk(self, tmp_data, n_jobs, tmp_log):
+        tmpStat, tmpRes = self.post_ssl('updateJobsInBulk', tmp_data)
+        retMaps = None
+        errStr = ''
+        if tmpStat is False:
+            errStr = core_utils.dump_error_message(tmp_log, tmpRes)
+        else:
+            try:
+                tmpStat, retMaps = tmpRes.json()
+                if tmpStat is False:
+                    tmp_log.error('updateJobsInBulk failed with {0}'.format(retMaps))
+                    retMaps = None
+            except Exception:
+                errStr = core_utils.dump_error_message(tmp_log)
+        if retMaps is None:
+            retMap = {}
+            retMap['content'] = {}
+            retMap['content']['StatusCode'] = 999
+            retMap['content']['ErrorDiag'] = errStr
+            retMaps = [json.dumps(retMap)] * n_jobs
+        return retMaps
+
+    # execute func for each argument with nUpdateJobsThreads threads and return results in order
+    def map_in_threads(self, func, args_list):
+        if self.nUpdateJobsThreads <= 1 or len(args_list) <= 1:
+            return [func(*args) for args in args_list]
+        with ThreadPoolExecutor(min(self.nUpdateJobsThreads, len(args_list))) as pool:
+            return list(pool.map(lambda args: func(*args), args_list))
+
     # update jobs
     def update_jobs(self, jobspec_list, id):
         sw = core_utils.get_stopwatch()
@@ -201,68 +391,31 @@ class PandaCommunicator(BaseCommunicator):
         tmpLogG.debug('update {0} jobs'.format(len(jobspec_list)))
         retList = []
         # update events
+        eventArgsList = []
+        eventSpecsList = []
         for jobSpec in jobspec_list:
             eventRanges, eventSpecs = jobSpec.to_event_data(max_events=10000)
             if eventRanges != []:
                 tmpLogG.debug('update {0} events for PandaID={1}'.format(len(eventSpecs), jobSpec.PandaID))
-                tmpRet = self.update_event_ranges(eventRanges, tmpLogG)
-                if tmpRet['StatusCode'] == 0:
-                    for eventSpec, retVal in zip(eventSpecs, tmpRet['Returns']):
-                        if retVal in [True, False] and eventSpec.is_final_status():
-                            eventSpec.subStatus = 'done'
-        # update jobs in bulk
-        nLookup = 100
-        iLookup = 0
-        while iLookup < len(jobspec_list):
-            dataList = []
-            jobSpecSubList = jobspec_list[iLookup:iLookup+nLookup]
-            for jobSpec in jobSpecSubList:
-                data = jobSpec.get_job_attributes_for_panda()
-                data['jobId'] = jobSpec.PandaID
-                data['siteName'] = jobSpec.computingSite
-                data['state'] = jobSpec.get_status()
-                data['attemptNr'] = jobSpec.attemptNr
-                data['jobSubStatus'] = jobSpec.subStatus
-                # change cancelled to failed to be accepted by panda server
-                if data['state'] in ['cancelled', 'missed']:
-                    if jobSpec.is_pilot_closed():
-                        data['jobSubStatus'] = 'pilot_closed'
-                    else:
-                        data['jobSubStatus'] = data['state']
-                    data['state'] = 'failed'
-                if jobSpec.startTime is not None and 'startTime' not in data:
-                    data['startTime'] = jobSpec.startTime.strftime('%Y-%m-%d %H:%M:%S')
-                if jobSpec.endTime is not None and 'endTime' not in data:
-                    data['endTime'] = jobSpec.endTime.strftime('%Y-%m-%d %H:%M:%S')
-                if 'coreCount' not in data and jobSpec.nCore is not None:
-                    data['coreCount'] = jobSpec.nCore
-                if jobSpec.is_final_status() and jobSpec.status == jobSpec.get_status():
-                    if jobSpec.metaData is not None:
-                        data['metaData'] = json.dumps(jobSpec.metaData)
-                    if jobSpec.outputFilesToReport is not None:
-                        data['xml'] = jobSpec.outputFilesToReport
-                dataList.append(data)
-            harvester_id = harvester_config.master.harvester_id
+                eventArgsList.append((eventRanges, tmpLogG))
+                eventSpecsList.append(eventSpecs)
+        for eventSpecs, tmpRet in zip(eventSpecsList, self.map_in_threads(self.update_event_ranges, eventArgsList)):
+            if tmpRet['StatusCode'] == 0:
+                for eventSpec, retVal in zip(eventSpecs, tmpRet['Returns']):
+                    if retVal in [True, False] and eventSpec.is_final_status():
+                        eventSpec.subStatus = 'done'
+        # make data of all chunks before sending
+        harvester_id = harvester_config.master.harvester_id
+        chunkArgsList = []
+        chunkList = []
+        for jobSpecSubList in core_utils.create_shards(jobspec_list, self.updateJobsChunkSize):
+            dataList = [self.make_job_data_for_update(jobSpec) for jobSpec in jobSpecSubList]
             tmpData = {'jobList': json.dumps(dataList), 'harvester_id': harvester_id}
-            tmpStat, tmpRes = self.post_ssl('updateJobsInBulk', tmpData)
-            retMaps = None
-            errStr = ''
-            if tmpStat is False:
-                errStr = core_utils.dump_error_message(tmpLogG, tmpRes)
-            else:
-                try:
-                    tmpStat, retMaps = tmpRes.json()
-                    if tmpStat is False:
-                        tmpLogG.error('updateJobsInBulk failed with {0}'.format(retMaps))
-                        retMaps = None
-                except Exception:
-                    errStr = core_utils.dump_error_message(tmpLogG)
-            if retMaps is None:
-                retMap = {}
-                retMap['content'] = {}
-                retMap['content']['StatusCode'] = 999
-                retMap['content']['ErrorDiag'] = errStr
-                retMaps = [json.dumps(retMap)] * len(jobSpecSubList)
+            chunkArgsList.append((tmpData, len(jobSpecSubList), tmpLogG))
+            chunkList.append((jobSpecSubList, dataList))
+        # update jobs in bulk
+        for (jobSpecSubList, dataList), retMaps in zip(chunkList,
+                                                       self.map_in_threads(self.update_jobs_chunk, chunkArgsList)):
             for jobSpec, retMap, data in zip(jobSpecSubList, retMaps, dataList):
                 tmpLog = self.make_logger('id={0} PandaID={1}'.format(id, jobSpec.PandaID),
                                           method_name='update_jobs')
@@ -276,7 +429,6 @@ class PandaCommunicator(BaseCommunicator):
                 tmpLog.debug('data={0}'.format(str(data)))
                 tmpLog.debug('done with {0}'.format(str(retMap)))
                 retList.append(retMap)
-            iLookup += nLookup
         tmpLogG.debug('done' + sw.get_elapsed_time())
         return retList
 
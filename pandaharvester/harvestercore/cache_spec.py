@@ -10,7 +10,8 @@ class CacheSpec(SpecBase):
     attributesWithTypes = ('mainKey:text',
                            'subKey:text',
                            'data:blob',
-                           'lastUpdate:timestamp'
+                           'lastUpdate:timestamp',
+                           'dataVersion:integer'
                            )
 
     # constructor
@@ -13,6 +13,7 @@ import fcntl
 import base64
 import random
 import inspect
+import logging
 import datetime
 import threading
 import traceback
@@ -33,6 +34,25 @@ from pandaharvester.harvesterconfig import harvester_config
 with_memory_profile = False
 
 
+# get minimum level of dialog messages in the same way as DBInterface.add_dialog_message
+def get_dialog_min_level():
+    try:
+        minLevel = str(harvester_config.propagator.minMessageLevel).upper()
+    except Exception:
+        minLevel = None
+    if minLevel not in ['DEBUG', 'INFO', 'ERROR', 'WARNING']:
+        minLevel = 'WARNING'
+    return getattr(logging, minLevel)
+
+
+# minimum level of dialog messages sent through hooks of loggers
+dialogMinLevel = get_dialog_min_level()
+
+# cache of logger prefixes
+loggerPrefixCache = dict()
+loggerPrefixCacheSize = 10000
+
+
 # stopwatch class
 class StopWatch(object):
     # constructor
@@ -117,18 +137,66 @@ def setup_logger(name=None):
     return PandaLogger().getLogger(name)
 
 
+# logger wrapper to skip message construction when the level is disabled. Messages take %-style args
+# or can be callables returning the message
+class LazyLogWrapper(LogWrapper):
+    # check if enabled for level
+    def is_enabled_for(self, level):
+        if self.hook is not None and level >= dialogMinLevel:
+            return True
+        try:
+            return self.logger.isEnabledFor(level)
+        except Exception:
+            return True
+
+    # make message
+    @staticmethod
+    def make_message(msg, args):
+        if callable(msg):
+            msg = msg()
+        if args:
+            msg = str(msg) % args
+        return msg
+
+    def debug(self, msg, *args):
+        if self.is_enabled_for(logging.DEBUG):
+            LogWrapper.debug(self, self.make_message(msg, args))
+
+    def info(self, msg, *args):
+        if self.is_enabled_for(logging.INFO):
+            LogWrapper.info(self, self.make_message(msg, args))
+
+    def warning(self, msg, *args):
+        if self.is_enabled_for(logging.WARNING):
+            LogWrapper.warning(self, self.make_message(msg, args))
+
+    def error(self, msg, *args):
+        if self.is_enabled_for(logging.ERROR):
+            LogWrapper.error(self, self.make_message(msg, args))
+
+
 # make logger
 def make_logger(tmp_log, token=None, method_name=None, hook=None):
     # get method name of caller
     if method_name is None:
-        tmpStr = inspect.stack()[1][3]
-    else:
-        tmpStr = method_name
-    if token is not None:
-        tmpStr += ' <{0}>'.format(token)
-    else:
-        tmpStr += ' :'.format(token)
-    newLog = LogWrapper(tmp_log, tmpStr, seeMem=with_memory_profile, hook=hook)
+        method_name = sys._getframe(1).f_code.co_name
+    # get prefix
+    prefixKey = (method_name, token)
+    try:
+        tmpStr = loggerPrefixCache.get(prefixKey)
+    except TypeError:
+        prefixKey = None
+        tmpStr = None
+    if tmpStr is None:
+        if token is not None:
+            tmpStr = method_name + ' <{0}>'.format(token)
+        else:
+            tmpStr = method_name + ' :'
+        if prefixKey is not None:
+            if len(loggerPrefixCache) >= loggerPrefixCacheSize:
+                loggerPrefixCache.clear()
+            loggerPrefixCache[prefixKey] = tmpStr
+    newLog = LazyLogWrapper(tmp_log, tmpStr, seeMem=with_memory_profile, hook=hook)
     return newLog
 
 
@@ -19,6 +19,10 @@ class DBInterface(object):
     def get_cache(self, data_name):
         return self.dbProxy.get_cache(data_name)
 
+    # get derived index over cache data
+    def get_cache_index(self, data_name, index_name):
+        return self.dbProxy.get_cache_index(data_name, index_name)
+
     # get files with a group ID
     def get_files_with_group_id(self, group_id):
         return self.dbProxy.get_files_with_group_id(group_id)
@@ -79,7 +83,7 @@ class DBInterface(object):
         levelNum = getattr(logging, level)
         # get minimum level
         try:
-            minLevel = harvester_config.propagator.minMessageLevel
+            minLevel = str(harvester_config.propagator.minMessageLevel).upper()
         except Exception:
             minLevel = None
         if minLevel not in validLevels:
@@ -7,6 +7,7 @@ import re
 import sys
 import copy
 import random
+import collections
 import inspect
 import time
 import datetime
@@ -51,12 +52,105 @@ serviceMetricsTableName = 'sm_table'
 # connection lock
 conLock = threading.Lock()
 
+# max number of bind variables in IN clause
+nInClauseChunk = 500
+
+
+# LRU cache of SQL statements converted for the DB engine
+class StatementCache(object):
+    # constructor
+    def __init__(self, max_size):
+        self.maxSize = max_size
+        self.lock = threading.Lock()
+        self.dataMap = collections.OrderedDict()
+        self.nHits = 0
+        self.nMisses = 0
+
+    # get an item or make it with the function if missing
+    def get(self, key, func, *args):
+        with self.lock:
+            try:
+                value = self.dataMap.pop(key)
+                self.dataMap[key] = value
+                self.nHits += 1
+                return value
+            except KeyError:
+                self.nMisses += 1
+        value = func(*args)
+        with self.lock:
+            self.dataMap[key] = value
+            while len(self.dataMap) > self.maxSize:
+                self.dataMap.popitem(last=False)
+        return value
+
+    # get stats
+    def get_stats(self):
+        with self.lock:
+            return {'hits': self.nHits,
+                    'misses': self.nMisses,
+                    'size': len(self.dataMap),
+                    'maxSize': self.maxSize}
+
+
+# statement cache in each process
+try:
+    statementCache = StatementCache(harvester_config.db.statementCacheSize)
+except AttributeError:
+    statementCache = StatementCache(2000)
+
+# interval in sec to check if cached data in each process is up to date with DB
+try:
+    cacheCheckInterval = harvester_config.cacher.versionCheckInterval
+except AttributeError:
+    cacheCheckInterval = 60
+
+# stats of cached data in each process
+cacheStats = collections.Counter()
+
+# functions to make derived indexes over cached data. mainKey -> {indexName: function}
+cacheIndexFunctions = dict()
+
+
+# register a function to make a derived index from cached data. The index is rebuilt only when the data is
+# refreshed or loaded from DB, and is available through DBProxy.get_cache_index
+def register_cache_index(main_key, index_name, func):
+    cacheIndexFunctions.setdefault(main_key, dict())
+    cacheIndexFunctions[main_key][index_name] = func
+
+
+# nucleus -> primary astorage RSE, taken from the first queue at the nucleus
+def make_nucleus_rse_index(data):
+    retMap = dict()
+    for queueName, queueInfo in iteritems(data):
+        try:
+            retMap.setdefault(queueInfo['atlas_site'], queueInfo['astorages']['pr'][0])
+        except Exception:
+            pass
+    return retMap
+
+
+# objectstore ID -> RSE
+def make_objstore_rse_index(data):
+    retMap = dict()
+    for rseName, rseInfo in iteritems(data):
+        try:
+            retMap.setdefault(rseInfo['id'], rseName)
+        except Exception:
+            pass
+    return retMap
+
+
+register_cache_index('panda_queues.json', 'nucleus_to_rse', make_nucleus_rse_index)
+register_cache_index('agis_ddmendpoints.json', 'objstore_id_to_rse', make_objstore_rse_index)
+
 
 # connection class
 class DBProxy(object):
     # constructor
     def __init__(self, thr_name=None):
         self.thrName = thr_name
+        self.readCon = None
+        self.readCur = None
         self.verbLog = None
         self.useInspect = False
         if harvester_config.db.verbose:
@@ -125,6 +219,15 @@ class DBProxy(object):
                 self.cur.execute('PRAGMA journal_mode = WAL')
                 # read to avoid database lock
                 self.cur.fetchone()
+            # another connection for read-only statements not to be serialized with writers
+            if hasattr(harvester_config.db, 'sqliteConcurrentRead') and \
+                    harvester_config.db.sqliteConcurrentRead is True:
+                self.readCon = sqlite3.connect(harvester_config.db.database_filename,
+                                               detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                                               check_same_thread=False)
+                self.readCon.row_factory = sqlite3.Row
+                self.readCur = self.readCon.cursor()
+        self.writeCur = self.cur
         self.lockDB = False
         # using application side lock if DB doesn't have a mechanism for exclusive access
         if harvester_config.db.engine == 'mariadb':
@@ -158,40 +261,57 @@ class DBProxy(object):
                         tmpLog.error('failed to renew connection; {0}'.format(e))
                         time.sleep(1)
 
-    # convert param dict to list
-    def convert_params(self, sql, varmap):
-        # lock database if application side lock is used
-        if self.usingAppLock and \
-                (re.search('^INSERT', sql, re.I) is not None
-                 or re.search('^UPDATE', sql, re.I) is not None
-                 or re.search(' FOR UPDATE', sql, re.I) is not None
-                 or re.search('^DELETE', sql, re.I) is not None
-                 ):
-                self.lockDB = True
+    # convert SQL statement for the DB engine and extract placeholders
+    def _convert_statement(self, sql):
+        # check if database lock is required with application side lock
+        toLock = re.search('^INSERT', sql, re.I) is not None \
+            or re.search('^UPDATE', sql, re.I) is not None \
+            or re.search(' FOR UPDATE', sql, re.I) is not None \
+            or re.search('^DELETE', sql, re.I) is not None \
+            or re.search('^BEGIN', sql, re.I) is not None
         # remove FOR UPDATE for sqlite
         if harvester_config.db.engine == 'sqlite':
             sql = re.sub(' FOR UPDATE', ' ', sql, re.I)
             sql = re.sub('INSERT IGNORE', 'INSERT OR IGNORE', sql, re.I)
         else:
             sql = re.sub('INSERT OR IGNORE', 'INSERT IGNORE', sql, re.I)
+        # extract placeholders
+        items = re.findall(':[^ $,)]+', sql)
+        # using the printf style syntax for mariaDB
+        if harvester_config.db.engine == 'mariadb':
+            sql = re.sub(':[^ $,)]+', '%s', sql)
+        return sql, items, toLock
+
+    # get converted SQL statement from the cache
+    def get_statement(self, sql):
+        return statementCache.get((sql, harvester_config.db.engine), self._convert_statement, sql)
+
+    # get stats of the SQL statement cache
+    def get_statement_cache_stats(self):
+        return statementCache.get_stats()
+
+    # make param list from param dict
+    def make_param_list(self, items, varmap):
         # no conversation unless dict
         if not isinstance(varmap, dict):
-            # using the printf style syntax for mariaDB
-            if harvester_config.db.engine == 'mariadb':
-                sql = re.sub(':[^ $,)]+', '%s', sql)
-            return sql, varmap
+            return varmap
         paramList = []
-        # extract placeholders
-        items = re.findall(':[^ $,)]+', sql)
         for item in items:
             if item not in varmap:
                 raise KeyError('{0} is missing in SQL parameters'.format(item))
             if item not in paramList:
                 paramList.append(varmap[item])
-        # using the printf style syntax for mariaDB
-        if harvester_config.db.engine == 'mariadb':
-            sql = re.sub(':[^ $,)]+', '%s', sql)
-        return sql, paramList
+        return paramList
+
+    # convert param dict to list
+    def convert_params(self, sql, varmap, statement=None):
+        if statement is None:
+            statement = self.get_statement(sql)
+        sql, items, toLock = statement
+        # lock database if application side lock is used
+        if self.usingAppLock and toLock:
+            self.lockDB = True
+        return sql, self.make_param_list(items, varmap)
 
     # wrapper for execute
     def execute(self, sql, varmap=None):
@@ -199,11 +319,20 @@ class DBProxy(object):
         newSQL = ''
         if varmap is None:
             varmap = dict()
+        # converted statement, reused for the connection choice and the execution
+        statement = self.get_statement(sql)
+        # use the read connection for read-only statements unless in a write transaction
+        if self.readCur is not None and not self.lockDB and not statement[2]:
+            self.cur = self.readCur
+        else:
+            self.cur = self.writeCur
         # get lock if application side lock is used
-        if self.usingAppLock and not self.lockDB:
+        locked = False
+        if self.usingAppLock and not self.lockDB and self.cur is self.writeCur:
             if harvester_config.db.verbose:
                 self.verbLog.debug('thr={0} locking'.format(self.thrName))
             conLock.acquire()
+            locked = True
             if harvester_config.db.verbose:
                 self.verbLog.debug('thr={0} locked'.format(self.thrName))
         # execute
@@ -217,7 +346,7 @@ class DBProxy(object):
                                                                                  inspect.stack()[1][3],
                                                                                  self.thrName))
             # convert param dict
-            newSQL, params = self.convert_params(sql, varmap)
+            newSQL, params = self.convert_params(sql, varmap, statement)
             # execute
             try:
                 retVal = self.cur.execute(newSQL, params)
@@ -228,7 +357,7 @@ class DBProxy(object):
                 raise
         finally:
             # release lock
-            if self.usingAppLock and not self.lockDB:
+            if locked and not self.lockDB:
                 if harvester_config.db.verbose:
                     self.verbLog.debug('thr={0} release'.format(self.thrName))
                 conLock.release()
@@ -240,6 +369,7 @@ class DBProxy(object):
 
     # wrapper for executemany
     def executemany(self, sql, varmap_list):
+        self.cur = self.writeCur
         # get lock
         if self.usingAppLock and not self.lockDB:
             if harvester_config.db.verbose:
@@ -258,12 +388,13 @@ class DBProxy(object):
                                                                                  self.thrName))
             # convert param dict
             paramList = []
-            newSQL = sql
+            newSQL, items, toLock = self.get_statement(sql)
+            if self.usingAppLock and toLock and len(varmap_list) > 0:
+                self.lockDB = True
             for varMap in varmap_list:
                 if varMap is None:
                     varMap = dict()
-                newSQL, params = self.convert_params(sql, varMap)
-                paramList.append(params)
+                paramList.append(self.make_param_list(items, varMap))
             # execute
             try:
                 retVal = self.cur.executemany(newSQL, paramList)
@@ -311,6 +442,16 @@ class DBProxy(object):
                 conLock.release()
                 self.lockDB = False
 
+    # make bind variables for IN clause
+    def _make_in_clause(self, key_name, values):
+        varNames = []
+        varMap = dict()
+        for tmpIdx, tmpValue in enumerate(values):
+            varName = ':{0}{1}'.format(key_name, tmpIdx)
+            varNames.append(varName)
+            varMap[varName] = tmpValue
+        return ','.join(varNames), varMap
+
     # type conversion
     def type_conversion(self, attr_type):
         # remove decorator
@@ -707,7 +848,7 @@ class DBProxy(object):
                     self.execute(sqlD, varMap)
             # commit
             self.commit()
-            tmpLog.debug('done with {0}'.format(nRow))
+            tmpLog.debug('done with %s', nRow)
             # return
             return nRow
         except Exception:
@@ -718,6 +859,133 @@ class DBProxy(object):
             # return
             return None
 
+    # begin a write transaction for sqlite where FOR UPDATE is removed, so that other processes cannot change
+    # rows between SELECT and UPDATE
+    def _begin_write_transaction(self):
+        if harvester_config.db.engine != 'sqlite' or getattr(self.con, 'in_transaction', False):
+            return
+        self.execute('BEGIN IMMEDIATE')
+
+    # get IDs of rows satisfying criteria with row locks
+    def _get_ids_to_update(self, table_name, key_name, ids, criteria):
+        self._begin_write_transaction()
+        sqlC = "SELECT {0} FROM {1} ".format(key_name, table_name)
+        sqlC += "WHERE {0} IN ({{0}}) ".format(key_name)
+        for tmpKey in criteria:
+            sqlC += "AND {0}=:{0}_cr ".format(tmpKey)
+        sqlC += "FOR UPDATE "
+        retVal = set()
+        for tmpIDs in core_utils.create_shards(ids, nInClauseChunk):
+            inClause, varMap = self._make_in_clause(key_name, tmpIDs)
+            for tmpKey, tmpVal in iteritems(criteria):
+                varMap[':{0}_cr'.format(tmpKey)] = tmpVal
+            self.execute(sqlC.format(inClause), varMap)
+            for tmpID, in self.cur.fetchall():
+                retVal.add(tmpID)
+        return retVal
+
+    # update jobs in bulk with the same criteria and a single commit.
+    # return a list of the number of updated rows for each job
+    def update_jobs_bulk(self, jobspec_list, criteria=None, update_in_file=False):
+        try:
+            # get logger
+            tmpLog = core_utils.make_logger(_logger, method_name='update_jobs_bulk')
+            tmpLog.debug('start for {0} jobs'.format(len(jobspec_list)))
+            if criteria is None:
+                criteria = {}
+            sqlCr = ''
+            for tmpKey in criteria:
+                sqlCr += "AND {0}=:{0}_cr ".format(tmpKey)
+            # get jobs to be updated
+            jobSpecsToUpdate = [jobSpec for jobSpec in jobspec_list if jobSpec.has_updated_attributes()]
+            pandaIDs = self._get_ids_to_update(jobTableName, 'PandaID',
+                                               [jobSpec.PandaID for jobSpec in jobSpecsToUpdate], criteria)
+            jobSpecsToUpdate = [jobSpec for jobSpec in jobSpecsToUpdate if jobSpec.PandaID in pandaIDs]
+            # group jobs by changed attributes
+            varMapsJ = dict()
+            varMapsE = dict()
+            varMapsF = dict()
+            varMapsFD = []
+            varMapsD = []
+            for jobSpec in jobSpecsToUpdate:
+                varMap = jobSpec.values_map(only_changed=True)
+                for tmpKey, tmpVal in iteritems(criteria):
+                    varMap[':{0}_cr'.format(tmpKey)] = tmpVal
+                varMap[':PandaID'] = jobSpec.PandaID
+                varMapsJ.setdefault(jobSpec.bind_update_changes_expression(), [])
+                varMapsJ[jobSpec.bind_update_changes_expression()].append(varMap)
+                # events
+                for eventSpec in jobSpec.events:
+                    varMap = eventSpec.values_map(only_changed=True)
+                    if varMap != {}:
+                        varMap[':eventRangeID'] = eventSpec.eventRangeID
+                        varMapsE.setdefault(eventSpec.bind_update_changes_expression(), [])
+                        varMapsE[eventSpec.bind_update_changes_expression()].append(varMap)
+                # input files
+                if update_in_file:
+                    for fileSpec in jobSpec.inFiles:
+                        varMap = fileSpec.values_map(only_changed=True)
+                        if varMap != {}:
+                            varMap[':fileID'] = fileSpec.fileID
+                            varMapsF.setdefault(fileSpec.bind_update_changes_expression(), [])
+                            varMapsF[fileSpec.bind_update_changes_expression()].append(varMap)
+                elif jobSpec.is_final_status():
+                    # set file status to done if jobs are done
+                    varMap = dict()
+                    varMap[':PandaID'] = jobSpec.PandaID
+                    varMap[':type'] = 'input'
+                    varMap[':status'] = 'done'
+                    varMapsFD.append(varMap)
+                # set to_delete flag
+                if jobSpec.subStatus == 'done':
+                    varMap = dict()
+                    varMap[':PandaID'] = jobSpec.PandaID
+                    varMap[':to_delete'] = 1
+                    varMapsD.append(varMap)
+            # update jobs
+            for bindExpression, varMaps in iteritems(varMapsJ):
+                sqlJ = "UPDATE {0} SET {1} ".format(jobTableName, bindExpression)
+                sqlJ += "WHERE PandaID=:PandaID " + sqlCr
+                self.executemany(sqlJ, varMaps)
+            # update events
+            for bindExpression, varMaps in iteritems(varMapsE):
+                sqlE = "UPDATE {0} SET {1} ".format(eventTableName, bindExpression)
+                sqlE += "WHERE eventRangeID=:eventRangeID "
+                self.executemany(sqlE, varMaps)
+            # update input files
+            for bindExpression, varMaps in iteritems(varMapsF):
+                sqlF = "UPDATE {0} SET {1} ".format(fileTableName, bindExpression)
+                sqlF += "WHERE fileID=:fileID "
+                self.executemany(sqlF, varMaps)
+            if len(varMapsFD) > 0:
+                sqlFD = "UPDATE {0} SET status=:status ".format(fileTableName)
+                sqlFD += "WHERE PandaID=:PandaID AND fileType=:type "
+                self.executemany(sqlFD, varMapsFD)
+            if len(varMapsD) > 0:
+                sqlD = "UPDATE {0} SET todelete=:to_delete ".format(fileTableName)
+                sqlD += "WHERE PandaID=:PandaID "
+                self.executemany(sqlD, varMapsD)
+            # commit
+            self.commit()
+            retList = []
+            for jobSpec in jobspec_list:
+                if not jobSpec.has_updated_attributes():
+                    retList.append(None)
+                elif jobSpec.PandaID in pandaIDs:
+                    retList.append(1)
+                else:
+                    retList.append(0)
+            tmpLog.debug('done with {0} jobs in {1} statements'.format(len(jobSpecsToUpdate), len(varMapsJ)))
+            # return
+            return retList
+        except Exception:
+            # roll back
+            self.rollback()
+            # dump error
+            core_utils.dump_error_message(_logger)
+            # return
+            return None
+
     # insert output files into database
     def insert_files(self,jobspec_list):
         # get logger
@@ -771,7 +1039,7 @@ class DBProxy(object):
                 nRow = self.cur.rowcount
                 # commit
                 self.commit()
-                tmpLog.debug('done with {0}'.format(nRow))
+                tmpLog.debug('done with %s', nRow)
             else:
                 nRow = None
                 tmpLog.debug('skip since no updated attributes')
@@ -785,8 +1053,60 @@ class DBProxy(object):
             # return
             return None
 
+    # update workers in bulk with the same criteria and a single commit.
+    # return a list of the number of updated rows for each worker, or None if no updated attributes
+    def update_workers_bulk(self, workspec_list, criteria=None):
+        try:
+            # get logger
+            tmpLog = core_utils.make_logger(_logger, method_name='update_workers_bulk')
+            tmpLog.debug('start for {0} workers'.format(len(workspec_list)))
+            if criteria is None:
+                criteria = {}
+            # get workers to be updated
+            workSpecsToUpdate = [workSpec for workSpec in workspec_list if workSpec.has_updated_attributes()]
+            workerIDs = self._get_ids_to_update(workTableName, 'workerID',
+                                                [workSpec.workerID for workSpec in workSpecsToUpdate], criteria)
+            # group workers by changed attributes
+            varMapsW = dict()
+            for workSpec in workSpecsToUpdate:
+                if workSpec.workerID not in workerIDs:
+                    continue
+                varMap = workSpec.values_map(only_changed=True)
+                for tmpKey, tmpVal in iteritems(criteria):
+                    varMap[':{0}_cr'.format(tmpKey)] = tmpVal
+                varMap[':workerID'] = workSpec.workerID
+                varMapsW.setdefault(workSpec.bind_update_changes_expression(), [])
+                varMapsW[workSpec.bind_update_changes_expression()].append(varMap)
+            # update workers
+            for bindExpression, varMaps in iteritems(varMapsW):
+                sqlW = "UPDATE {0} SET {1} ".format(workTableName, bindExpression)
+                sqlW += "WHERE workerID=:workerID "
+                for tmpKey in criteria:
+                    sqlW += "AND {0}=:{0}_cr ".format(tmpKey)
+                self.executemany(sqlW, varMaps)
+            # commit
+            self.commit()
+            retList = []
+            for workSpec in workspec_list:
+                if not workSpec.has_updated_attributes():
+                    retList.append(None)
+                elif workSpec.workerID in workerIDs:
+                    retList.append(1)
+                else:
+                    retList.append(0)
+            tmpLog.debug('done with {0} workers in {1} statements'.format(len(workerIDs), len(varMapsW)))
+            # return
+            return retList
+        except Exception:
+            # roll back
+            self.rollback()
+            # dump error
+            core_utils.dump_error_message(_logger)
+            # return
+            return None
+
     # fill panda queue table
-    def fill_panda_queue_table(self, panda_queue_list, queue_config_mapper):
+    def fill_panda_queue_table(self, panda_queue_list, queue_config_mapper, changed_queue_list=None):
         try:
             # get logger
             tmpLog = core_utils.make_logger(_logger, method_name='fill_panda_queue_table')
@@ -796,7 +1116,9 @@ class DBProxy(object):
             varMap = dict()
             self.execute(sqlE, varMap)
             resE = self.cur.fetchall()
+            existingQueues = set()
             for queueName, in resE:
+                existingQueues.add(queueName)
                 # delete if not listed in cfg
                 if queueName not in panda_queue_list:
                     sqlD = "DELETE FROM {0} ".format(pandaQueueTableName)
@@ -808,16 +1130,14 @@ class DBProxy(object):
                     self.commit()
             # loop over queues
             for queueName in panda_queue_list:
+                # skip unchanged queues which already exist
+                if changed_queue_list is not None and queueName not in changed_queue_list \
+                        and queueName in existingQueues:
+                    continue
                 queueConfig = queue_config_mapper.get_queue(queueName)
                 if queueConfig is not None:
                     # check if already exist
-                    sqlC = "SELECT * FROM {0} ".format(pandaQueueTableName)
-                    sqlC += "WHERE queueName=:queueName "
-                    varMap = dict()
-                    varMap[':queueName'] = queueName
-                    self.execute(sqlC, varMap)
-                    resC = self.cur.fetchone()
-                    if resC is not None:
+                    if queueName in existingQueues:
                         # update limits just in case
                         varMap = dict()
                         sqlU = "UPDATE {0} SET ".format(pandaQueueTableName)
@@ -936,7 +1256,7 @@ class DBProxy(object):
                 iQueues += 1
                 if iQueues >= n_queues:
                     break
-            tmpLog.debug('got {0}'.format(str(retMap)))
+            tmpLog.debug('got %s', retMap)
             return retMap
         except Exception:
             # roll back
@@ -1486,9 +1806,9 @@ class DBProxy(object):
                 # enough queues
                 if len(retMap) >= 0:
                     break
-            tmpLog.debug('got retMap {0}'.format(str(retMap)))
-            tmpLog.debug('got siteName {0}'.format(str(siteName)))
-            tmpLog.debug('got resourceMap {0}'.format(str(resourceMap)))
+            tmpLog.debug('got retMap %s', retMap)
+            tmpLog.debug('got siteName %s', siteName)
+            tmpLog.debug('got resourceMap %s', resourceMap)
             return retMap, siteName, resourceMap
         except Exception:
             # roll back
@@ -1818,7 +2138,176 @@ class DBProxy(object):
                     retVal.setdefault(queueName, dict())
                     retVal[queueName].setdefault(configID, [])
                     retVal[queueName][configID].append(workersList)
-            tmpLog.debug('got {0}'.format(str(retVal)))
+            tmpLog.debug('got %s', retVal)
+            return retVal
+        except Exception:
+            # roll back
+            self.rollback()
+            # dump error
+            core_utils.dump_error_message(_logger)
+            # return
+            return {}
+
+    # get workers to update with set-based locking
+    def get_workers_to_update_bulk(self, max_workers, check_interval, lock_interval, locked_by):
+        try:
+            # get logger
+            tmpLog = core_utils.make_logger(_logger, method_name='get_workers_to_update_bulk')
+            tmpLog.debug('start')
+            # sql to get workers
+            sqlW = "SELECT workerID,configID,mapType FROM {0} ".format(workTableName)
+            sqlW += "WHERE status IN (:st_submitted,:st_running,:st_idle) "
+            sqlW += "AND ((modificationTime<:lockTimeLimit AND lockedBy IS NOT NULL) "
+            sqlW += "OR (modificationTime<:checkTimeLimit AND lockedBy IS NULL)) "
+            sqlW += "ORDER BY modificationTime LIMIT {0} ".format(max_workers)
+            # sql to get associated workerIDs
+            sqlA = "SELECT s.workerID,t.workerID FROM {0} t, {0} s, {1} w ".format(jobWorkerTableName,
+                                                                                 workTableName)
+            sqlA += "WHERE s.PandaID=t.PandaID AND s.workerID IN ({0}) "
+            sqlA += "AND w.workerID=t.workerID AND w.status IN (:st_submitted,:st_running,:st_idle) "
+            # sql to update modificationTime
+            sqlLM = "UPDATE {0} SET modificationTime=:timeNow ".format(workTableName)
+            sqlLM += "WHERE workerID IN ({0}) "
+            # sql to lock workers with time check
+            sqlLT = "UPDATE {0} SET modificationTime=:timeNow,lockedBy=:lockedBy ".format(workTableName)
+            sqlLT += "WHERE workerID IN ({0}) "
+            sqlLT += "AND status IN (:st_submitted,:st_running,:st_idle) "
+            sqlLT += "AND ((modificationTime<:lockTimeLimit AND lockedBy IS NOT NULL) "
+            sqlLT += "OR (modificationTime<:checkTimeLimit AND lockedBy IS NULL)) "
+            # sql to get locked workerIDs
+            sqlC = "SELECT workerID FROM {0} ".format(workTableName)
+            sqlC += "WHERE workerID IN ({0}) AND lockedBy=:lockedBy AND modificationTime=:timeNow "
+            # sql to lock workers without time check
+            sqlL = "UPDATE {0} SET modificationTime=:timeNow,lockedBy=:lockedBy ".format(workTableName)
+            sqlL += "WHERE workerID IN ({0}) "
+            # sql to get workers together with associated PandaIDs
+            sqlG = "SELECT r.PandaID,{0} FROM {1} w ".format(WorkSpec.column_names(prefix='w'), workTableName)
+            sqlG += "LEFT OUTER JOIN {0} r ON r.workerID=w.workerID ".format(jobWorkerTableName)
+            sqlG += "WHERE w.workerID IN ({0}) "
+            # get workerIDs. timeNow without microseconds to be compared with timestamps in any DB
+            timeNow = datetime.datetime.utcnow().replace(microsecond=0)
+            lockTimeLimit = timeNow - datetime.timedelta(seconds=lock_interval)
+            checkTimeLimit = timeNow - datetime.timedelta(seconds=check_interval)
+            varMap = dict()
+            varMap[':st_submitted'] = WorkSpec.ST_submitted
+            varMap[':st_running'] = WorkSpec.ST_running
+            varMap[':st_idle'] = WorkSpec.ST_idle
+            varMap[':lockTimeLimit'] = lockTimeLimit
+            varMap[':checkTimeLimit'] = checkTimeLimit
+            self.execute(sqlW, varMap)
+            resW = self.cur.fetchall()
+            tmpWorkers = dict()
+            for workerID, configID, mapType in resW:
+                # ignore configID
+                if not core_utils.dynamic_plugin_change():
+                    configID = None
+                tmpWorkers[workerID] = (configID, mapType)
+            # get associated workerIDs
+            workerIDsToScan = dict()
+            for workerID in tmpWorkers:
+                # add original ID just in case since no relation when job is not yet bound
+                workerIDsToScan[workerID] = {workerID}
+            for workerIDs in core_utils.create_shards(list(tmpWorkers), nInClauseChunk):
+                inClause, varMap = self._make_in_clause('workerID', workerIDs)
+                varMap[':st_submitted'] = WorkSpec.ST_submitted
+                varMap[':st_running'] = WorkSpec.ST_running
+                varMap[':st_idle'] = WorkSpec.ST_idle
+                self.execute(sqlA.format(inClause), varMap)
+                resA = self.cur.fetchall()
+                for workerID, tmpWorkID in resA:
+                    workerIDsToScan[workerID].add(tmpWorkID)
+            # use only the smallest worker to avoid updating the same worker set concurrently
+            workerIDsToLock = []
+            workerIDsToTouch = []
+            for workerID, (configID, mapType) in iteritems(tmpWorkers):
+                if mapType == WorkSpec.MT_MultiWorkers and workerID != min(workerIDsToScan[workerID]):
+                    workerIDsToTouch.append(workerID)
+                else:
+                    workerIDsToLock.append(workerID)
+            # update modification time
+            for workerIDs in core_utils.create_shards(workerIDsToTouch, nInClauseChunk):
+                inClause, varMap = self._make_in_clause('workerID', workerIDs)
+                varMap[':timeNow'] = timeNow
+                self.execute(sqlLM.format(inClause), varMap)
+            # lock workers
+            lockedIDs = set()
+            for workerIDs in core_utils.create_shards(workerIDsToLock, nInClauseChunk):
+                inClause, varMap = self._make_in_clause('workerID', workerIDs)
+                varMap[':lockedBy'] = locked_by
+                varMap[':timeNow'] = timeNow
+                varMap[':st_submitted'] = WorkSpec.ST_submitted
+                varMap[':st_running'] = WorkSpec.ST_running
+                varMap[':st_idle'] = WorkSpec.ST_idle
+                varMap[':lockTimeLimit'] = lockTimeLimit
+                varMap[':checkTimeLimit'] = checkTimeLimit
+                self.execute(sqlLT.format(inClause), varMap)
+                nRow = self.cur.rowcount
+                if nRow == len(workerIDs):
+                    lockedIDs.update(workerIDs)
+                elif nRow > 0:
+                    # check which workers were locked
+                    self.execute(sqlC.format(inClause), varMap)
+                    resC = self.cur.fetchall()
+                    for workerID, in resC:
+                        lockedIDs.add(workerID)
+            # commit
+            self.commit()
+            # make worker sets
+            checkedIDs = set()
+            workerSets = []
+            for workerID in workerIDsToLock:
+                # skip
+                if workerID not in lockedIDs or workerID in checkedIDs:
+                    continue
+                workerSets.append((workerID, workerIDsToScan[workerID]))
+                checkedIDs.update(workerIDsToScan[workerID])
+            # lock associated workers
+            associatedIDs = checkedIDs.difference(lockedIDs)
+            for workerIDs in core_utils.create_shards(list(associatedIDs), nInClauseChunk):
+                inClause, varMap = self._make_in_clause('workerID', workerIDs)
+                varMap[':lockedBy'] = locked_by
+                varMap[':timeNow'] = timeNow
+                self.execute(sqlL.format(inClause), varMap)
+            # get workers
+            workSpecMap = dict()
+            for workerIDs in core_utils.create_shards(list(checkedIDs), nInClauseChunk):
+                inClause, varMap = self._make_in_clause('workerID', workerIDs)
+                self.execute(sqlG.format(inClause), varMap)
+                resG = self.cur.fetchall()
+                for resItem in resG:
+                    pandaID = resItem[0]
+                    workerID = resItem[1]
+                    if workerID not in workSpecMap:
+                        workSpec = WorkSpec()
+                        workSpec.pack(resItem)
+                        workSpec.pandaid_list = []
+                        workSpecMap[workerID] = workSpec
+                    if pandaID is not None:
+                        workSpecMap[workerID].pandaid_list.append(pandaID)
+            # commit
+            self.commit()
+            retVal = {}
+            for workerID, workerIDs in workerSets:
+                configID, mapType = tmpWorkers[workerID]
+                queueName = None
+                workersList = []
+                for tmpWorkID in workerIDs:
+                    if tmpWorkID not in workSpecMap:
+                        continue
+                    workSpec = workSpecMap[tmpWorkID]
+                    if queueName is None:
+                        queueName = workSpec.computingSite
+                    workersList.append(workSpec)
+                    if len(workSpec.pandaid_list) > 0:
+                        workSpec.nJobs = len(workSpec.pandaid_list)
+                    workSpec.lockedBy = locked_by
+                    workSpec.force_not_update('lockedBy')
+                # add
+                if queueName is not None:
+                    retVal.setdefault(queueName, dict())
+                    retVal[queueName].setdefault(configID, [])
+                    retVal[queueName][configID].append(workersList)
+            tmpLog.debug('got {0} worker sets with {1} workers'.format(len(workerSets), len(workSpecMap)))
             return retVal
         except Exception:
             # roll back
@@ -2265,7 +2754,7 @@ class DBProxy(object):
                             varMap[':PandaID'] = jobSpec.PandaID
                             self.execute(sqlJ, varMap)
                             nRow = self.cur.rowcount
-                            tmpLog.debug('done with {0}'.format(nRow))
+                            tmpLog.debug('done with %s', nRow)
                     # commit
                     self.commit()
             # update worker
@@ -2301,7 +2790,7 @@ class DBProxy(object):
                     varMap[':st4'] = WorkSpec.ST_missed
                     self.execute(sqlW, varMap)
                     nRow = self.cur.rowcount
-                    tmpLog.debug('done with {0}'.format(nRow))
+                    tmpLog.debug('done with %s', nRow)
                     if nRow == 0:
                         retVal = False
                 # insert relationship if necessary
@@ -2450,7 +2939,7 @@ class DBProxy(object):
                 retVal.append(workSpec)
             # commit
             self.commit()
-            tmpLog.debug('got {0}'.format(str(retVal)))
+            tmpLog.debug('got %s', retVal)
             return retVal
         except Exception:
             # roll back
@@ -2489,6 +2978,37 @@ class DBProxy(object):
             # return
             return None
 
+    # get workers with IDs. Return a map of workerID and WorkSpec, or None if failed
+    def get_workers_with_ids(self, worker_ids):
+        try:
+            # get logger
+            tmpLog = core_utils.make_logger(_logger, method_name='get_workers_with_ids')
+            tmpLog.debug('start for %s workers', len(worker_ids))
+            # sql to get workers
+            sqlG = "SELECT {0} FROM {1} ".format(WorkSpec.column_names(), workTableName)
+            sqlG += "WHERE workerID IN ({0}) "
+            # get workers
+            retMap = dict()
+            for workerIDs in core_utils.create_shards(list(worker_ids), nInClauseChunk):
+                inClause, varMap = self._make_in_clause('workerID', workerIDs)
+                self.execute(sqlG.format(inClause), varMap)
+                resList = self.cur.fetchall()
+                for res in resList:
+                    workSpec = WorkSpec()
+                    workSpec.pack(res)
+                    retMap[workSpec.workerID] = workSpec
+            # commit
+            self.commit()
+            tmpLog.debug('got %s workers', len(retMap))
+            return retMap
+        except Exception:
+            # roll back
+            self.rollback()
+            # dump error
+            core_utils.dump_error_message(_logger)
+            # return
+            return None
+
     # get jobs to trigger or check output transfer or zip output
     def get_jobs_for_stage_out(self, max_jobs, interval_without_lock, interval_with_lock, locked_by,
                                sub_status, has_out_file_flag, bad_has_out_file_flag=None,
@@ -2857,7 +3377,7 @@ class DBProxy(object):
             retVal, = self.cur.fetchone()
             # commit
             self.commit()
-            tmpLog.debug('got {0}'.format(retVal))
+            tmpLog.debug('got %s', retVal)
             return retVal
         except Exception:
             # roll back
@@ -2886,7 +3406,7 @@ class DBProxy(object):
                 retVal, = retVal
             # commit
             self.commit()
-            tmpLog.debug('got {0}'.format(retVal))
+            tmpLog.debug('got %s', retVal)
             return retVal
         except Exception:
             # roll back
@@ -2909,7 +3429,7 @@ class DBProxy(object):
             # check if already there
             varMap = dict()
             varMap[":mainKey"] = main_key
-            sqlC = "SELECT lastUpdate FROM {0} WHERE mainKey=:mainKey ".format(cacheTableName)
+            sqlC = "SELECT dataVersion FROM {0} WHERE mainKey=:mainKey ".format(cacheTableName)
             if sub_key is not None:
                 sqlC += "AND subKey=:subKey "
                 varMap[":subKey"] = sub_key
@@ -2919,12 +3439,14 @@ class DBProxy(object):
                 # insert if missing
                 cacheSpec.mainKey = main_key
                 cacheSpec.subKey = sub_key
+                cacheSpec.dataVersion = 1
                 sqlU = "INSERT INTO {0} ({1}) ".format(cacheTableName, CacheSpec.column_names())
                 sqlU += CacheSpec.bind_values_expression()
                 varMap = cacheSpec.values_list()
             else:
-                # update
-                sqlU = "UPDATE {0} SET {1} ".format(cacheTableName, cacheSpec.bind_update_changes_expression())
+                # update with a counter as data version since lastUpdate may not be precise enough
+                sqlU = "UPDATE {0} SET {1},".format(cacheTableName, cacheSpec.bind_update_changes_expression())
+                sqlU += "dataVersion=COALESCE(dataVersion,0)+1 "
                 sqlU += "WHERE mainKey=:mainKey "
                 varMap = cacheSpec.values_map(only_changed=True)
                 varMap[":mainKey"] = main_key
@@ -2932,13 +3454,23 @@ class DBProxy(object):
                     sqlU += "AND subKey=:subKey "
                     varMap[":subKey"] = sub_key
             self.execute(sqlU, varMap)
+            # get version as stored in DB
+            varMap = dict()
+            varMap[":mainKey"] = main_key
+            if sub_key is not None:
+                varMap[":subKey"] = sub_key
+            self.execute(sqlC, varMap)
+            dataVersion, = self.cur.fetchone()
             # commit
             self.commit()
             # put into global dict
             cacheKey = 'cache|{0}|{1}'.format(main_key, sub_key)
+            versionKey = 'cache_version|{0}|{1}'.format(main_key, sub_key)
             globalDict = core_utils.get_global_dict()
             globalDict.acquire()
             globalDict[cacheKey] = cacheSpec.data
+            globalDict[versionKey] = (dataVersion, time.time())
+            self.put_cache_indexes(globalDict, main_key, sub_key, cacheSpec.data, tmpLog)
             globalDict.release()
             tmpLog.debug('refreshed')
             return True
@@ -2950,9 +3482,12 @@ class DBProxy(object):
             # return
             return False
 
-    # get a cached info
+    # get a cached info. Data is shared among threads in the process and must not be modified.
+    # It is reloaded from DB only when dataVersion in DB moved, which is checked every cacheCheckInterval sec
     def get_cache(self, main_key, sub_key=None):
         useDB = False
+        globalDict = core_utils.get_global_dict()
+        locked = False
         try:
             # get logger
             tmpLog = core_utils.make_logger(_logger, 'mainKey={0} subKey={1}'.format(main_key, sub_key),
@@ -2960,19 +3495,48 @@ class DBProxy(object):
             tmpLog.debug('start')
             # get from global dict
             cacheKey = 'cache|{0}|{1}'.format(main_key, sub_key)
-            globalDict = core_utils.get_global_dict()
+            versionKey = 'cache_version|{0}|{1}'.format(main_key, sub_key)
             # lock dict
             globalDict.acquire()
-            # found
+            locked = True
+            toLoad = True
             if cacheKey in globalDict:
-                # release dict
-                globalDict.release()
+                dataVersion, checkedAt = globalDict[versionKey]
+                timeNow = time.time()
+                if timeNow - checkedAt < cacheCheckInterval:
+                    toLoad = False
+                else:
+                    # check version
+                    useDB = True
+                    cacheStats['probes'] += 1
+                    varMap = dict()
+                    varMap[":mainKey"] = main_key
+                    sqlV = "SELECT dataVersion FROM {0} WHERE mainKey=:mainKey ".format(cacheTableName)
+                    if sub_key is not None:
+                        sqlV += "AND subKey=:subKey "
+                        varMap[":subKey"] = sub_key
+                    self.execute(sqlV, varMap)
+                    resV = self.cur.fetchone()
+                    # commit
+                    self.commit()
+                    # keep data if unchanged or deleted in DB
+                    if resV is None or resV[0] == dataVersion:
+                        globalDict[versionKey] = (dataVersion, timeNow)
+                        toLoad = False
+                    else:
+                        tmpLog.debug('version moved from {0} to {1}'.format(dataVersion, resV[0]))
+            if not toLoad:
+                cacheStats['hits'] += 1
                 # make spec
                 cacheSpec = CacheSpec()
                 cacheSpec.data = globalDict[cacheKey]
             else:
                 # read from database
                 useDB = True
+                if cacheKey in globalDict:
+                    cacheStats['reloads'] += 1
+                else:
+                    cacheStats['misses'] += 1
                 sql = "SELECT {0} FROM {1} ".format(CacheSpec.column_names(), cacheTableName)
                 sql += "WHERE mainKey=:mainKey "
                 varMap = dict()
@@ -2985,16 +3549,14 @@ class DBProxy(object):
                 # commit
                 self.commit()
                 if resJ is None:
-                    # release dict
-                    globalDict.release()
                     return None
                 # make spec
                 cacheSpec = CacheSpec()
                 cacheSpec.pack(resJ)
                 # put into global dict
                 globalDict[cacheKey] = cacheSpec.data
-                # release dict
-                globalDict.release()
+                globalDict[versionKey] = (cacheSpec.dataVersion, time.time())
+                self.put_cache_indexes(globalDict, main_key, sub_key, cacheSpec.data, tmpLog)
             tmpLog.debug('done')
             # return
             return cacheSpec
@@ -3006,6 +3568,64 @@ class DBProxy(object):
             core_utils.dump_error_message(_logger)
             # return
             return None
+        finally:
+            # release dict
+            if locked:
+                globalDict.release()
+
+    # get stats of cached data in the process
+    def get_cache_stats(self):
+        globalDict = core_utils.get_global_dict()
+        globalDict.acquire()
+        try:
+            return {'hits': cacheStats['hits'],
+                    'misses': cacheStats['misses'],
+                    'probes': cacheStats['probes'],
+                    'reloads': cacheStats['reloads']}
+        finally:
+            globalDict.release()
+
+    # make derived indexes over cached data and put them into global dict. Must be called with the dict locked
+    def put_cache_indexes(self, global_dict, main_key, sub_key, data, tmp_log):
+        for indexName, func in iteritems(cacheIndexFunctions.get(main_key, dict())):
+            indexKey = 'cache_index|{0}|{1}|{2}'.format(main_key, sub_key, indexName)
+            try:
+                global_dict[indexKey] = func(data)
+            except Exception:
+                tmp_log.error('failed to make index={0}'.format(indexName))
+                core_utils.dump_error_message(tmp_log)
+                global_dict[indexKey] = None
+
+    # get a derived index over cached data
+    def get_cache_index(self, main_key, index_name, sub_key=None):
+        try:
+            # get logger
+            tmpLog = core_utils.make_logger(_logger, 'mainKey={0} subKey={1} index={2}'.format(main_key, sub_key,
+                                                                                              index_name),
+                                            method_name='get_cache_index')
+            if index_name not in cacheIndexFunctions.get(main_key, dict()):
+                tmpLog.error('index is not registered')
+                return None
+            # get data which makes indexes as well when loaded or reloaded
+            cacheSpec = self.get_cache(main_key, sub_key)
+            if cacheSpec is None:
+                return None
+            # get from global dict
+            indexKey = 'cache_index|{0}|{1}|{2}'.format(main_key, sub_key, index_name)
+            globalDict = core_utils.get_global_dict()
+            globalDict.acquire()
+            try:
+                # index registered after data was loaded
+                if indexKey not in globalDict:
+                    self.put_cache_indexes(globalDict, main_key, sub_key, cacheSpec.data, tmpLog)
+                return globalDict[indexKey]
+            finally:
+                globalDict.release()
+        except Exception:
+            # dump error
+            core_utils.dump_error_message(_logger)
+            # return
+            return None
 
     # store commands
     def store_commands(self, command_specs):
@@ -3253,7 +3873,7 @@ class DBProxy(object):
                 retMap[resourceType][workerStatus] = cnt
             # commit
             self.commit()
-            tmpLog.debug('got {0}'.format(str(retMap)))
+            tmpLog.debug('got %s', retMap)
             return retMap
         except Exception:
             # roll back
@@ -3307,7 +3927,7 @@ class DBProxy(object):
 
             # commit
             self.commit()
-            tmpLog.debug('got {0}'.format(str(retMap)))
+            tmpLog.debug('got %s', retMap)
             return retMap
         except Exception:
             # roll back
@@ -3585,6 +4205,53 @@ class DBProxy(object):
             # return
             return False
 
+    # delete workers together with their jobs, files, events, and relations
+    def delete_workers(self, worker_ids):
+        try:
+            # get logger
+            tmpLog = core_utils.make_logger(_logger, method_name='delete_workers')
+            tmpLog.debug('start for {0} workers'.format(len(worker_ids)))
+            # sql to get jobs
+            sqlJ = "SELECT DISTINCT PandaID FROM {0} ".format(jobWorkerTableName)
+            sqlJ += "WHERE workerID IN ({0}) "
+            # sql to delete jobs, files, events, and relations
+            sqlDList = []
+            for tableName in [jobTableName, fileTableName, eventTableName, jobWorkerTableName]:
+                sqlD = "DELETE FROM {0} ".format(tableName)
+                sqlD += "WHERE PandaID IN ({0}) "
+                sqlDList.append(sqlD)
+            # sql to delete workers
+            sqlDW = "DELETE FROM {0} ".format(workTableName)
+            sqlDW += "WHERE workerID IN ({0}) "
+            # get jobs
+            workerIDs = list(set(worker_ids))
+            pandaIDs = set()
+            for tmpWorkerIDs in core_utils.create_shards(workerIDs, nInClauseChunk):
+                inClause, varMap = self._make_in_clause('workerID', tmpWorkerIDs)
+                self.execute(sqlJ.format(inClause), varMap)
+                for pandaID, in self.cur.fetchall():
+                    pandaIDs.add(pandaID)
+            # delete jobs, files, events, and relations
+            for tmpPandaIDs in core_utils.create_shards(list(pandaIDs), nInClauseChunk):
+                inClause, varMap = self._make_in_clause('PandaID', tmpPandaIDs)
+                for sqlD in sqlDList:
+                    self.execute(sqlD.format(inClause), varMap)
+            # delete workers
+            for tmpWorkerIDs in core_utils.create_shards(workerIDs, nInClauseChunk):
+                inClause, varMap = self._make_in_clause('workerID', tmpWorkerIDs)
+                self.execute(sqlDW.format(inClause), varMap)
+            # commit
+            self.commit()
+            tmpLog.debug('done with {0} jobs'.format(len(pandaIDs)))
+            return True
+        except Exception:
+            # roll back
+            self.rollback()
+            # dump error
+            core_utils.dump_error_message(_logger)
+            # return
+            return False
+
     # release jobs
     def release_jobs(self, panda_ids, locked_by):
         try:
@@ -3916,7 +4583,7 @@ class DBProxy(object):
                         retVal = True
             # commit
             self.commit()
-            tmpLog.debug('done with {0}'.format(retVal))
+            tmpLog.debug('done with %s', retVal)
             return retVal
         except Exception:
             # roll back
@@ -3979,7 +4646,7 @@ class DBProxy(object):
                 retMap[status] = cnt
             # commit
             self.commit()
-            tmpLog.debug('got {0}'.format(str(retMap)))
+            tmpLog.debug('got %s', retMap)
             return retMap
         except Exception:
             # roll back
@@ -3989,6 +4656,45 @@ class DBProxy(object):
             # return
             return {}
 
+    # get status counts of files with a list of LFNs
+    def get_file_status_bulk(self, lfns, file_type, endpoint, job_status):
+        try:
+            # get logger
+            tmpLog = core_utils.make_logger(_logger, 'endpoint={0}'.format(endpoint),
+                                            method_name='get_file_status_bulk')
+            tmpLog.debug('start for {0} LFNs'.format(len(lfns)))
+            # sql to get files
+            sqlF = "SELECT f.lfn, f.status, COUNT(*) cnt FROM {0} f, {1} j ".format(fileTableName, jobTableName)
+            sqlF += "WHERE j.PandaID=f.PandaID AND j.status=:jobStatus "
+            sqlF += "AND f.lfn IN ({0}) AND f.fileType=:type "
+            if endpoint is not None:
+                sqlF += "AND f.endpoint=:endpoint "
+            sqlF += "GROUP BY f.lfn, f.status "
+            # get files
+            retMap = dict()
+            for lfn in lfns:
+                retMap[lfn] = dict()
+            for tmpLFNs in core_utils.create_shards(list(retMap), nInClauseChunk):
+                inClause, varMap = self._make_in_clause('lfn', tmpLFNs)
+                varMap[':type'] = file_type
+                varMap[':jobStatus'] = job_status
+                if endpoint is not None:
+                    varMap[':endpoint'] = endpoint
+                self.execute(sqlF.format(inClause), varMap)
+                for lfn, status, cnt in self.cur.fetchall():
+                    retMap[lfn][status] = cnt
+            # commit
+            self.commit()
+            tmpLog.debug('got for {0} LFNs'.format(len(retMap)))
+            return retMap
+        except Exception:
+            # roll back
+            self.rollback()
+            # dump error
+            core_utils.dump_error_message(_logger)
+            # return
+            return None
+
     # change file status
     def change_file_status(self, panda_id, data, locked_by):
         try:
@@ -4064,7 +4770,7 @@ class DBProxy(object):
                 retVal = {'groupID': groupID, 'groupStatus': groupStatus, 'groupUpdateTime': groupUpdateTime}
             # commit
             self.commit()
-            tmpLog.debug('got {0}'.format(str(retVal)))
+            tmpLog.debug('got %s', retVal)
             return retVal
         except Exception:
             # roll back
@@ -4074,6 +4780,49 @@ class DBProxy(object):
             # return
             return None
 
+    # get groups with the latest update for a list of LFNs. LFNs without group are omitted
+    def get_groups_for_files(self, lfns, file_type, endpoint):
+        try:
+            # get logger
+            tmpLog = core_utils.make_logger(_logger, 'endpoint={0}'.format(endpoint),
+                                            method_name='get_groups_for_files')
+            tmpLog.debug('start for {0} LFNs'.format(len(lfns)))
+            # sql to get groups
+            sqlF = "SELECT lfn,groupID,groupStatus,groupUpdateTime FROM {0} ".format(fileTableName)
+            sqlF += "WHERE lfn IN ({0}) AND fileType=:type "
+            sqlF += "AND groupID IS NOT NULL AND groupStatus<>:ngStatus "
+            if endpoint is not None:
+                sqlF += "AND endpoint=:endpoint "
+            # get groups
+            retMap = dict()
+            for tmpLFNs in core_utils.create_shards(list(set(lfns)), nInClauseChunk):
+                inClause, varMap = self._make_in_clause('lfn', tmpLFNs)
+                varMap[':type'] = file_type
+                varMap[':ngStatus'] = 'failed'
+                if endpoint is not None:
+                    varMap[':endpoint'] = endpoint
+                self.execute(sqlF.format(inClause), varMap)
+                for lfn, groupID, groupStatus, groupUpdateTime in self.cur.fetchall():
+                    # take the latest update
+                    if lfn in retMap:
+                        lastUpdateTime = retMap[lfn]['groupUpdateTime']
+                        if groupUpdateTime is None or \
+                                (lastUpdateTime is not None and lastUpdateTime >= groupUpdateTime):
+                            continue
+                    retMap[lfn] = {'groupID': groupID, 'groupStatus': groupStatus,
+                                   'groupUpdateTime': groupUpdateTime}
+            # commit
+            self.commit()
+            tmpLog.debug('got groups for {0} LFNs'.format(len(retMap)))
+            return retMap
+        except Exception:
+            # roll back
+            self.rollback()
+            # dump error
+            core_utils.dump_error_message(_logger)
+            # return
+            return None
+
     # get files with a group ID
     def get_files_with_group_id(self, group_id):
         try:
@@ -4153,7 +4902,7 @@ class DBProxy(object):
                 retVal.add(groupStatus)
             # commit
             self.commit()
-            tmpLog.debug('get {0}'.format(str(retVal)))
+            tmpLog.debug('get %s', retVal)
             return retVal
         except Exception:
             # roll back
@@ -4194,7 +4943,7 @@ class DBProxy(object):
                     retVal = True
             # commit
             self.commit()
-            tmpLog.debug('done with {0}'.format(retVal))
+            tmpLog.debug('done with %s', retVal)
             # return
             return retVal
         except Exception:
@@ -4365,7 +5114,7 @@ class DBProxy(object):
                 })
             # commit
             self.commit()
-            tmpLog.debug('got {0}'.format(str(retMap)))
+            tmpLog.debug('got %s', retMap)
             return retMap
         except Exception:
             # roll back
@@ -4403,7 +5152,7 @@ class DBProxy(object):
                 retMap[computingElement][workerStatus] = cnt
             # commit
             self.commit()
-            tmpLog.debug('got {0}'.format(str(retMap)))
+            tmpLog.debug('got %s', retMap)
             return retMap
         except Exception:
             # roll back
@@ -4719,7 +5468,7 @@ class DBProxy(object):
                 # lock worker
                 self.execute(sqlL, varMap)
                 nRow = self.cur.rowcount
-                tmpLog.debug('done with {0}'.format(nRow))
+                tmpLog.debug('done with %s', nRow)
                 # false if failed to lock
                 if nRow == 0:
                     retVal = False
@@ -4958,7 +5707,7 @@ class DBProxy(object):
             nRow = self.cur.rowcount
             # commit
             self.commit()
-            tmpLog.debug('done with {0}'.format(nRow))
+            tmpLog.debug('done with %s', nRow)
             # return
             return nRow
         except Exception:
@@ -4993,7 +5742,7 @@ class DBProxy(object):
             nRow = self.cur.rowcount
             # commit
             self.commit()
-            tmpLog.debug('done with {0}'.format(nRow))
+            tmpLog.debug('done with %s', nRow)
             # return
             return True
         except Exception:
@@ -5085,7 +5834,7 @@ class DBProxy(object):
                     retVal = True
             # commit
             self.commit()
-            tmpLog.debug('done with {0}'.format(retVal))
+            tmpLog.debug('done with %s', retVal)
             # return
             return retVal
         except Exception:
@@ -5141,7 +5890,7 @@ class DBProxy(object):
 
             # commit
             self.commit()
-            tmpLog.debug('got {0}'.format(str(res)))
+            tmpLog.debug('got %s', res)
             return res_corrected
         except Exception:
             # roll back
@@ -0,0 +1,351 @@
+"""
+Codecs to serialize fifo objects
+
+"""
+
+import io
+import copy
+import zlib
+import operator
+import importlib
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+
+from .spec_base import SpecBase
+
+# header of items not encoded as plain pickle; plain pickle never starts with a null byte
+_magic = b'\x00HF'
+
+# codec identifiers in header
+_codec_pickle = b'P'
+_codec_compact = b'C'
+_codec_compact_reduce = b'R'
+
+# compression identifiers in header
+_compression_none = b'N'
+_compression_zlib = b'Z'
+_compression_lz4 = b'L'
+
+# tags of nodes in compact format
+_tag_value = 0
+_tag_list = 1
+_tag_tuple = 2
+_tag_spec = 3
+
+
+# exception for codec errors
+class FifoCodecError(Exception):
+    pass
+
+
+# per-class metadata of specs to rebuild objects without calling the constructor
+class _SpecClassInfo(object):
+    def __init__(self, cls):
+        tmpObj = cls()
+        metadata = cls.get_class_metadata()
+        self.cls = cls
+        self.key = (cls.__module__, cls.__name__)
+        self.attributes = metadata.attributes
+        self.attributeSet = metadata.attributeSet
+        self.serializedAttrs = metadata.serializedAttrs
+        # default values of non-column attributes
+        self.defaults = dict()
+        for tmpKey, tmpVal in tmpObj.__dict__.items():
+            if tmpKey in self.attributeSet or tmpKey in ('attributes', 'serializedAttrs', 'changedAttrs'):
+                continue
+            self.defaults[tmpKey] = tmpVal
+        # column attributes followed by non-column attributes kept by pickle
+        extraKeys = [tmpKey for tmpKey in tmpObj.__getstate__()
+                     if tmpKey not in self.attributeSet and tmpKey not in ('attributes', 'serializedAttrs')]
+        self.schema = tuple(self.attributes) + tuple(extraKeys)
+        self.schemaSet = frozenset(self.schema)
+        self.get_schema_values = operator.itemgetter(*self.schema)
+        # defaults of attributes not kept by pickle
+        self.droppedDefaults = dict([(tmpKey, tmpVal) for tmpKey, tmpVal in self.defaults.items()
+                                     if tmpKey not in self.schemaSet])
+        self.nKeys = len(tmpObj.__dict__)
+
+
+# cache of class info
+_classInfoMap = dict()
+
+
+# get class info
+def _get_class_info(cls):
+    try:
+        return _classInfoMap[cls]
+    except KeyError:
+        classInfo = _SpecClassInfo(cls)
+        _classInfoMap[cls] = classInfo
+        return classInfo
+
+
+# cache of classes resolved by module and class names
+_classMap = dict()
+
+
+# resolve class
+def _resolve_class(module_name, class_name):
+    try:
+        return _classMap[(module_name, class_name)]
+    except KeyError:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        if not (isinstance(cls, type) and issubclass(cls, SpecBase)):
+            raise FifoCodecError('{0}.{1} is not a spec class'.format(module_name, class_name))
+        _classMap[(module_name, class_name)] = cls
+        return cls
+
+
+# rebuild a spec from values in the order of schema
+def _rebuild_spec(cls, schema, values):
+    classInfo = _get_class_info(cls)
+    obj = cls.__new__(cls)
+    objDict = obj.__dict__
+    objDict['attributes'] = classInfo.attributes
+    objDict['serializedAttrs'] = classInfo.serializedAttrs
+    if schema == classInfo.schema:
+        objDict.update(zip(schema, values))
+    else:
+        # attributes changed since the object was encoded
+        tmpValues = dict(zip(schema, values))
+        for attr in classInfo.attributes:
+            objDict[attr] = tmpValues.get(attr)
+        for tmpKey, tmpVal in classInfo.defaults.items():
+            if tmpKey in tmpValues:
+                objDict[tmpKey] = tmpValues[tmpKey]
+            else:
+                objDict[tmpKey] = copy.copy(tmpVal)
+    for tmpKey, tmpVal in classInfo.droppedDefaults.items():
+        objDict[tmpKey] = copy.copy(tmpVal)
+    objDict['changedAttrs'] = {}
+    return obj
+
+
+# reduce a spec to the class, schema, and values, which are encoded by pickle
+def _reduce_spec(obj):
+    classInfo = _get_class_info(obj.__class__)
+    objDict = obj.__dict__
+    # plain pickle for objects with attributes added or removed after construction
+    if len(objDict) != classInfo.nKeys:
+        return obj.__reduce_ex__(pickle.HIGHEST_PROTOCOL)
+    try:
+        values = classInfo.get_schema_values(objDict)
+    except KeyError:
+        return obj.__reduce_ex__(pickle.HIGHEST_PROTOCOL)
+    return _rebuild_spec, (obj.__class__, classInfo.schema, values)
+
+
+# get all spec classes
+def _get_spec_classes():
+    retList = []
+    tmpList = [SpecBase]
+    while tmpList:
+        cls = tmpList.pop()
+        retList.append(cls)
+        tmpList += cls.__subclasses__()
+    return retList
+
+
+# check if pickler takes a dispatch table
+def _has_dispatch_table():
+    try:
+        pickler = pickle.Pickler(io.BytesIO(), -1)
+        pickler.dispatch_table = dict()
+        return True
+    except Exception:
+        return False
+
+
+# codec with plain pickle
+class PickleCodec(object):
+    codecID = _codec_pickle
+
+    # encode
+    def dumps(self, obj):
+        return pickle.dumps(obj, -1)
+
+    # decode
+    def loads(self, data):
+        return pickle.loads(data)
+
+
+# codec to keep only column values of specs in attribute order
+class CompactCodec(object):
+    codecID = _codec_compact
+
+    # pack an object into tagged nodes
+    def _pack(self, obj, class_index_map, class_table):
+        if isinstance(obj, SpecBase):
+            classInfo = _get_class_info(obj.__class__)
+            try:
+                classIndex = class_index_map[classInfo.key]
+            except KeyError:
+                classIndex = len(class_table)
+                class_index_map[classInfo.key] = classIndex
+                class_table.append((classInfo.key[0], classInfo.key[1], classInfo.attributes))
+            objDict = obj.__dict__
+            values = tuple([objDict[attr] for attr in classInfo.attributes])
+            # non-column attributes which are kept by pickle
+            extras = dict()
+            for tmpKey, tmpVal in obj.__getstate__().items():
+                if tmpKey in classInfo.attributeSet or tmpKey in ('attributes', 'serializedAttrs'):
+                    continue
+                extras[tmpKey] = self._pack(tmpVal, class_index_map, class_table)
+            return (_tag_spec, classIndex, values, extras)
+        elif isinstance(obj, list):
+            return (_tag_list, [self._pack(x, class_index_map, class_table) for x in obj])
+        elif isinstance(obj, tuple):
+            return (_tag_tuple, tuple([self._pack(x, class_index_map, class_table) for x in obj]))
+        return (_tag_value, obj)
+
+    # unpack tagged nodes
+    def _unpack(self, node, class_list):
+        tag = node[0]
+        if tag == _tag_value:
+            return node[1]
+        elif tag == _tag_list:
+            return [self._unpack(x, class_list) for x in node[1]]
+        elif tag == _tag_tuple:
+            return tuple([self._unpack(x, class_list) for x in node[1]])
+        elif tag == _tag_spec:
+            classInfo, attributes = class_list[node[1]]
+            obj = classInfo.cls.__new__(classInfo.cls)
+            objDict = obj.__dict__
+            objDict['attributes'] = classInfo.attributes
+            objDict['serializedAttrs'] = classInfo.serializedAttrs
+            if attributes is None:
+                objDict.update(zip(classInfo.attributes, node[2]))
+            else:
+                # attributes changed since the object was encoded
+                tmpValues = dict(zip(attributes, node[2]))
+                for attr in classInfo.attributes:
+                    objDict[attr] = tmpValues.get(attr)
+            extras = node[3]
+            for tmpKey, tmpVal in extras.items():
+                objDict[tmpKey] = self._unpack(tmpVal, class_list)
+            for tmpKey, tmpVal in classInfo.defaults.items():
+                if tmpKey not in extras:
+                    objDict[tmpKey] = copy.copy(tmpVal)
+            objDict['changedAttrs'] = {}
+            return obj
+        raise FifoCodecError('unknown tag {0}'.format(tag))
+
+    # encode
+    def dumps(self, obj):
+        classIndexMap = dict()
+        classTable = []
+        packed = self._pack(obj, classIndexMap, classTable)
+        return pickle.dumps((classTable, packed), -1)
+
+    # decode
+    def loads(self, data):
+        classTable, packed = pickle.loads(data)
+        classList = []
+        for moduleName, className, attributes in classTable:
+            classInfo = _get_class_info(_resolve_class(moduleName, className))
+            if tuple(attributes) == classInfo.attributes:
+                attributes = None
+            classList.append((classInfo, attributes))
+        return self._unpack(packed, classList)
+
+
+# codec to keep only values of specs in attribute order, letting pickle traverse objects
+class CompactReduceCodec(object):
+    codecID = _codec_compact_reduce
+
+    # constructor
+    def __init__(self):
+        self.dispatchTable = dict()
+
+    # encode
+    def dumps(self, obj):
+        # register spec classes defined after the last call
+        specClasses = _get_spec_classes()
+        if len(specClasses) != len(self.dispatchTable):
+            self.dispatchTable = dict([(cls, _reduce_spec) for cls in specClasses])
+        tmpFile = io.BytesIO()
+        pickler = pickle.Pickler(tmpFile, -1)
+        pickler.dispatch_table = self.dispatchTable
+        pickler.dump(obj)
+        return tmpFile.getvalue()
+
+    # decode
+    def loads(self, data):
+        return pickle.loads(data)
+
+
+# codec instances. The compact codec traverses objects with python code unless pickler takes a dispatch table
+_codecMap = {
+    'pickle': PickleCodec(),
+    'compact': CompactReduceCodec() if _has_dispatch_table() else CompactCodec(),
+    }
+_codecIDMap = dict([(codec.codecID, codec) for codec in [PickleCodec(), CompactCodec(), CompactReduceCodec()]])
+
+
+# compress
+def _compress(data, compression):
+    if compression == _compression_zlib:
+        return zlib.compress(data, 1)
+    elif compression == _compression_lz4:
+        return lz4frame.compress(data)
+    return data
+
+
+# decompress
+def _decompress(data, compression):
+    if compression == _compression_none:
+        return data
+    elif compression == _compression_zlib:
+        return zlib.decompress(data)
+    elif compression == _compression_lz4:
+        if lz4frame is None:
+            raise FifoCodecError('lz4 is unavailable to decompress the item')
+        return lz4frame.decompress(data)
+    raise FifoCodecError('unknown compression {0}'.format(compression))
+
+
+# serializer for fifo items
+class FifoSerializer(object):
+    # constructor
+    def __init__(self, codec_name='pickle', compression_name=None):
+        if codec_name not in _codecMap:
+            raise FifoCodecError('unknown codec {0}'.format(codec_name))
+        self.codec = _codecMap[codec_name]
+        if compression_name in [None, '', 'none']:
+            self.compression = _compression_none
+        elif compression_name == 'zlib':
+            self.compression = _compression_zlib
+        elif compression_name == 'lz4':
+            if lz4frame is None:
+                raise FifoCodecError('lz4 is not installed')
+            self.compression = _compression_lz4
+        else:
+            raise FifoCodecError('unknown compression {0}'.format(compression_name))
+
+    # encode; plain pickle without compression is kept headerless to be readable by old versions
+    def encode(self, obj):
+        if self.codec.codecID == _codec_pickle and self.compression == _compression_none:
+            return self.codec.dumps(obj)
+        return _magic + self.codec.codecID + self.compression + _compress(self.codec.dumps(obj), self.compression)
+
+    # decode items encoded with any codec
+    def decode(self, data):
+        data = bytes(data)
+        if not data.startswith(_magic):
+            return pickle.loads(data)
+        headerLen = len(_magic)
+        codecID = data[headerLen:headerLen + 1]
+        compression = data[headerLen + 1:headerLen + 2]
+        try:
+            codec = _codecIDMap[codecID]
+        except KeyError:
+            raise FifoCodecError('unknown codec {0}'.format(codecID))
+        return codec.loads(_decompress(data[headerLen + 2:], compression))
@@ -22,6 +22,7 @@ from pandaharvester.harvestercore import core_utils
 from pandaharvester.harvestercore.plugin_factory import PluginFactory
 from pandaharvester.harvestercore.db_proxy_pool import DBProxyPool as DBProxy
 from pandaharvester.harvestercore.db_interface import DBInterface
+from pandaharvester.harvestercore.fifo_codec import FifoSerializer
 
 # attribute list
 _attribute_list = ['id', 'item', 'score']
@@ -43,6 +44,7 @@ class FIFOBase(object):
         self.os_pid = os.getpid()
         self.dbProxy = DBProxy()
         self.dbInterface = DBInterface()
+        self.serializer = FifoSerializer()
 
     # get process identifier
     def get_pid(self):
@@ -80,15 +82,35 @@ class FIFOBase(object):
                                 'name': harvester_config.fifo.fifoClass,} )
         pluginFactory = PluginFactory()
         self.fifo = pluginFactory.get_plugin(pluginConf)
+        self._initialize_serializer(self.config)
+
+    # intialize serializer with fifoCodec and fifoCompression in the section or in fifo section
+    def _initialize_serializer(self, config=None):
+        mainLog = self.make_logger(_logger, 'id={0}-{1}'.format(self.fifoName, self.get_pid()),
+                                   method_name='_initialize_serializer')
+        codecName = 'pickle'
+        compressionName = None
+        for tmpConfig in [getattr(harvester_config, 'fifo', None), config]:
+            if tmpConfig is None:
+                continue
+            codecName = getattr(tmpConfig, 'fifoCodec', codecName)
+            compressionName = getattr(tmpConfig, 'fifoCompression', compressionName)
+        try:
+            self.serializer = FifoSerializer(codecName, compressionName)
+        except Exception:
+            core_utils.dump_error_message(mainLog)
+            mainLog.error('failed to use codec={0} compression={1}. Use pickle'.format(codecName,
+                                                                                     compressionName))
+            self.serializer = FifoSerializer()
 
     # encode
     def encode(self, obj):
-        obj_serialized = pickle.dumps(obj, -1)
+        obj_serialized = self.serializer.encode(obj)
         return obj_serialized
 
-    # decode
+    # decode; items in any codec or in plain pickle can be decoded
     def decode(self, obj_serialized):
-        obj = pickle.loads(obj_serialized)
+        obj = self.serializer.decode(obj_serialized)
         return obj
 
     # size of queue
@@ -112,6 +134,29 @@ class FIFOBase(object):
         mainLog.debug('score={0}'.format(score))
         return retVal
 
+    # enqueue many objects; obj_score_list is a list of (obj, score)
+    def put_many(self, obj_score_list, encode_item=True):
+        mainLog = self.make_logger(_logger, 'id={0}-{1}'.format(self.fifoName, self.get_pid()), method_name='put_many')
+        timeNow_timestamp = time.time()
+        obj_serialized_score_list = []
+        for obj, score in obj_score_list:
+            if encode_item:
+                obj_serialized = self.encode(obj)
+            else:
+                obj_serialized = obj
+            if score is None:
+                score = timeNow_timestamp
+            obj_serialized_score_list.append((obj_serialized, score))
+        if hasattr(self.fifo, 'put_many'):
+            retVal = self.fifo.put_many(obj_serialized_score_list)
+        else:
+            retVal = 0
+            for obj_serialized, score in obj_serialized_score_list:
+                self.fifo.put(obj_serialized, score)
+                retVal += 1
+        mainLog.debug('put {0} objects'.format(len(obj_serialized_score_list)))
+        return retVal
+
     # enqueue by id, which is unique
     def putbyid(self, id, obj, score=None, encode_item=True):
         mainLog = self.make_logger(_logger, 'id={0}-{1}'.format(self.fifoName, self.get_pid()), method_name='putbyid')
@@ -143,6 +188,36 @@ class FIFOBase(object):
         mainLog.debug('called. protective={0}'.format(protective))
         return retVal
 
+    # dequeue to get up to n_objects first fifo objects with score not larger than max_score
+    def get_many(self, n_objects, timeout=None, protective=False, decode_item=True, max_score=None):
+        mainLog = self.make_logger(_logger, 'id={0}-{1}'.format(self.fifoName, self.get_pid()), method_name='get_many')
+        if hasattr(self.fifo, 'get_many'):
+            object_tuple_list = self.fifo.get_many(n_objects, timeout=timeout, protective=protective,
+                                                   max_score=max_score)
+        else:
+            # emulate with peek and get for plugins without batch dequeue
+            object_tuple_list = []
+            while len(object_tuple_list) < n_objects:
+                if max_score is not None:
+                    peeked_tuple = self.fifo.peek(skip_item=True)
+                    if peeked_tuple is None or peeked_tuple[2] > max_score:
+                        break
+                object_tuple = self.fifo.get(timeout, protective)
+                if object_tuple is None or object_tuple[0] is None:
+                    break
+                object_tuple_list.append(object_tuple)
+                # no more wait once something is gotten
+                timeout = 0
+        retVal = []
+        for id, obj_serialized, score in object_tuple_list:
+            if obj_serialized is not None and decode_item:
+                obj = self.decode(obj_serialized)
+            else:
+                obj = obj_serialized
+            retVal.append(FifoObject(id, obj, score))
+        mainLog.debug('got {0} objects. protective={1}'.format(len(retVal), protective))
+        return retVal
+
     # dequeue to get the last fifo object
     def getlast(self, timeout=None, protective=False, decode_item=True):
         mainLog = self.make_logger(_logger, 'id={0}-{1}'.format(self.fifoName, self.get_pid()), method_name='getlast')
@@ -225,6 +300,10 @@ class FIFOBase(object):
         mainLog.debug('released {0} objects in {1}'.format(retVal, ids))
         return retVal
 
+    # remove fifo objects gotten with protective dequeue from temporary space
+    def release_many(self, fifo_objects):
+        return self.release([obj.id for obj in fifo_objects])
+
     # restore objects by list of ids from temporary space to fifo; ids=None to restore all objects
     def restore(self, ids=None):
         mainLog = self.make_logger(_logger, 'id={0}-{1}'.format(self.fifoName, self.get_pid()), method_name='restore')
@@ -248,6 +327,7 @@ class SpecialFIFOBase(FIFOBase):
                             'name': harvester_config.fifo.fifoClass,} )
         pluginFactory = PluginFactory()
         self.fifo = pluginFactory.get_plugin(pluginConf)
+        self._initialize_serializer()
 
 
 # Benchmark fifo
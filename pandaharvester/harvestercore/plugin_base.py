@@ -3,6 +3,11 @@ from pandaharvester.harvestercore import core_utils
 
 
 class PluginBase(object):
+    # instances can be reused by PluginFactory for the same plugin config, i.e. no state is kept between calls
+    instanceCacheable = False
+    # cached instances can be shared among threads. Otherwise an instance is cached in each thread
+    threadSafe = False
+
     def __init__(self, **kwarg):
         for tmpKey, tmpVal in iteritems(kwarg):
             setattr(self, tmpKey, tmpVal)
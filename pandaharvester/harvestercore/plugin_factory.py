@@ -1,3 +1,7 @@
+import json
+import weakref
+import hashlib
+import threading
 from future.utils import iteritems
 
 from . import core_utils
@@ -7,6 +11,31 @@ from .db_interface import DBInterface
 _logger = core_utils.setup_logger('plugin_factory')
 
 
+# map of plugin instances. (plugin, queue, noDB) -> (config hash, instance). Subclassed to be weakly referred to
+class InstanceMap(dict):
+    pass
+
+
+# plugin instances shared among threads
+sharedInstances = InstanceMap()
+
+# plugin instances in each thread
+localInstances = threading.local()
+
+# all maps of plugin instances to evict instances in other threads. id -> map. Maps are dropped when threads end
+instanceMaps = weakref.WeakValueDictionary()
+instanceMaps[id(sharedInstances)] = sharedInstances
+
+# number of instances constructed, reused, and evicted for each plugin
+pluginStats = dict()
+
+# lock for instances and stats
+instanceLock = threading.Lock()
+
+# locks to construct each plugin instance
+constructionLocks = dict()
+
+
 # plugin factory
 class PluginFactory(object):
     # constructor
@@ -35,6 +64,55 @@ class PluginFactory(object):
             cls = getattr(mod, className)
             # add
             self.classMap[pluginKey] = cls
+        cls = self.classMap[pluginKey]
+        # get cached instance
+        if getattr(cls, 'instanceCacheable', False):
+            confHash = hashlib.md5(json.dumps(plugin_conf, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+            # instances for the same queue are replaced when the queue config changes
+            queueName = plugin_conf.get('queueName')
+            if queueName is None:
+                queueName = confHash
+            cacheKey = (pluginKey, queueName, self.noDB)
+            if getattr(cls, 'threadSafe', False):
+                instanceMap = sharedInstances
+            else:
+                try:
+                    instanceMap = localInstances.instanceMap
+                except AttributeError:
+                    instanceMap = InstanceMap()
+                    localInstances.instanceMap = instanceMap
+                    with instanceLock:
+                        instanceMaps[id(instanceMap)] = instanceMap
+            with instanceLock:
+                impl = self.get_cached_instance(pluginKey, instanceMap, cacheKey, confHash)
+                if impl is not None:
+                    return impl
+                keyLock = constructionLocks.setdefault(cacheKey, threading.Lock())
+            # construct only once even if threads ask for the instance at the same time
+            with keyLock:
+                with instanceLock:
+                    impl = self.get_cached_instance(pluginKey, instanceMap, cacheKey, confHash)
+                    if impl is not None:
+                        return impl
+                impl = self.make_instance(pluginKey, cls, plugin_conf)
+                with instanceLock:
+                    if cacheKey in instanceMap:
+                        self.count(pluginKey, 'evicted')
+                    instanceMap[cacheKey] = (confHash, impl)
+            return impl
+        return self.make_instance(pluginKey, cls, plugin_conf)
+
+    # get a cached instance if made with the same config. Must be called with instanceLock
+    def get_cached_instance(self, plugin_key, instance_map, cache_key, conf_hash):
+        if cache_key in instance_map:
+            confHash, impl = instance_map[cache_key]
+            if confHash == conf_hash:
+                self.count(plugin_key, 'reused')
+                return impl
+        return None
+
+    # instantiate plugin
+    def make_instance(self, plugin_key, cls, plugin_conf):
         # make args
         args = {}
         for tmpKey, tmpVal in iteritems(plugin_conf):
@@ -45,6 +123,30 @@ class PluginFactory(object):
         if not self.noDB:
             args['dbInterface'] = DBInterface()
         # instantiate
-        cls = self.classMap[pluginKey]
         impl = cls(**args)
+        with instanceLock:
+            self.count(plugin_key, 'constructed')
         return impl
+
+    # evict cached instances for queues in all threads, e.g. when queues are removed or their config is changed
+    def evict_instances(self, queue_names):
+        queueNames = set(queue_names)
+        if not queueNames:
+            return
+        with instanceLock:
+            for instanceMap in list(instanceMaps.values()):
+                for cacheKey in [cacheKey for cacheKey in instanceMap if cacheKey[1] in queueNames]:
+                    del instanceMap[cacheKey]
+                    self.count(cacheKey[0], 'evicted')
+            for cacheKey in [cacheKey for cacheKey in constructionLocks if cacheKey[1] in queueNames]:
+                del constructionLocks[cacheKey]
+
+    # increment counter of a plugin. Must be called with instanceLock
+    def count(self, plugin_key, counter_name):
+        pluginStats.setdefault(plugin_key, {'constructed': 0, 'reused': 0, 'evicted': 0})
+        pluginStats[plugin_key][counter_name] += 1
+
+    # get numbers of instances constructed, reused, and evicted for each plugin in the process
+    def get_stats(self):
+        with instanceLock:
+            return dict((pluginKey, dict(stats)) for pluginKey, stats in iteritems(pluginStats))
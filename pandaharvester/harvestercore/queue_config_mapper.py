@@ -1,6 +1,7 @@
 import os
 import json
 import copy
+import hashlib
 import datetime
 import threading
 import importlib
@@ -168,6 +169,11 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
     def __init__(self, update_db=True):
         self.lock = threading.Lock()
         self.lastUpdate = None
+        # hashes of source documents and inputs of each queue to rebuild only changed queues
+        self.sourceHashes = dict()
+        self.queueHashes = dict()
+        # queue configs, active queue configs, and queue configs with configIDs, swapped at once
+        self.snapshot = (dict(), dict(), dict())
         self.dbProxy = DBProxy()
         self.toUpdateDB = update_db
         try:
@@ -175,6 +181,21 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
         except AttributeError:
             self.configFromCacher = False
 
+    # all queue configs
+    @property
+    def queueConfig(self):
+        return self.snapshot[0]
+
+    # active queue configs
+    @property
+    def activeQueues(self):
+        return self.snapshot[1]
+
+    # queue configs with configIDs
+    @property
+    def queueConfigWithID(self):
+        return self.snapshot[2]
+
     # load config from DB cache of URL with validation
     def _load_config_from_cache(self):
         mainLog = _make_logger(method_name='QueueConfigMapper._load_config_from_cache')
@@ -225,6 +246,14 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
             return None
         return queueConfigJson
 
+    # get hash of JSON-like object. None if not serializable
+    @staticmethod
+    def _get_hash(obj):
+        try:
+            return hashlib.md5(json.dumps(obj, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        except Exception:
+            return None
+
     # get resolver module
     @staticmethod
     def _get_resolver():
@@ -245,8 +274,15 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
         timeNow = datetime.datetime.utcnow()
         if self.lastUpdate is not None and timeNow - self.lastUpdate < datetime.timedelta(minutes=10):
             return
+        # readers keep using the current config while another thread is reloading
+        if self.lastUpdate is not None and self.lock.locked():
+            return
         # start
         with self.lock:
+            # reloaded by another thread in the meantime
+            timeNow = datetime.datetime.utcnow()
+            if self.lastUpdate is not None and timeNow - self.lastUpdate < datetime.timedelta(minutes=10):
+                return
             # init
             newQueueConfig = dict()
             localTemplatesDict = dict()
@@ -258,6 +294,8 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
             allQueuesNameList = set()
             getQueuesDynamic = False
             invalidQueueList = set()
+            newQueueHashes = dict()
+            reusedQueues = set()
             # get resolver
             resolver = self._get_resolver()
             if resolver is None:
@@ -266,6 +304,8 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
             queueConfigJson_cacher = self._load_config_from_cache()
             if queueConfigJson_cacher is not None:
                 for queueName, queueDict in iteritems(queueConfigJson_cacher):
+                    # not to modify cached data shared in the process
+                    queueDict = dict(queueDict)
                     if queueDict.get('isTemplateQueue') is True \
                         or queueName.endswith('_TEMPLATE'):
                         # is RT
@@ -292,6 +332,15 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
                         localQueuesDict[queueName] = queueDict
             else:
                 mainLog.warning('Failed to load config from local json file. Skipped')
+            # keep the current config if no source has changed
+            sourceHashes = {'cacher': self._get_hash(queueConfigJson_cacher),
+                            'local': self._get_hash(queueConfigJson_local),
+                            'resolver': self._get_hash(resolver)}
+            if self.lastUpdate is not None and None not in sourceHashes.values() \
+                    and sourceHashes == self.sourceHashes:
+                self.lastUpdate = datetime.datetime.utcnow()
+                mainLog.debug('no source has changed')
+                return
             # fill in final template (FT)
             finalTemplatesDict.update(remoteTemplatesDict)
             finalTemplatesDict.update(localTemplatesDict)
@@ -346,6 +395,11 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
             allQueuesNameList |= set(dynamicQueuesDict)
             allQueuesNameList |= set(localQueuesDict)
             allQueuesNameList.discard(None)
+            # auto blacklisting
+            autoBlacklist = False
+            if resolver is not None and hasattr(harvester_config.qconf, 'autoBlacklist') and \
+                    harvester_config.qconf.autoBlacklist:
+                autoBlacklist = True
             # set attributes
             for queueName in allQueuesNameList:
                 # sources or queues and templates
@@ -360,6 +414,23 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
                     tmp_templateQueueName = tmp_queueDict.get('templateQueueName')
                     if tmp_templateQueueName is not None:
                         templateQueueName = tmp_templateQueueName
+                # reuse the current queue config if inputs are unchanged
+                queueInputs = [templateQueueName, finalTemplatesDict.get(templateQueueName),
+                               remoteQueuesDict.get(queueName), dynamicQueuesDict.get(queueName),
+                               localQueuesDict.get(queueName)]
+                if resolver is not None:
+                    queueInputs.append(resolver.get_panda_queue_name(queueName.split('/')[0]))
+                    if autoBlacklist:
+                        queueInputs.append(resolver.get_queue_status(queueName))
+                    if 'DYNAMIC' in harvester_config.qconf.queueList:
+                        queueInputs.append(resolver.is_ups_queue(queueName))
+                queueHash = self._get_hash(queueInputs)
+                if queueHash is not None:
+                    newQueueHashes[queueName] = queueHash
+                    if self.queueHashes.get(queueName) == queueHash and queueName in self.queueConfig:
+                        newQueueConfig[queueName] = self.queueConfig[queueName]
+                        reusedQueues.add(queueName)
+                        continue
                 # prepare queueDict
                 queueDict = dict()
                 if templateQueueName in finalTemplatesDict:
@@ -496,47 +567,48 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
             for invalidQueueName in invalidQueueList:
                 if invalidQueueName in newQueueConfig:
                     del newQueueConfig[invalidQueueName]
-            # auto blacklisting
-            autoBlacklist = False
-            if resolver is not None and hasattr(harvester_config.qconf, 'autoBlacklist') and \
-                    harvester_config.qconf.autoBlacklist:
-                autoBlacklist = True
-            # get queue dumps
-            queueConfigDumps = self.dbProxy.get_queue_config_dumps()
+            # get queue dumps if some queues were rebuilt
+            if len(reusedQueues) < len(newQueueConfig):
+                queueConfigDumps = self.dbProxy.get_queue_config_dumps()
+            else:
+                queueConfigDumps = None
             # get active queues
             activeQueues = dict()
             for queueName, queueConfig in iteritems(newQueueConfig):
-                # get status
-                if queueConfig.queueStatus is None and autoBlacklist:
-                    queueConfig.queueStatus = resolver.get_queue_status(queueName)
-                # get dynamic information
-                if 'DYNAMIC' in harvester_config.qconf.queueList:
-                    # UPS queue
-                    if resolver is not None and resolver.is_ups_queue(queueName):
-                        queueConfig.runMode = 'slave'
-                        queueConfig.mapType = 'NoJob'
-                # set online if undefined
-                if queueConfig.queueStatus is None:
-                    queueConfig.queueStatus = 'online'
-                queueConfig.queueStatus = queueConfig.queueStatus.lower()
-                # look for configID
-                dumpSpec = QueueConfigDumpSpec()
-                dumpSpec.queueName = queueName
-                dumpSpec.set_data(vars(queueConfig))
-                if dumpSpec.dumpUniqueName in queueConfigDumps:
-                    dumpSpec = queueConfigDumps[dumpSpec.dumpUniqueName]
-                else:
-                    # add dump
-                    dumpSpec.creationTime = datetime.datetime.utcnow()
-                    dumpSpec.configID = self.dbProxy.get_next_seq_number('SEQ_configID')
-                    tmpStat = self.dbProxy.add_queue_config_dump(dumpSpec)
-                    if not tmpStat:
-                        dumpSpec.configID = self.dbProxy.get_config_id_dump(dumpSpec)
-                        if dumpSpec.configID is None:
-                            mainLog.error('failed to get configID for {0}'.format(dumpSpec.dumpUniqueName))
-                            continue
-                    queueConfigDumps[dumpSpec.dumpUniqueName] = dumpSpec
-                queueConfig.configID = dumpSpec.configID
+                if queueName not in reusedQueues:
+                    # get status
+                    if queueConfig.queueStatus is None and autoBlacklist:
+                        queueConfig.queueStatus = resolver.get_queue_status(queueName)
+                    # get dynamic information
+                    if 'DYNAMIC' in harvester_config.qconf.queueList:
+                        # UPS queue
+                        if resolver is not None and resolver.is_ups_queue(queueName):
+                            queueConfig.runMode = 'slave'
+                            queueConfig.mapType = 'NoJob'
+                    # set online if undefined
+                    if queueConfig.queueStatus is None:
+                        queueConfig.queueStatus = 'online'
+                    queueConfig.queueStatus = queueConfig.queueStatus.lower()
+                    # look for configID
+                    dumpSpec = QueueConfigDumpSpec()
+                    dumpSpec.queueName = queueName
+                    dumpSpec.set_data(vars(queueConfig))
+                    if dumpSpec.dumpUniqueName in queueConfigDumps:
+                        dumpSpec = queueConfigDumps[dumpSpec.dumpUniqueName]
+                    else:
+                        # add dump
+                        dumpSpec.creationTime = datetime.datetime.utcnow()
+                        dumpSpec.configID = self.dbProxy.get_next_seq_number('SEQ_configID')
+                        tmpStat = self.dbProxy.add_queue_config_dump(dumpSpec)
+                        if not tmpStat:
+                            dumpSpec.configID = self.dbProxy.get_config_id_dump(dumpSpec)
+                            if dumpSpec.configID is None:
+                                mainLog.error('failed to get configID for {0}'.format(dumpSpec.dumpUniqueName))
+                                # retry in the next reload
+                                newQueueHashes.pop(queueName, None)
+                                continue
+                        queueConfigDumps[dumpSpec.dumpUniqueName] = dumpSpec
+                    queueConfig.configID = dumpSpec.configID
                 # ignore offline
                 if queueConfig.queueStatus == 'offline':
                     continue
@@ -545,19 +617,35 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
                         queueName not in harvester_config.qconf.queueList:
                     continue
                 activeQueues[queueName] = queueConfig
-            self.queueConfig = newQueueConfig
-            self.activeQueues = activeQueues
-            newQueueConfigWithID = dict()
-            for dumpSpec in queueConfigDumps.values():
-                queueConfig = QueueConfig(dumpSpec.queueName)
-                queueConfig.update_attributes(dumpSpec.data)
-                queueConfig.configID = dumpSpec.configID
-                newQueueConfigWithID[dumpSpec.configID] = queueConfig
-            self.queueConfigWithID = newQueueConfigWithID
+            if queueConfigDumps is not None:
+                newQueueConfigWithID = dict()
+                for dumpSpec in queueConfigDumps.values():
+                    # reuse the current one since dumps are immutable
+                    if dumpSpec.configID in self.queueConfigWithID:
+                        newQueueConfigWithID[dumpSpec.configID] = self.queueConfigWithID[dumpSpec.configID]
+                        continue
+                    queueConfig = QueueConfig(dumpSpec.queueName)
+                    queueConfig.update_attributes(dumpSpec.data)
+                    queueConfig.configID = dumpSpec.configID
+                    newQueueConfigWithID[dumpSpec.configID] = queueConfig
+            else:
+                newQueueConfigWithID = self.queueConfigWithID
+            # queues removed or rebuilt
+            staleQueues = set(self.queueConfig) - reusedQueues
+            # swap in new config. Readers see either the current or new one without waiting
+            self.snapshot = (newQueueConfig, activeQueues, newQueueConfigWithID)
+            self.queueHashes = newQueueHashes
+            self.sourceHashes = sourceHashes
             self.lastUpdate = datetime.datetime.utcnow()
+            # drop cached plugin instances of removed or rebuilt queues
+            PluginFactory().evict_instances(staleQueues)
+            mainLog.debug('rebuilt {0} queues and reused {1} queues'.format(len(newQueueConfig) - len(reusedQueues),
+                                                                          len(reusedQueues)))
         # update database
         if self.toUpdateDB:
-            self.dbProxy.fill_panda_queue_table(self.activeQueues.keys(), self)
+            activeQueues = self.activeQueues
+            self.dbProxy.fill_panda_queue_table(activeQueues.keys(), self,
+                                                set(activeQueues) - reusedQueues)
             mainLog.debug('updated to DB')
         # done
         mainLog.debug('done')
@@ -565,17 +653,19 @@ class QueueConfigMapper(six.with_metaclass(SingletonWithID, object)):
     # check if valid queue
     def has_queue(self, queue_name, config_id=None):
         self.load_data()
+        queueConfig, activeQueues, queueConfigWithID = self.snapshot
         if config_id is not None:
-            return config_id in self.queueConfigWithID
-        return queue_name in self.queueConfig
+            return config_id in queueConfigWithID
+        return queue_name in queueConfig
 
     # get queue config
     def get_queue(self, queue_name, config_id=None):
         self.load_data()
-        if config_id is not None and config_id in self.queueConfigWithID:
-            return self.queueConfigWithID[config_id]
-        if queue_name in self.queueConfig:
-            return self.queueConfig[queue_name]
+        queueConfig, activeQueues, queueConfigWithID = self.snapshot
+        if config_id is not None and config_id in queueConfigWithID:
+            return queueConfigWithID[config_id]
+        if queue_name in queueConfig:
+            return queueConfig[queue_name]
         return None
 
     # all queue configs
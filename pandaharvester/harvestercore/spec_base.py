@@ -28,6 +28,56 @@ def as_python_object(dct):
     return dct
 
 
+# attribute metadata computed once per spec class
+class SpecClassMetadata(object):
+    def __init__(self, cls):
+        attributes = []
+        serializedAttrs = set()
+        for attr in cls.attributesWithTypes:
+            attr, attrType = attr.split(':')
+            attrType = attrType.split()[0]
+            attributes.append(attr)
+            if attrType in ['blob']:
+                serializedAttrs.add(attr)
+        self.attributes = tuple(attributes)
+        self.attributeSet = frozenset(attributes)
+        self.serializedAttrs = frozenset(serializedAttrs)
+        self.zeroAttrs = frozenset(cls.zeroAttrs)
+        self.skipAttrsToSlim = frozenset(cls.skipAttrsToSlim)
+        # initial values
+        self.defaultValues = dict()
+        for attr in self.attributes:
+            if attr in self.zeroAttrs:
+                self.defaultValues[attr] = 0
+            else:
+                self.defaultValues[attr] = None
+        # (attribute, bind variable, zero default, serialized) to make values
+        self.valueSpecs = tuple([(attr, ':{0}'.format(attr), attr in self.zeroAttrs, attr in self.serializedAttrs)
+                                 for attr in self.attributes])
+        # SQL fragments
+        self.columnNamesMap = dict()
+        self.bindValuesExpression = 'VALUES({0})'.format(','.join([':{0}'.format(attr)
+                                                                  for attr in self.attributes]))
+
+    # get column names for INSERT
+    def get_column_names(self, prefix, slim):
+        try:
+            return self.columnNamesMap[(prefix, slim)]
+        except KeyError:
+            pass
+        columns = []
+        for attr in self.attributes:
+            if slim and attr in self.skipAttrsToSlim:
+                continue
+            if prefix is None:
+                columns.append(attr)
+            else:
+                columns.append('{0}.{1}'.format(prefix, attr))
+        ret = ','.join(columns)
+        self.columnNamesMap[(prefix, slim)] = ret
+        return ret
+
+
 # base class for XyzSpec
 class SpecBase(object):
     # to be set
@@ -35,33 +85,39 @@ class SpecBase(object):
     zeroAttrs = ()
     skipAttrsToSlim = ()
 
+    # get metadata of the class, which is made when it is used for the first time
+    def get_class_metadata(cls):
+        try:
+            return cls.__dict__['_classMetadata']
+        except KeyError:
+            metadata = SpecClassMetadata(cls)
+            cls._classMetadata = metadata
+            return metadata
+
+    get_class_metadata = classmethod(get_class_metadata)
+
     # constructor
     def __init__(self):
-        # remove types
-        object.__setattr__(self, 'attributes', [])
-        object.__setattr__(self, 'serializedAttrs', set())
-        for attr in self.attributesWithTypes:
-            attr, attrType = attr.split(':')
-            attrType = attrType.split()[0]
-            self.attributes.append(attr)
-            if attrType in ['blob']:
-                self.serializedAttrs.add(attr)
+        metadata = self.get_class_metadata()
+        objDict = self.__dict__
+        objDict['attributes'] = metadata.attributes
+        objDict['serializedAttrs'] = metadata.serializedAttrs
         # install attributes
-        for attr in self.attributes:
-            if attr in self.zeroAttrs:
-                object.__setattr__(self, attr, 0)
-            else:
-                object.__setattr__(self, attr, None)
+        objDict.update(metadata.defaultValues)
         # map of changed attributes
-        object.__setattr__(self, 'changedAttrs', {})
+        objDict['changedAttrs'] = {}
 
     # override __setattr__ to collect changed attributes
     def __setattr__(self, name, value):
-        oldVal = getattr(self, name)
+        objDict = self.__dict__
+        try:
+            oldVal = objDict[name]
+        except KeyError:
+            # raise AttributeError for unknown attributes
+            oldVal = getattr(self, name)
         object.__setattr__(self, name, value)
-        newVal = getattr(self, name)
         # collect changed attributes
-        if oldVal != newVal:
+        if oldVal != value:
             self.changedAttrs[name] = value
 
     # keep state for pickle
@@ -98,17 +154,19 @@ class SpecBase(object):
     def pack(self, values, slim=False):
         if hasattr(values, '_asdict'):
             values = values._asdict()
-        for attr in self.attributes:
-            if slim and attr in self.skipAttrsToSlim:
+        metadata = self.get_class_metadata()
+        objDict = self.__dict__
+        for attr in metadata.attributes:
+            if slim and attr in metadata.skipAttrsToSlim:
                 val = None
             else:
                 val = values[attr]
-                if attr in self.serializedAttrs and val is not None:
+                if val is not None and attr in metadata.serializedAttrs:
                     try:
                         val = json.loads(val, object_hook=as_python_object)
                     except JSONDecodeError:
                         pass
-            object.__setattr__(self, attr, val)
+            objDict[attr] = val
 
     # set blob attribute
     def set_blob_attribute(self, key, val):
@@ -120,29 +178,13 @@ class SpecBase(object):
 
     # return column names for INSERT
     def column_names(cls, prefix=None, slim=False):
-        ret = ""
-        for attr in cls.attributesWithTypes:
-            attr = attr.split(':')[0]
-            if slim and attr in cls.skipAttrsToSlim:
-                continue
-            if prefix is None:
-                ret += "{0},".format(attr)
-            else:
-                ret += "{0}.{1},".format(prefix, attr)
-        ret = ret[:-1]
-        return ret
+        return cls.get_class_metadata().get_column_names(prefix, slim)
 
     column_names = classmethod(column_names)
 
     # return expression of bind variables for INSERT
     def bind_values_expression(cls):
-        ret = "VALUES("
-        for attr in cls.attributesWithTypes:
-            attr = attr.split(':')[0]
-            ret += ":%s," % attr
-        ret = ret[:-1]
-        ret += ")"
-        return ret
+        return cls.get_class_metadata().bindValuesExpression
 
     bind_values_expression = classmethod(bind_values_expression)
 
@@ -159,37 +201,33 @@ class SpecBase(object):
     # return map of values
     def values_map(self, only_changed=False):
         ret = {}
-        for attr in self.attributes:
+        objDict = self.__dict__
+        changedAttrs = self.changedAttrs
+        for attr, bindName, isZero, isSerialized in self.get_class_metadata().valueSpecs:
             # only changed attributes
-            if only_changed:
-                if attr not in self.changedAttrs:
-                    continue
-            val = getattr(self, attr)
-            if val is None:
-                if attr in self.zeroAttrs:
-                    val = 0
-                else:
-                    val = None
-            if attr in self.serializedAttrs:
+            if only_changed and attr not in changedAttrs:
+                continue
+            val = objDict[attr]
+            if val is None and isZero:
+                val = 0
+            if isSerialized:
                 val = json.dumps(val, cls=PythonObjectEncoder)
-            ret[':%s' % attr] = val
+            ret[bindName] = val
         return ret
 
     # return list of values
     def values_list(self, only_changed=False):
         ret = []
-        for attr in self.attributes:
+        objDict = self.__dict__
+        changedAttrs = self.changedAttrs
+        for attr, bindName, isZero, isSerialized in self.get_class_metadata().valueSpecs:
             # only changed attributes
-            if only_changed:
-                if attr not in self.changedAttrs:
-                    continue
-            val = getattr(self, attr)
-            if val is None:
-                if attr in self.zeroAttrs:
-                    val = 0
-                else:
-                    val = None
-            if attr in self.serializedAttrs:
+            if only_changed and attr not in changedAttrs:
+                continue
+            val = objDict[attr]
+            if val is None and isZero:
+                val = 0
+            if isSerialized:
                 val = json.dumps(val, cls=PythonObjectEncoder)
             ret.append(val)
         return ret
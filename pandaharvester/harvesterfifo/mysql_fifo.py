@@ -238,6 +238,64 @@ class MysqlFifo(PluginBase):
             wait = min(max_wait, tries/10.0 + wait)
         return None
 
+    def _pop_many(self, n_objects, timeout=None, protective=False, max_score=None):
+        if max_score is None:
+            score_cond_str = ''
+            params = ()
+        else:
+            score_cond_str = 'AND score <= %s '
+            params = (max_score,)
+        sql_pop_get_many = (
+                'SELECT id, item, score FROM {table_name} '
+                'WHERE temporary = 0 {score_cond}'
+                'ORDER BY score LIMIT {n_objects} '
+                'FOR UPDATE '
+            ).format(table_name=self.tableName, score_cond=score_cond_str, n_objects=int(n_objects))
+        sql_pop_to_temp_template = (
+                'UPDATE {table_name} SET temporary = 1 '
+                'WHERE id in ({placeholders} ) AND temporary = 0 '
+            )
+        sql_pop_del_template = (
+                'DELETE FROM {table_name} '
+                'WHERE id in ({placeholders} ) AND temporary = 0 '
+            )
+        keep_polling = True
+        _exc = None
+        wait = 0.1
+        max_wait = 2
+        tries = 0
+        last_attempt_timestamp = time.time()
+        while keep_polling:
+            try:
+                self.execute(sql_pop_get_many, params)
+                res = self.cur.fetchall()
+                if len(res) > 0:
+                    ids = [id for id, obj, score in res]
+                    placeholders_str = ','.join([' %s'] * len(ids))
+                    if protective:
+                        sql_pop = sql_pop_to_temp_template.format(table_name=self.tableName,
+                                                                  placeholders=placeholders_str)
+                    else:
+                        sql_pop = sql_pop_del_template.format(table_name=self.tableName,
+                                                              placeholders=placeholders_str)
+                    self.execute(sql_pop, ids)
+                self.commit()
+            except Exception as _e:
+                self.rollback()
+                _exc = _e
+            else:
+                if len(res) > 0:
+                    return [tuple(obj_tuple) for obj_tuple in res]
+            now_timestamp = time.time()
+            if timeout is None or (now_timestamp - last_attempt_timestamp) >= timeout:
+                keep_polling = False
+                if _exc is not None:
+                    raise _exc
+            tries += 1
+            time.sleep(wait)
+            wait = min(max_wait, tries/10.0 + wait)
+        return []
+
     def _peek(self, mode='first', id=None, skip_item=False):
         if skip_item:
             columns_str = 'id, score'
@@ -306,6 +364,23 @@ class MysqlFifo(PluginBase):
             self.rollback()
             raise _e
 
+    # enqueue many objects with multi-row insert
+    def put_many(self, obj_score_list):
+        sql_push = (
+                'INSERT INTO {table_name} '
+                '(item, score) '
+                'VALUES (%s, %s) '
+            ).format(table_name=self.tableName)
+        try:
+            self.executemany(sql_push, [(obj, score) for obj, score in obj_score_list])
+            n_row = self.cur.rowcount
+            self.commit()
+        except Exception as _e:
+            self.rollback()
+            raise _e
+        else:
+            return n_row
+
     # enqueue by id
     def putbyid(self, id, obj, score):
         try:
@@ -325,6 +400,10 @@ class MysqlFifo(PluginBase):
     def getlast(self, timeout=None, protective=False):
         return self._pop(timeout=timeout, protective=protective, mode='last')
 
+    # dequeue up to n_objects first objects with score not larger than max_score
+    def get_many(self, n_objects, timeout=None, protective=False, max_score=None):
+        return self._pop_many(n_objects, timeout=timeout, protective=protective, max_score=max_score)
+
     # get tuple of (id, item, score) of the first object without dequeuing it
     def peek(self, skip_item=False):
         return self._peek(skip_item=skip_item)
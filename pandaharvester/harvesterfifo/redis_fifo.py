@@ -108,6 +108,53 @@ class RedisFifo(PluginBase):
                 break
         return id, item, score
 
+    def _pop_many(self, n_objects, timeout=None, protective=False, max_score=None):
+        wait = 0.1
+        max_wait = 2
+        tries = 1
+        last_attempt_timestamp = time.time()
+        id_score_list = []
+        while True:
+            if max_score is None:
+                # pop atomically without watching
+                id_score_list = self.qconn.zpopmin(self.id_score, n_objects)
+            else:
+                with self.qconn.pipeline() as pipeline:
+                    while True:
+                        try:
+                            pipeline.watch(self.id_score)
+                            id_score_list = pipeline.zrangebyscore(self.id_score, '-inf', max_score,
+                                                                   start=0, num=n_objects, withscores=True)
+                            if len(id_score_list) > 0:
+                                pipeline.multi()
+                                pipeline.zrem(self.id_score, *[id for id, score in id_score_list])
+                                pipeline.execute()
+                            else:
+                                pipeline.unwatch()
+                        except redis.WatchError:
+                            continue
+                        else:
+                            break
+            if len(id_score_list) > 0:
+                break
+            tries += 1
+            now_timestamp = time.time()
+            if timeout is None or (now_timestamp - last_attempt_timestamp) >= timeout:
+                break
+            time.sleep(wait)
+            wait = min(max_wait, tries/10.0 + wait)
+        if len(id_score_list) == 0:
+            return []
+        ids = [id for id, score in id_score_list]
+        with self.qconn.pipeline() as pipeline:
+            pipeline.hmget(self.id_item, ids)
+            if protective:
+                pipeline.sadd(self.id_temp, *ids)
+            else:
+                pipeline.hdel(self.id_item, *ids)
+            resVal = pipeline.execute()
+        return [(id, item, score) for (id, score), item in zip(id_score_list, resVal[0])]
+
     # number of objects in queue
     def size(self):
         return len(self)
@@ -139,6 +186,34 @@ class RedisFifo(PluginBase):
             time.sleep(0.0001)
         return False
 
+    # enqueue many objects with one pipeline
+    def put_many(self, item_score_list):
+        generate_id_attempt_timestamp = time.time()
+        n_put = 0
+        while len(item_score_list) > 0:
+            id_item_score_list = [(random_id(), item, score) for item, score in item_score_list]
+            with self.qconn.pipeline() as pipeline:
+                for id, item, score in id_item_score_list:
+                    pipeline.execute_command('ZADD', self.id_score, 'NX', score, id)
+                    pipeline.hsetnx(self.id_item, id, item)
+                resVal = pipeline.execute()
+            # retry objects with duplicated ids
+            item_score_list = []
+            for i_obj, (id, item, score) in enumerate(id_item_score_list):
+                if resVal[2*i_obj] == 1 and resVal[2*i_obj+1] == 1:
+                    n_put += 1
+                else:
+                    with self.qconn.pipeline() as pipeline:
+                        if resVal[2*i_obj] == 1:
+                            pipeline.zrem(self.id_score, id)
+                        if resVal[2*i_obj+1] == 1:
+                            pipeline.hdel(self.id_item, id)
+                        pipeline.execute()
+                    item_score_list.append((item, score))
+            if time.time() > generate_id_attempt_timestamp + 60:
+                raise Exception('Cannot generate unique id')
+        return n_put
+
     # enqueue by id
     def putbyid(self, id, item, score):
         with self.qconn.pipeline() as pipeline:
@@ -166,6 +241,10 @@ class RedisFifo(PluginBase):
     def getlast(self, timeout=None, protective=False):
         return self._pop(timeout=timeout, protective=protective, mode='last')
 
+    # dequeue up to n_objects first objects with score not larger than max_score
+    def get_many(self, n_objects, timeout=None, protective=False, max_score=None):
+        return self._pop_many(n_objects, timeout=timeout, protective=protective, max_score=max_score)
+
     # get tuple of (id, item, score) of the first object without dequeuing it
     def peek(self, skip_item=False):
         return self._peek(skip_item=skip_item)
@@ -55,8 +55,14 @@ class SqliteFifo(PluginBase):
             'WHERE id = ? '
             'AND temporary = {temp}'
             )
+    _lpop_get_many_sql_template = (
+            'SELECT id, item, score FROM queue_table '
+            'WHERE temporary = 0 {score_cond}'
+            'ORDER BY score LIMIT {n_objects}'
+            )
     _pop_del_sql = 'DELETE FROM queue_table WHERE id = ?'
     _move_to_temp_sql = 'UPDATE queue_table SET temporary = 1 WHERE id = ?'
+    _move_to_temp_sql_template = 'UPDATE queue_table SET temporary = 1 WHERE id in ({0})'
     _del_sql_template = 'DELETE FROM queue_table WHERE id in ({0})'
     _clear_delete_table_sql = 'DELETE FROM queue_table'
     _clear_drop_table_sql = 'DROP TABLE IF EXISTS queue_table'
@@ -138,6 +144,39 @@ class SqliteFifo(PluginBase):
                 return (id, bytes(obj_buf), score)
         return None
 
+    def _pop_many(self, get_sql, params=(), timeout=None, protective=False):
+        keep_polling = True
+        wait = 0.1
+        max_wait = 2
+        tries = 0
+        last_attempt_timestamp = time.time()
+        with self._get_conn() as conn:
+            res = []
+            while keep_polling:
+                conn.execute(self._write_lock_sql)
+                res = conn.execute(get_sql, params).fetchall()
+                if len(res) > 0:
+                    keep_polling = False
+                else:
+                    # unlock the database
+                    conn.commit()
+                    now_timestamp = time.time()
+                    if timeout is None or (now_timestamp - last_attempt_timestamp) >= timeout:
+                        keep_polling = False
+                        continue
+                    tries += 1
+                    time.sleep(wait)
+                    wait = min(max_wait, tries/10.0 + wait)
+            if len(res) > 0:
+                ids = [id for id, obj_buf, score in res]
+                placeholders_str = ','.join('?' * len(ids))
+                if protective:
+                    conn.execute(self._move_to_temp_sql_template.format(placeholders_str), ids)
+                else:
+                    conn.execute(self._del_sql_template.format(placeholders_str), ids)
+                conn.commit()
+        return [(id, bytes(obj_buf), score) for id, obj_buf, score in res]
+
     def _peek(self, peek_sql_template, skip_item=False, id=None, temporary=False):
         columns = 'id, item, score'
         temp = 0
@@ -177,6 +216,15 @@ class SqliteFifo(PluginBase):
                 retVal = True
         return retVal
 
+    # enqueue many objects in one transaction
+    def put_many(self, obj_score_list):
+        params_list = [(memoryviewOrBuffer(obj), score) for obj, score in obj_score_list]
+        with self._get_conn() as conn:
+            conn.execute(self._write_lock_sql)
+            cursor = conn.executemany(self._push_sql, params_list)
+            n_row = cursor.rowcount
+        return n_row
+
     # enqueue by id
     def putbyid(self, id, obj, score):
         retVal = False
@@ -198,6 +246,17 @@ class SqliteFifo(PluginBase):
         sql_str = self._rpop_get_sql_template.format(columns='id, item, score')
         return self._pop(get_sql=sql_str, timeout=timeout, protective=protective)
 
+    # dequeue up to n_objects first objects with score not larger than max_score
+    def get_many(self, n_objects, timeout=None, protective=False, max_score=None):
+        if max_score is None:
+            score_cond = ''
+            params = ()
+        else:
+            score_cond = 'AND score <= ? '
+            params = (max_score,)
+        sql_str = self._lpop_get_many_sql_template.format(score_cond=score_cond, n_objects=int(n_objects))
+        return self._pop_many(get_sql=sql_str, params=params, timeout=timeout, protective=protective)
+
     # get tuple of (id, item, score) of the first object without dequeuing it
     def peek(self, skip_item=False):
         return self._peek(self._lpop_get_sql_template, skip_item=skip_item)
@@ -0,0 +1,302 @@
+import os
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+import threading
+
+from pandaharvester.harvestercore import core_utils
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestercore.db_proxy_pool import DBProxyPool as DBProxy
+from pandaharvester.harvestercore.fifos import MonitorFIFO
+from pandaharvester.harvesterconfig import harvester_config
+
+# logger
+_logger = core_utils.setup_logger('access_point_watcher')
+
+# inotify constants from sys/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# events of files written by workers
+watchMask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_ONLYDIR
+
+# header of inotify event; wd, mask, cookie, len
+eventHeader = struct.Struct('iIII')
+
+# magic numbers of network and cluster file systems in f_type of statfs. inotify doesn't see files written
+# on other hosts to them, so directories on them are polled
+networkFsTypes = {0x6969: 'nfs',
+                  0x0bd00bd0: 'lustre',
+                  0x47504653: 'gpfs',
+                  0x00c36400: 'ceph',
+                  0x19830326: 'beegfs',
+                  0xaad7aaea: 'panfs',
+                  0x01161970: 'gfs2',
+                  0x7461636f: 'ocfs2',
+                  0x5346414f: 'afs',
+                  0xff534d42: 'cifs',
+                  0xfe534d42: 'smb2',
+                  0x517b: 'smb',
+                  0x65735546: 'fuse'}
+
+
+# load libc with inotify functions. None if unavailable
+def load_inotify():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        for funcName in ['inotify_init1', 'inotify_add_watch', 'inotify_rm_watch']:
+            getattr(libc, funcName)
+        return libc
+    except Exception:
+        return None
+
+
+# get the type of the file system of a directory from f_type of statfs. None if unavailable
+def get_fs_type(libc, dir_name):
+    if libc is None or not hasattr(libc, 'statfs'):
+        return None
+    # f_type is the first field of struct statfs
+    buf = ctypes.create_string_buffer(256)
+    if libc.statfs(dir_name, buf) != 0:
+        return None
+    return ctypes.c_long.from_buffer(buf).value & 0xffffffff
+
+
+# watcher of access points to check workers as soon as they put files to request jobs or events,
+# to report outputs, or to be killed. Each worker found is pushed to the head of monitor FIFO.
+# Directories which cannot be watched due to inotify limits or are on network file systems are polled instead
+class AccessPointWatcher(object):
+    # constructor
+    def __init__(self, file_names, poll_interval=10, push_delay=1):
+        # names of files to trigger checks
+        self.fileNames = set(file_names)
+        # interval in sec to poll directories without inotify watches
+        self.pollInterval = poll_interval
+        # delay in sec to coalesce files put by a worker at once
+        self.pushDelay = push_delay
+        self.lock = threading.Lock()
+        self.libc = load_inotify()
+        self.fd = None
+        self.thread = None
+        # directory -> workerID
+        self.dirMap = dict()
+        # wd -> directory
+        self.wdMap = dict()
+        # directory -> {file name: mtime} for polled directories
+        self.polledDirs = dict()
+        # workerID -> time when a file was found
+        self.pending = dict()
+        self.limitReached = False
+        # polled directories on network file systems
+        self.networkDirs = set()
+        # network file systems already reported
+        self.networkFsFound = set()
+
+    # start the thread and inotify if not yet
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            tmpLog = core_utils.make_logger(_logger, method_name='start')
+            if self.libc is None:
+                tmpLog.warning('inotify unavailable. Directories will be polled')
+            else:
+                fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+                if fd < 0:
+                    tmpLog.warning('failed to initialize inotify with {0}. Directories will be polled'.format(
+                        os.strerror(ctypes.get_errno())))
+                else:
+                    self.fd = fd
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+            tmpLog.debug('started')
+
+    # add an inotify watch. Return wd and errno. wd and errno are None for directories to be polled
+    def add_watch(self, dir_name):
+        if self.fd is None or dir_name in self.networkDirs:
+            return None, None
+        dirName = dir_name
+        if not isinstance(dir_name, bytes):
+            dir_name = dir_name.encode('utf-8')
+        # inotify doesn't see files written on other hosts to network file systems
+        fsType = networkFsTypes.get(get_fs_type(self.libc, dir_name))
+        if fsType is not None:
+            if fsType not in self.networkFsFound:
+                tmpLog = core_utils.make_logger(_logger, method_name='add_watch')
+                tmpLog.info('directories on {0} are polled since inotify does not see files written on other '
+                            'hosts'.format(fsType))
+                self.networkFsFound.add(fsType)
+            self.networkDirs.add(dirName)
+            return None, None
+        wd = self.libc.inotify_add_watch(self.fd, dir_name, watchMask)
+        if wd < 0:
+            return None, ctypes.get_errno()
+        return wd, None
+
+    # make a snapshot of files to trigger checks. None if the directory is unavailable
+    def make_snapshot(self, dir_name):
+        try:
+            fileNames = os.listdir(dir_name)
+        except OSError:
+            return None
+        snapshot = dict()
+        for fileName in self.fileNames.intersection(fileNames):
+            try:
+                snapshot[fileName] = os.stat(os.path.join(dir_name, fileName)).st_mtime
+            except OSError:
+                pass
+        return snapshot
+
+    # register directories of a worker
+    def register(self, worker_id, dir_names):
+        self.start()
+        with self.lock:
+            for dirName in dir_names:
+                if dirName in self.dirMap:
+                    continue
+                wd, errNo = self.add_watch(dirName)
+                if wd is not None:
+                    self.wdMap[wd] = dirName
+                elif errNo in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                else:
+                    if errNo == errno.ENOSPC and not self.limitReached:
+                        tmpLog = core_utils.make_logger(_logger, method_name='register')
+                        tmpLog.warning('reached max_user_watches of inotify. Directories will be polled')
+                        self.limitReached = True
+                    self.polledDirs[dirName] = self.make_snapshot(dirName) or dict()
+                self.dirMap[dirName] = worker_id
+
+    # get the number of directories watched by inotify and polled
+    def get_stats(self):
+        with self.lock:
+            return len(self.wdMap), len(self.polledDirs)
+
+    # read inotify events
+    def read_events(self, tmp_log):
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            raise
+        timeNow = time.time()
+        offset = 0
+        with self.lock:
+            while offset + eventHeader.size <= len(buf):
+                wd, mask, cookie, nameLen = eventHeader.unpack_from(buf, offset)
+                offset += eventHeader.size
+                fileName = buf[offset:offset + nameLen].rstrip(b'\0').decode('utf-8', 'replace')
+                offset += nameLen
+                if mask & IN_Q_OVERFLOW:
+                    tmp_log.warning('inotify queue overflowed. Lost changes are picked up by regular checks')
+                elif mask & IN_IGNORED:
+                    # the directory was removed
+                    dirName = self.wdMap.pop(wd, None)
+                    if dirName is not None:
+                        self.dirMap.pop(dirName, None)
+                        # watches were released
+                        self.limitReached = False
+                elif fileName in self.fileNames and wd in self.wdMap:
+                    self.pending.setdefault(self.dirMap[self.wdMap[wd]], timeNow)
+
+    # poll directories without inotify watches
+    def poll(self):
+        with self.lock:
+            polledDirs = list(self.polledDirs.items())
+        for dirName, snapshot in polledDirs:
+            newSnapshot = self.make_snapshot(dirName)
+            with self.lock:
+                if dirName not in self.polledDirs:
+                    continue
+                if newSnapshot is None:
+                    # the directory was removed
+                    del self.polledDirs[dirName]
+                    del self.dirMap[dirName]
+                    self.networkDirs.discard(dirName)
+                    continue
+                self.polledDirs[dirName] = newSnapshot
+                for fileName, mTime in newSnapshot.items():
+                    if snapshot.get(fileName) != mTime:
+                        self.pending.setdefault(self.dirMap[dirName], time.time())
+                        break
+                # try inotify again when watches were released
+                if not self.limitReached:
+                    wd, errNo = self.add_watch(dirName)
+                    if wd is not None:
+                        self.wdMap[wd] = dirName
+                        del self.polledDirs[dirName]
+                    elif errNo == errno.ENOSPC:
+                        self.limitReached = True
+
+    # push workers to the head of monitor FIFO
+    def push(self, db_proxy, monitor_fifo, tmp_log):
+        timeNow = time.time()
+        with self.lock:
+            workerIDs = [workerID for workerID, foundAt in self.pending.items()
+                         if timeNow - foundAt >= self.pushDelay]
+            for workerID in workerIDs:
+                del self.pending[workerID]
+        if not workerIDs:
+            return
+        try:
+            fifoMaxWorkersPerChunk = harvester_config.monitor.fifoMaxWorkersPerChunk
+        except AttributeError:
+            fifoMaxWorkersPerChunk = 500
+        workSpecsMap = dict()
+        for workerID in workerIDs:
+            workSpec = db_proxy.get_worker_with_id(workerID)
+            if workSpec is None or workSpec.workerID is None:
+                continue
+            if workSpec.status not in [WorkSpec.ST_submitted, WorkSpec.ST_running, WorkSpec.ST_idle] \
+                    or workSpec.mapType == WorkSpec.MT_MultiWorkers:
+                continue
+            jobSpecs = db_proxy.get_jobs_with_worker_id(workerID, None, only_running=True, slim=True)
+            workSpec.pandaid_list = [jobSpec.PandaID for jobSpec in jobSpecs]
+            workSpecsMap.setdefault(workSpec.computingSite, [])
+            workSpecsMap[workSpec.computingSite].append([workSpec])
+        # chunks are checked once and only workers to be post-processed are enqueued again since workers are
+        # still in FIFO. Stale copies in regular chunks are refreshed by monitor when dequeued
+        score = timeNow - 2**32
+        for queueName, workSpecsList in workSpecsMap.items():
+            for workSpecsChunk in core_utils.create_shards(workSpecsList, fifoMaxWorkersPerChunk):
+                monitor_fifo.put((queueName, workSpecsChunk, True), score)
+                tmp_log.debug('put a chunk of {0} workers of {1} to FIFO head'.format(len(workSpecsChunk),
+                                                                                     queueName))
+
+    # main loop
+    def run(self):
+        tmpLog = core_utils.make_logger(_logger, method_name='run')
+        dbProxy = DBProxy()
+        monitorFIFO = MonitorFIFO()
+        if not monitorFIFO.enabled:
+            tmpLog.warning('monitor FIFO is disabled. Workers are checked in regular cycles')
+        lastPollAt = time.time()
+        while True:
+            try:
+                if self.fd is not None:
+                    readable, _, _ = select.select([self.fd], [], [], self.pushDelay)
+                    if readable:
+                        self.read_events(tmpLog)
+                else:
+                    time.sleep(self.pushDelay)
+                if time.time() - lastPollAt >= self.pollInterval:
+                    self.poll()
+                    lastPollAt = time.time()
+                if monitorFIFO.enabled:
+                    self.push(dbProxy, monitorFIFO, tmpLog)
+                else:
+                    with self.lock:
+                        self.pending.clear()
+            except Exception:
+                core_utils.dump_error_message(tmpLog)
+                time.sleep(self.pushDelay)
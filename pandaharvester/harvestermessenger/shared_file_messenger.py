@@ -2,6 +2,8 @@ import json
 import os
 import shutil
 import datetime
+import threading
+import collections
 
 try:
     from urllib.parse import urlencode
@@ -75,6 +77,24 @@ except Exception:
 # suffix to read json
 suffixReadJson = '.read'
 
+# max total size of file contents cached across monitor cycles
+try:
+    maxFileCacheSize = harvester_config.payload_interaction.maxFileCacheSize * 1024 * 1024
+except Exception:
+    maxFileCacheSize = 256 * 1024 * 1024
+
+# watch access points to push workers to monitor FIFO as soon as they put files
+try:
+    watchAccessPoints = harvester_config.payload_interaction.watchAccessPoints
+except Exception:
+    watchAccessPoints = False
+
+# interval in sec to poll access points which cannot be watched due to inotify limits or are on network file systems
+try:
+    watcherPollInterval = harvester_config.payload_interaction.watcherPollInterval
+except Exception:
+    watcherPollInterval = 10
+
 # logger
 _logger = core_utils.setup_logger('shared_file_messenger')
 
@@ -119,6 +139,77 @@ def tar_directory(dir_name, tar_name=None, max_depth=None, extra_files=None):
     return com, retCode, stdOut, stdErr
 
 
+# list file names in a directory with a single scan. None if the directory is unavailable
+def list_file_names(dir_name):
+    try:
+        try:
+            scandir = os.scandir
+        except AttributeError:
+            return set(os.listdir(dir_name))
+        retSet = set()
+        for entry in scandir(dir_name):
+            retSet.add(entry.name)
+        return retSet
+    except Exception:
+        return None
+
+
+# cache of file contents which are re-read only when modified
+class FileContentCache(object):
+    # constructor
+    def __init__(self, max_size):
+        self.lock = threading.Lock()
+        self.maxSize = max_size
+        self.totalSize = 0
+        # {path: ((mtime, size, inode), content)}
+        self.cache = collections.OrderedDict()
+
+    # get content of a file
+    def read(self, file_path):
+        fileStat = os.stat(file_path)
+        key = (fileStat.st_mtime, fileStat.st_size, fileStat.st_ino)
+        with self.lock:
+            if file_path in self.cache:
+                cachedKey, content = self.cache.pop(file_path)
+                self.totalSize -= len(content)
+                if cachedKey == key:
+                    self.cache[file_path] = (cachedKey, content)
+                    self.totalSize += len(content)
+                    return content
+        with open(file_path) as f:
+            content = f.read()
+        if len(content) > self.maxSize:
+            return content
+        with self.lock:
+            if file_path in self.cache:
+                self.totalSize -= len(self.cache.pop(file_path)[1])
+            self.cache[file_path] = (key, content)
+            self.totalSize += len(content)
+            # remove least recently used
+            while self.totalSize > self.maxSize:
+                _, (_, oldContent) = self.cache.popitem(last=False)
+                self.totalSize -= len(oldContent)
+        return content
+
+    # load json
+    def load_json(self, file_path):
+        return json.loads(self.read(file_path))
+
+
+# file content cache shared by messenger instances
+file_content_cache = FileContentCache(maxFileCacheSize)
+
+# watcher of access points. imported only when enabled since it depends on DB and FIFO
+if watchAccessPoints:
+    from .access_point_watcher import AccessPointWatcher
+    access_point_watcher = AccessPointWatcher([jsonJobRequestFileName, jsonEventsRequestFileName,
+                                               jsonOutputsFileName, jsonEventsUpdateFileName,
+                                               killWorkerFile],
+                                              poll_interval=watcherPollInterval)
+else:
+    access_point_watcher = None
+
+
 # messenger with shared file system
 class SharedFileMessenger(BaseMessenger):
     # constructor
@@ -324,15 +415,18 @@ class SharedFileMessenger(BaseMessenger):
             # not found
             tmpLog.debug('not found')
             return False
-        # read nJobs
+        return self._read_job_request(jsonFilePath, tmpLog)
+
+    # read the number of jobs in job request file
+    def _read_job_request(self, json_file_path, tmp_log):
         try:
-            with open(jsonFilePath) as jsonFile:
+            with open(json_file_path) as jsonFile:
                 tmpDict = json.load(jsonFile)
                 nJobs = tmpDict['nJobs']
         except Exception:
             # request 1 job by default
             nJobs = 1
-        tmpLog.debug('requesting {0} jobs'.format(nJobs))
+        tmp_log.debug('requesting {0} jobs'.format(nJobs))
         return nJobs
 
     # feed jobs
@@ -536,6 +630,7 @@ class SharedFileMessenger(BaseMessenger):
                         if accessPoint != subAccessPoint:
                             if not os.path.exists(subAccessPoint):
                                 os.mkdir(subAccessPoint)
+                self.watch_access_points(workSpec)
             return True
         except Exception:
             # get logger
@@ -543,6 +638,22 @@ class SharedFileMessenger(BaseMessenger):
             core_utils.dump_error_message(tmpLog)
             return False
 
+    # register access points of a worker to the watcher
+    def watch_access_points(self, workspec):
+        if access_point_watcher is None:
+            return
+        dirNames = [workspec.get_access_point()]
+        jobSpecs = workspec.get_jobspec_list()
+        if jobSpecs is not None:
+            pandaIDs = [jobSpec.PandaID for jobSpec in jobSpecs]
+        else:
+            pandaIDs = workspec.pandaid_list or []
+        for pandaID in pandaIDs:
+            subAccessPoint = self.get_access_point(workspec, pandaID)
+            if subAccessPoint not in dirNames:
+                dirNames.append(subAccessPoint)
+        access_point_watcher.register(workspec.workerID, dirNames)
+
     # filter for log.tar.gz
     def filter_log_tgz(self, name):
         for tmpPatt in ['*.log', '*.txt', '*.xml', '*.json', 'log*']:
@@ -646,7 +757,13 @@ class SharedFileMessenger(BaseMessenger):
         # json file
         jsonFilePath = os.path.join(workspec.get_access_point(), heartbeatFile)
         tmpLog.debug('looking for heartbeat file {0}'.format(jsonFilePath))
-        if not os.path.exists(jsonFilePath): # no heartbeat file was found
+        return self._check_heartbeat(workspec, time_limit, jsonFilePath, os.path.exists(jsonFilePath), tmpLog)
+
+    # check heartbeat file
+    def _check_heartbeat(self, workspec, time_limit, json_file_path, file_exists, tmp_log):
+        tmpLog = tmp_log
+        jsonFilePath = json_file_path
+        if not file_exists: # no heartbeat file was found
             tmpLog.debug('startTime: {0}, now: {1}'.format(workspec.startTime, datetime.datetime.utcnow()))
             if not workspec.startTime:
                 # the worker didn't even have time to start
@@ -672,6 +789,107 @@ class SharedFileMessenger(BaseMessenger):
             tmpLog.debug('failed to get mtime')
             return None
 
+    # check if jobs are requested by workers, scanning each access point once without touching other files.
+    # returns a list of the same values as job_requested
+    def get_job_requested_bulk(self, workspec_list):
+        retList = []
+        for workspec in workspec_list:
+            # get logger
+            tmpLog = core_utils.make_logger(_logger, 'workerID={0}'.format(workspec.workerID),
+                                            method_name='get_job_requested_bulk')
+            jsonFilePath = os.path.join(workspec.get_access_point(), jsonJobRequestFileName)
+            fileNames = list_file_names(workspec.get_access_point())
+            if fileNames is None:
+                fileExists = os.path.exists(jsonFilePath)
+            else:
+                fileExists = jsonJobRequestFileName in fileNames
+            if fileExists:
+                retList.append(self._read_job_request(jsonFilePath, tmpLog))
+            else:
+                retList.append(False)
+        return retList
+
+    # get all inputs of monitor for workers, scanning each access point once and reading only modified files.
+    # returns a list of dicts with the same keys as Monitor.get_messenger_info, together with jobRequested
+    # which is the same as job_requested
+    def get_monitor_info(self, workspec_list, worker_heartbeat_limit=None):
+        retList = []
+        for workspec in workspec_list:
+            # get logger
+            tmpLog = core_utils.make_logger(_logger, 'workerID={0}'.format(workspec.workerID),
+                                            method_name='get_monitor_info')
+            accessPoint = workspec.get_access_point()
+            # watch access points of workers submitted before restart
+            self.watch_access_points(workspec)
+            fileNamesMap = {accessPoint: list_file_names(accessPoint)}
+            for pandaID in workspec.pandaid_list:
+                subAccessPoint = self.get_access_point(workspec, pandaID)
+                if subAccessPoint not in fileNamesMap:
+                    fileNamesMap[subAccessPoint] = list_file_names(subAccessPoint)
+            # check if a file exists
+            def file_exists(dir_name, file_name):
+                fileNames = fileNamesMap[dir_name]
+                if fileNames is None:
+                    return os.path.exists(os.path.join(dir_name, file_name))
+                return file_name in fileNames
+            # load json if exists
+            def load_json(dir_name, file_name, default_value):
+                if not file_exists(dir_name, file_name):
+                    return default_value
+                jsonFilePath = os.path.join(dir_name, file_name)
+                try:
+                    return file_content_cache.load_json(jsonFilePath)
+                except Exception:
+                    tmpLog.debug('failed to load {0}'.format(jsonFilePath))
+                    return default_value
+            retMap = dict()
+            # job request
+            if file_exists(accessPoint, jsonJobRequestFileName):
+                retMap['jobRequested'] = self._read_job_request(os.path.join(accessPoint, jsonJobRequestFileName),
+                                                                tmpLog)
+            else:
+                retMap['jobRequested'] = False
+            retMap['killRequested'] = file_exists(accessPoint, killWorkerFile)
+            if worker_heartbeat_limit:
+                retMap['isAlive'] = self._check_heartbeat(workspec, worker_heartbeat_limit,
+                                                          os.path.join(accessPoint, heartbeatFile),
+                                                          file_exists(accessPoint, heartbeatFile), tmpLog)
+            # work attributes
+            allRetDict = dict()
+            for pandaID in workspec.pandaid_list:
+                subAccessPoint = self.get_access_point(workspec, pandaID)
+                tmpDict = load_json(subAccessPoint, jsonAttrsFileName, dict())
+                jobReport = load_json(subAccessPoint, jsonJobReport, None)
+                if jobReport is not None:
+                    tmpDict['metaData'] = jobReport
+                allRetDict[pandaID] = tmpDict
+            retMap['workAttributes'] = allRetDict
+            # files and events to update which are renamed when read
+            subAccessPoints = set([self.get_access_point(workspec, pandaID) for pandaID in workspec.pandaid_list])
+            def files_exist(file_name):
+                for subAccessPoint in subAccessPoints:
+                    if file_exists(subAccessPoint, file_name) \
+                            or file_exists(subAccessPoint, file_name + suffixReadJson):
+                        return True
+                return False
+            if files_exist(jsonOutputsFileName):
+                retMap['filesToStageOut'] = self.get_files_to_stage_out(workspec)
+            else:
+                retMap['filesToStageOut'] = dict()
+            if workspec.eventsRequest in [WorkSpec.EV_useEvents, WorkSpec.EV_requestEvents]:
+                # events could be dumped when reading output files
+                if files_exist(jsonEventsUpdateFileName) or len(retMap['filesToStageOut']) > 0:
+                    retMap['eventsToUpdate'] = self.events_to_update(workspec)
+                else:
+                    retMap['eventsToUpdate'] = dict()
+            if workspec.eventsRequest == WorkSpec.EV_useEvents:
+                retMap['eventsRequestParams'] = load_json(accessPoint, jsonEventsRequestFileName, dict())
+            # PandaIDs for pull model
+            if workspec.mapType == WorkSpec.MT_NoJob:
+                retMap['pandaIDs'] = load_json(accessPoint, pandaIDsFile, [])
+            retList.append(retMap)
+        return retList
+
     # clean up. Called by sweeper agent to clean up stuff made by messenger for the worker
     # for shared_file_messenger, clean up worker the directory of access point
     def clean_up(self, workspec):
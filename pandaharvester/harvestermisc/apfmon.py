@@ -5,10 +5,15 @@ API described here: http://apfmon.lancs.ac.uk/help
 import requests
 import json
 import time
+import threading
 import traceback
 
+import six
+from six.moves import queue
+
 from pandaharvester.harvesterconfig import harvester_config
 from pandaharvester.harvestercore import core_utils
+from pandaharvester.harvestercore.core_utils import SingletonWithID
 from pandaharvester import panda_pkg_info
 from pandaharvester.harvestermisc import generic_utils
 from pandaharvester.harvestercore.work_spec import WorkSpec
@@ -28,6 +33,147 @@ def clean_ce(ce):
     return ce.split('.')[0].split('://')[-1]
 
 
+class ApfmonSender(six.with_metaclass(SingletonWithID, object)):
+    """
+    Background sender of worker creations and status updates, shared by all agents in the process.
+    Reports are put to a bounded queue and dropped when it is full, so that agents never wait for APFMon.
+    Status updates of the same batchID waiting in the queue are coalesced to the latest one
+    """
+    # interval in sec to log statistics
+    stats_interval = 600
+
+    def __init__(self, *args, **kwargs):
+        self.base_url = kwargs['base_url']
+        self.factory = kwargs['factory']
+        self.timeout = kwargs['timeout']
+        self.bulk_updates = kwargs['bulk_updates']
+        self.max_workers_per_request = kwargs['max_workers_per_request']
+        self.queue = queue.Queue(kwargs['queue_size'])
+        self.session = requests.Session()
+        self.stats_lock = threading.Lock()
+        self.n_sent = 0
+        self.n_failed = 0
+        self.n_dropped = 0
+        self.n_coalesced = 0
+        self.sum_latency = 0.
+        self.max_latency = 0.
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, item):
+        """
+        Puts ('create', [apfmon_worker, ...]) or ('update', batch_id, [apfmon_worker, ...]) without blocking
+        :return: False if dropped due to backpressure
+        """
+        try:
+            self.queue.put_nowait((time.time(), item))
+            return True
+        except queue.Full:
+            with self.stats_lock:
+                self.n_dropped += 1
+            return False
+
+    def get_stats(self):
+        """
+        Counters of reports sent, failed, dropped, and coalesced, together with latency in sec from put to sent
+        """
+        with self.stats_lock:
+            n_done = self.n_sent + self.n_failed
+            return {'queued': self.queue.qsize(),
+                    'sent': self.n_sent,
+                    'failed': self.n_failed,
+                    'dropped': self.n_dropped,
+                    'coalesced': self.n_coalesced,
+                    'avg_latency': self.sum_latency / n_done if n_done else 0.,
+                    'max_latency': self.max_latency}
+
+    def _request(self, method, url, n_reports, put_times, tmp_log, **kwargs):
+        try:
+            r = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            is_ok = r.status_code // 100 == 2
+            tmp_log.debug('{0} {1} for {2} reports ended with {3} {4}'.format(method, url, n_reports,
+                                                                              r.status_code, r.text))
+        except Exception:
+            is_ok = False
+            tmp_log.error('{0} {1} excepted with: {2}'.format(method, url, traceback.format_exc()))
+        time_now = time.time()
+        with self.stats_lock:
+            if is_ok:
+                self.n_sent += n_reports
+            else:
+                self.n_failed += n_reports
+            for put_time in put_times:
+                self.sum_latency += time_now - put_time
+                self.max_latency = max(self.max_latency, time_now - put_time)
+
+    def send(self, items, tmp_log):
+        # collect creations and the latest update for each batchID
+        creations = []
+        updates = dict()
+        n_coalesced = 0
+        for put_time, item in items:
+            if item[0] == 'create':
+                creations += [(put_time, apfmon_worker) for apfmon_worker in item[1]]
+            else:
+                batch_id, apfmon_workers = item[1:]
+                if batch_id in updates:
+                    n_coalesced += 1
+                updates[batch_id] = (put_time, apfmon_workers)
+        with self.stats_lock:
+            self.n_coalesced += n_coalesced
+        # create workers before updating them
+        url = '{0}/jobs'.format(self.base_url)
+        for shard in generic_utils.create_shards(creations, self.max_workers_per_request):
+            self._request('put', url, len(shard), [put_time for put_time, _ in shard], tmp_log,
+                          data=json.dumps([apfmon_worker for _, apfmon_worker in shard]))
+        # updates in rounds to send exiting before done
+        while updates:
+            round_updates = []
+            for batch_id in list(updates):
+                put_time, apfmon_workers = updates[batch_id]
+                round_updates.append((put_time, batch_id, apfmon_workers[0]))
+                if len(apfmon_workers) > 1:
+                    updates[batch_id] = (put_time, apfmon_workers[1:])
+                else:
+                    del updates[batch_id]
+            if self.bulk_updates:
+                for shard in generic_utils.create_shards(round_updates, self.max_workers_per_request):
+                    payload = []
+                    for put_time, batch_id, apfmon_worker in shard:
+                        apfmon_worker = dict(apfmon_worker)
+                        apfmon_worker.update({'cid': batch_id, 'factory': self.factory})
+                        payload.append(apfmon_worker)
+                    self._request('post', url, len(shard), [put_time for put_time, _, _ in shard], tmp_log,
+                                  data=json.dumps(payload))
+            else:
+                for put_time, batch_id, apfmon_worker in round_updates:
+                    self._request('post', '{0}/jobs/{1}:{2}'.format(self.base_url, self.factory, batch_id), 1,
+                                  [put_time], tmp_log, data=apfmon_worker)
+
+    def run(self):
+        tmp_log = core_utils.make_logger(_base_logger, 'harvester_id={0}'.format(self.factory),
+                                         method_name='ApfmonSender.run')
+        last_stats_time = time.time()
+        while True:
+            items = []
+            try:
+                # take all reports queued while sending the previous ones
+                items.append(self.queue.get(timeout=self.stats_interval))
+                while True:
+                    items.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                if items:
+                    self.send(items, tmp_log)
+                if time.time() - last_stats_time > self.stats_interval:
+                    tmp_log.info('stats {0}'.format(self.get_stats()))
+                    last_stats_time = time.time()
+            except Exception:
+                tmp_log.error('Excepted with: {0}'.format(traceback.format_exc()))
+
+
 class Apfmon(object):
 
     def __init__(self, queue_config_mapper):
@@ -60,6 +206,33 @@ class Apfmon(object):
 
         self.queue_config_mapper = queue_config_mapper
 
+        # worker reports are sent in the background
+        self.sender = None
+        if self.__active:
+            try:
+                queue_size = harvester_config.apfmon.queue_size
+            except AttributeError:
+                queue_size = 10000
+            try:
+                bulk_updates = harvester_config.apfmon.bulk_updates
+            except AttributeError:
+                bulk_updates = True
+            try:
+                max_workers_per_request = harvester_config.apfmon.max_workers_per_request
+            except AttributeError:
+                max_workers_per_request = 20
+            self.sender = ApfmonSender(id=self.base_url, base_url=self.base_url, factory=self.harvester_id,
+                                       timeout=self.__worker_timeout, queue_size=queue_size,
+                                       bulk_updates=bulk_updates, max_workers_per_request=max_workers_per_request)
+
+    def get_stats(self):
+        """
+        Counters of the background sender of worker reports
+        """
+        if self.sender is None:
+            return {}
+        return self.sender.get_stats()
+
     def create_factory(self):
         """
         Creates or updates a harvester instance to APF Mon. Should be done at startup of the instance.
@@ -264,54 +437,50 @@ class Apfmon(object):
         try:
             tmp_log.debug('start')
 
-            url = '{0}/jobs'.format(self.base_url)
-
-            for worker_spec_shard in generic_utils.create_shards(worker_spec_list, 20):
-                apfmon_workers = []
-                for worker_spec in worker_spec_shard:
-                    batch_id = worker_spec.batchID
-                    worker_id = worker_spec.workerID
-                    if not batch_id:
-                        tmp_log.debug('no batchID found for workerID {0}... skipping'.format(worker_id))
-                        continue
-                    factory = self.harvester_id
-                    computingsite = worker_spec.computingSite
-                    try:
-                        ce = clean_ce(worker_spec.computingElement)
-                    except AttributeError:
-                        tmp_log.debug('no CE found for workerID {0} batchID {1}'.format(worker_id, batch_id))
-                        ce = ''
-
-                    # extract the log URLs
-                    stdout_url = ''
-                    stderr_url = ''
-                    log_url = ''
-                    jdl_url = ''
-
-                    work_attribs = worker_spec.workAttributes
-                    if work_attribs:
-                        if 'stdOut' in work_attribs:
-                            stdout_url = work_attribs['stdOut']
-                            jdl_url = '{0}.jdl'.format(stdout_url[:-4])
-                        if 'stdErr' in work_attribs:
-                            stderr_url = work_attribs['stdErr']
-                        if 'batchLog' in work_attribs:
-                            log_url = work_attribs['batchLog']
-
-                    apfmon_worker = {'cid': batch_id,
-                                     'factory': factory,
-                                     'label': '{0}-{1}'.format(computingsite, ce),
-                                     'jdlurl': jdl_url,
-                                     'stdouturl': stdout_url,
-                                     'stderrurl': stderr_url,
-                                     'logurl': log_url
-                                     }
-                    tmp_log.debug('packed worker: {0}'.format(apfmon_worker))
-                    apfmon_workers.append(apfmon_worker)
-
-                payload = json.dumps(apfmon_workers)
-                r = requests.put(url, data=payload, timeout=self.__worker_timeout)
-                tmp_log.debug('worker creation for {0} ended with {1} {2}'.format(apfmon_workers, r.status_code, r.text))
+            apfmon_workers = []
+            for worker_spec in worker_spec_list:
+                batch_id = worker_spec.batchID
+                worker_id = worker_spec.workerID
+                if not batch_id:
+                    tmp_log.debug('no batchID found for workerID {0}... skipping'.format(worker_id))
+                    continue
+                factory = self.harvester_id
+                computingsite = worker_spec.computingSite
+                try:
+                    ce = clean_ce(worker_spec.computingElement)
+                except AttributeError:
+                    tmp_log.debug('no CE found for workerID {0} batchID {1}'.format(worker_id, batch_id))
+                    ce = ''
+
+                # extract the log URLs
+                stdout_url = ''
+                stderr_url = ''
+                log_url = ''
+                jdl_url = ''
+
+                work_attribs = worker_spec.workAttributes
+                if work_attribs:
+                    if 'stdOut' in work_attribs:
+                        stdout_url = work_attribs['stdOut']
+                        jdl_url = '{0}.jdl'.format(stdout_url[:-4])
+                    if 'stdErr' in work_attribs:
+                        stderr_url = work_attribs['stdErr']
+                    if 'batchLog' in work_attribs:
+                        log_url = work_attribs['batchLog']
+
+                apfmon_worker = {'cid': batch_id,
+                                 'factory': factory,
+                                 'label': '{0}-{1}'.format(computingsite, ce),
+                                 'jdlurl': jdl_url,
+                                 'stdouturl': stdout_url,
+                                 'stderrurl': stderr_url,
+                                 'logurl': log_url
+                                 }
+                tmp_log.debug('packed worker: {0}'.format(apfmon_worker))
+                apfmon_workers.append(apfmon_worker)
+
+            if apfmon_workers and not self.sender.put(('create', apfmon_workers)):
+                tmp_log.warning('dropped creation of {0} workers since the queue is full'.format(len(apfmon_workers)))
 
             end_time = time.time()
             tmp_log.debug('done (took {0})'.format(end_time - start_time))
@@ -350,12 +519,10 @@ class Apfmon(object):
             tmp_log.debug('start')
 
             batch_id = worker_spec.batchID
-            factory = self.harvester_id
-
-            url = '{0}/jobs/{1}:{2}'.format(self.base_url, factory, batch_id)
 
             apfmon_status = self.convert_status(worker_status)
             apfmon_worker = {}
+            apfmon_workers = []
 
             for status in apfmon_status:
                 apfmon_worker['state'] = status
@@ -367,9 +534,10 @@ class Apfmon(object):
                         apfmon_worker['ids'] = ','.join(str(x) for x in worker_spec.pandaid_list)
 
                 tmp_log.debug('updating worker {0}: {1}'.format(batch_id, apfmon_worker))
+                apfmon_workers.append(dict(apfmon_worker))
 
-                r = requests.post(url, data=apfmon_worker, timeout=self.__worker_timeout)
-                tmp_log.debug('worker update for {0} ended with {1} {2}'.format(batch_id, r.status_code, r.text))
+            if not self.sender.put(('update', batch_id, apfmon_workers)):
+                tmp_log.warning('dropped update of worker {0} since the queue is full'.format(batch_id))
 
             end_time = time.time()
             tmp_log.debug('done (took {0})'.format(end_time - start_time))
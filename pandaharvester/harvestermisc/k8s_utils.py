@@ -4,19 +4,25 @@ utilities routines associated with Kubernetes python client
 """
 import os
 import copy
+import time
 import datetime
 import base64
+import threading
 
 import six
 import yaml
 
-from kubernetes import client, config
+from kubernetes import client, config, watch
 from kubernetes.client.rest import ApiException
 
 from pandaharvester.harvesterconfig import harvester_config
+from pandaharvester.harvestercore import core_utils
 from pandaharvester.harvestercore.core_utils import SingletonWithID
 from pandaharvester.harvestermisc.info_utils import PandaQueuesDict
 
+# logger
+baseLogger = core_utils.setup_logger('k8s_utils')
+
 
 class k8s_Client(six.with_metaclass(SingletonWithID, object)):
 
@@ -26,6 +32,13 @@ class k8s_Client(six.with_metaclass(SingletonWithID, object)):
         self.corev1 = client.CoreV1Api()
         self.batchv1 = client.BatchV1Api()
         self.deletev1 = client.V1DeleteOptions(propagation_policy='Background')
+        # pods info cache kept updated by watch; {pod_name: pod_info}
+        self.podCache = dict()
+        self.podCacheLock = threading.Lock()
+        self.podCacheResourceVersion = None
+        self.podCacheUpdateTime = None
+        self.podWatchThread = None
+        self.podWatchTimeout = None
 
     def read_yaml_file(self, yaml_file):
         with open(yaml_file) as f:
@@ -84,28 +97,102 @@ class k8s_Client(six.with_metaclass(SingletonWithID, object)):
         rsp = self.batchv1.create_namespaced_job(body=yaml_content, namespace=self.namespace)
         return rsp
 
-    def get_pods_info(self):
-        pods_list = list()
-
-        ret = self.corev1.list_namespaced_pod(namespace=self.namespace)
-
-        for i in ret.items:
-            pod_info = {}
-            pod_info['name'] = i.metadata.name
-            pod_info['start_time'] = i.status.start_time.replace(tzinfo=None) if i.status.start_time else i.status.start_time
-            pod_info['status'] = i.status.phase
-            pod_info['status_reason'] = i.status.conditions[0].reason if i.status.conditions else None
-            pod_info['status_message'] = i.status.conditions[0].message if i.status.conditions else None
-            pod_info['job_name'] = i.metadata.labels['job-name'] if i.metadata.labels and 'job-name' in i.metadata.labels else None
-            pods_list.append(pod_info)
-
-        return pods_list
+    def make_pod_info(self, i):
+        pod_info = {}
+        pod_info['name'] = i.metadata.name
+        pod_info['start_time'] = i.status.start_time.replace(tzinfo=None) if i.status.start_time else i.status.start_time
+        pod_info['status'] = i.status.phase
+        pod_info['status_reason'] = i.status.conditions[0].reason if i.status.conditions else None
+        pod_info['status_message'] = i.status.conditions[0].message if i.status.conditions else None
+        pod_info['job_name'] = i.metadata.labels['job-name'] if i.metadata.labels and 'job-name' in i.metadata.labels else None
+        return pod_info
+
+    def get_pods_info(self, group_by_job_name=False):
+        pods_list = None
+        # use cache if the watch is alive
+        if self.podWatchThread is not None:
+            with self.podCacheLock:
+                if self.podCacheUpdateTime is not None \
+                        and time.time() - self.podCacheUpdateTime < 2 * self.podWatchTimeout:
+                    pods_list = list(self.podCache.values())
+        if pods_list is None:
+            ret = self.corev1.list_namespaced_pod(namespace=self.namespace)
+            pods_list = [self.make_pod_info(i) for i in ret.items]
+
+        if not group_by_job_name:
+            return pods_list
+        # {job_name: [pod_info, ...]}
+        pods_dict = dict()
+        for pod_info in pods_list:
+            pods_dict.setdefault(pod_info['job_name'], []).append(pod_info)
+        return pods_dict
 
     def filter_pods_info(self, pods_list, job_name=None):
+        # pods grouped by job name
+        if isinstance(pods_list, dict):
+            if job_name:
+                return pods_list.get(job_name, [])
+            return [i for tmp_list in pods_list.values() for i in tmp_list]
         if job_name:
             pods_list = [ i for i in pods_list if i['job_name'] == job_name]
         return pods_list
 
+    # list pods to reset the cache
+    def _reset_pod_cache(self):
+        ret = self.corev1.list_namespaced_pod(namespace=self.namespace)
+        with self.podCacheLock:
+            self.podCache = dict([(i.metadata.name, self.make_pod_info(i)) for i in ret.items])
+            self.podCacheResourceVersion = ret.metadata.resource_version
+            self.podCacheUpdateTime = time.time()
+
+    # keep the cache updated with pod events since the resource version of the cache
+    def _watch_pods(self):
+        tmpLog = core_utils.make_logger(baseLogger, 'namespace={0}'.format(self.namespace), method_name='_watch_pods')
+        tmpLog.debug('start')
+        needReset = False
+        while True:
+            try:
+                if needReset:
+                    self._reset_pod_cache()
+                    tmpLog.debug('reset cache with {0} pods'.format(len(self.podCache)))
+                    needReset = False
+                pod_watch = watch.Watch()
+                for event in pod_watch.stream(self.corev1.list_namespaced_pod, namespace=self.namespace,
+                                              resource_version=self.podCacheResourceVersion,
+                                              timeout_seconds=self.podWatchTimeout):
+                    i = event['object']
+                    with self.podCacheLock:
+                        if event['type'] == 'DELETED':
+                            self.podCache.pop(i.metadata.name, None)
+                        else:
+                            self.podCache[i.metadata.name] = self.make_pod_info(i)
+                        self.podCacheResourceVersion = i.metadata.resource_version
+                        self.podCacheUpdateTime = time.time()
+                # the stream ended without error
+                with self.podCacheLock:
+                    self.podCacheUpdateTime = time.time()
+            except ApiException as _e:
+                if _e.status != 410:
+                    tmpLog.error('failed to watch pods ; {0}'.format(_e))
+                    time.sleep(10)
+                # resource version is too old
+                needReset = True
+            except Exception as _e:
+                tmpLog.error('failed to watch pods ; {0}'.format(_e))
+                time.sleep(10)
+                needReset = True
+
+    # start a thread to keep pods info updated with watch, instead of listing pods every time
+    def start_pod_watch(self, timeout_seconds=300):
+        with self.podCacheLock:
+            if self.podWatchThread is not None:
+                return
+            self.podWatchTimeout = timeout_seconds
+            self.podWatchThread = threading.Thread(target=self._watch_pods)
+            self.podWatchThread.daemon = True
+        self._reset_pod_cache()
+        self.podWatchThread.start()
+
     def get_jobs_info(self, job_name=None):
         jobs_list = list()
 
@@ -115,9 +202,9 @@ class k8s_Client(six.with_metaclass(SingletonWithID, object)):
         for i in ret.items:
             job_info = {}
             job_info['name'] = i.metadata.name
-            job_info['status'] = i.status.conditions[0].type
-            job_info['status_reason'] = i.status.conditions[0].reason
-            job_info['status_message'] = i.status.conditions[0].message
+            job_info['status'] = i.status.conditions[0].type if i.status.conditions else None
+            job_info['status_reason'] = i.status.conditions[0].reason if i.status.conditions else None
+            job_info['status_message'] = i.status.conditions[0].message if i.status.conditions else None
             jobs_list.append(job_info)
         return jobs_list
 
@@ -137,6 +224,23 @@ class k8s_Client(six.with_metaclass(SingletonWithID, object)):
 
         return retList
 
+    def delete_pods_by_job_names(self, job_name_list, n_jobs_per_call=100):
+        retList = list()
+
+        for job_names in core_utils.create_shards(job_name_list, n_jobs_per_call):
+            label_selector = 'job-name in ({0})'.format(','.join(job_names))
+            try:
+                self.corev1.delete_collection_namespaced_pod(namespace=self.namespace, label_selector=label_selector,
+                                                             body=self.deletev1, grace_period_seconds=0)
+            except ApiException as _e:
+                errMsg = '' if _e.status == 404 else _e.reason
+            else:
+                errMsg = ''
+            for job_name in job_names:
+                retList.append({'name': job_name, 'errMsg': errMsg})
+
+        return retList
+
     def delete_job(self, job_name):
         self.batchv1.delete_namespaced_job(name=job_name, namespace=self.namespace, body=self.deletev1, grace_period_seconds=0)
 
@@ -76,6 +76,20 @@ def condor_job_id_from_workspec(workspec):
     return '{0}#{1}'.format(workspec.submissionHost, workspec.batchID)
 
 
+## batchIDs matching job ads; ClusterId for workers submitted alone, ClusterId.ProcId for workers submitted in a cluster
+def _batchids_from_job_ads(job_ads_dict):
+    clusterid = str(job_ads_dict['ClusterId'])
+    procid = job_ads_dict.get('ProcId')
+    if procid is None:
+        return [clusterid]
+    return [clusterid, '{0}.{1}'.format(clusterid, procid)]
+
+
+## ClusterIds of batchIDs
+def _clusterids_str(batchIDs_set):
+    return ','.join(set([batchid.split('.')[0] for batchid in batchIDs_set]))
+
+
 ## Condor queue cache fifo
 class CondorQCacheFifo(six.with_metaclass(SingletonWithID, SpecialFIFOBase)):
     global_lock_id = -1
@@ -223,12 +237,12 @@ class CondorJobQuery(six.with_metaclass(SingletonWithID, object)):
                         ## Every attribute
                         attribute_iter = map(_getAttribute_tuple, _c.findall('a'))
                         job_ads_dict.update(attribute_iter)
-                        batchid = str(job_ads_dict['ClusterId'])
-                        condor_job_id = '{0}#{1}'.format(self.submissionHost, batchid)
-                        job_ads_all_dict[condor_job_id] = job_ads_dict
-                        ## Remove batch jobs already gotten from the list
-                        if batchid in batchIDs_set:
-                            batchIDs_set.discard(batchid)
+                        for batchid in _batchids_from_job_ads(job_ads_dict):
+                            condor_job_id = '{0}#{1}'.format(self.submissionHost, batchid)
+                            job_ads_all_dict[condor_job_id] = job_ads_dict
+                            ## Remove batch jobs already gotten from the list
+                            if batchid in batchIDs_set:
+                                batchIDs_set.discard(batchid)
                 else:
                     ## Job not found
                     tmpLog.debug('job not found with {0}'.format(comStr))
@@ -261,17 +275,17 @@ class CondorJobQuery(six.with_metaclass(SingletonWithID, object)):
         for query_method in query_method_list:
             ## Make requirements
             batchIDs_str = ','.join(list(batchIDs_set))
-            requirements = 'member(ClusterID, {{{0}}})'.format(batchIDs_str)
+            requirements = 'member(ClusterID, {{{0}}})'.format(_clusterids_str(batchIDs_set))
             tmpLog.debug('Query method: {0} ; batchIDs: "{1}"'.format(query_method.__name__, batchIDs_str))
             ## Query
             jobs_iter = query_method(requirements=requirements, projection=CONDOR_JOB_ADS_LIST)
             for job in jobs_iter:
                 job_ads_dict = dict(job)
-                batchid = str(job_ads_dict['ClusterId'])
-                condor_job_id = '{0}#{1}'.format(self.submissionHost, batchid)
-                job_ads_all_dict[condor_job_id] = job_ads_dict
-                ## Remove batch jobs already gotten from the list
-                batchIDs_set.discard(batchid)
+                for batchid in _batchids_from_job_ads(job_ads_dict):
+                    condor_job_id = '{0}#{1}'.format(self.submissionHost, batchid)
+                    job_ads_all_dict[condor_job_id] = job_ads_dict
+                    ## Remove batch jobs already gotten from the list
+                    batchIDs_set.discard(batchid)
             if len(batchIDs_set) == 0:
                 break
         ## Remaining
@@ -426,17 +440,17 @@ class CondorJobQuery(six.with_metaclass(SingletonWithID, object)):
             if query_method is cache_query:
                 requirements = 'harvesterID =?= "{0}"'.format(harvesterID)
             else:
-                requirements = 'member(ClusterID, {{{0}}})'.format(batchIDs_str)
+                requirements = 'member(ClusterID, {{{0}}})'.format(_clusterids_str(batchIDs_set))
             tmpLog.debug('Query method: {0} ; batchIDs: "{1}"'.format(query_method.__name__, batchIDs_str))
             ## Query
             jobs_iter = query_method(requirements=requirements, projection=CONDOR_JOB_ADS_LIST)
             for job in jobs_iter:
                 job_ads_dict = dict(job)
-                batchid = str(job_ads_dict['ClusterId'])
-                condor_job_id = '{0}#{1}'.format(self.submissionHost, batchid)
-                job_ads_all_dict[condor_job_id] = job_ads_dict
-                ## Remove batch jobs already gotten from the list
-                batchIDs_set.discard(batchid)
+                for batchid in _batchids_from_job_ads(job_ads_dict):
+                    condor_job_id = '{0}#{1}'.format(self.submissionHost, batchid)
+                    job_ads_all_dict[condor_job_id] = job_ads_dict
+                    ## Remove batch jobs already gotten from the list
+                    batchIDs_set.discard(batchid)
             if len(batchIDs_set) == 0:
                 break
         ## Remaining
@@ -637,6 +651,10 @@ def _check_one_worker(workspec, job_ads_all_dict, cancel_unknown=False, held_tim
 
 # monitor for HTCONDOR batch system
 class HTCondorMonitor(PluginBase):
+    # instances are reused for the same config and shared among threads
+    instanceCacheable = True
+    threadSafe = True
+
     # constructor
     def __init__(self, **kwarg):
         PluginBase.__init__(self, **kwarg)
@@ -17,6 +17,9 @@ baseLogger = core_utils.setup_logger('k8s_monitor')
 
 # monitor for K8S
 class K8sMonitor(PluginBase):
+    # instances are reused for the same config in each thread since pods info is kept during a call
+    instanceCacheable = True
+
     # constructor
     def __init__(self, **kwarg):
         PluginBase.__init__(self, **kwarg)
@@ -37,8 +40,20 @@ class K8sMonitor(PluginBase):
             self.podQueueTimeLimit
         except AttributeError:
             self.podQueueTimeLimit = 172800
+        # keep pods info updated with watch instead of listing pods in every cycle
+        try:
+            self.usePodWatch
+        except AttributeError:
+            self.usePodWatch = False
+        try:
+            self.podWatchTimeout
+        except AttributeError:
+            self.podWatchTimeout = 300
+        if self.usePodWatch:
+            self.k8s_client.start_pod_watch(timeout_seconds=self.podWatchTimeout)
 
-        self._all_pods_list = []
+        # {job_name: [pod_info, ...]}
+        self._all_pods_dict = {}
 
     def check_pods_status(self, pods_status_list):
         newStatus = ''
@@ -75,7 +90,7 @@ class K8sMonitor(PluginBase):
         errStr = ''
 
         try:
-            pods_list = self.k8s_client.filter_pods_info(self._all_pods_list, job_name=job_id)
+            pods_list = self.k8s_client.filter_pods_info(self._all_pods_dict, job_name=job_id)
             timeNow = datetime.datetime.utcnow()
             pods_status_list = []
             pods_name_to_delete_list = []
@@ -125,7 +140,7 @@ class K8sMonitor(PluginBase):
             retList.append(('', errStr))
             return False, retList
 
-        self._all_pods_list = self.k8s_client.get_pods_info()
+        self._all_pods_dict = self.k8s_client.get_pods_info(group_by_job_name=True)
 
         with ThreadPoolExecutor(self.nProcesses) as thread_pool:
             retIterator = thread_pool.map(self.check_a_job, workspec_list)
@@ -12,25 +12,77 @@ from pandaharvester.harvestercore.plugin_base import PluginBase
 baseLogger = core_utils.setup_logger('pbs_monitor')
 
 
+# map batch status to worker status
+def _map_batch_status(batch_status):
+    if batch_status in ['R', 'E']:
+        return WorkSpec.ST_running
+    elif batch_status in ['C', 'H', 'F']:
+        return WorkSpec.ST_finished
+    elif batch_status in ['CANCELLED']:
+        return WorkSpec.ST_cancelled
+    elif batch_status in ['Q', 'W', 'S']:
+        return WorkSpec.ST_submitted
+    return WorkSpec.ST_failed
+
+
+# parse output of qstat -f to a dict of {jobID: (batchStatus, line)}
+def _parse_qstat_full(output):
+    retMap = dict()
+    jobID = None
+    for tmpLine in output.split('\n'):
+        tmpMatch = re.match('Job Id: (\S+)', tmpLine)
+        if tmpMatch is not None:
+            jobID = tmpMatch.group(1)
+            continue
+        tmpMatch = re.match('\s+job_state = (\S+)', tmpLine)
+        if tmpMatch is not None and jobID is not None:
+            retMap[jobID] = (tmpMatch.group(1), '{0} {1}'.format(jobID, tmpLine.strip()))
+            # short job ID without server name
+            retMap.setdefault(jobID.split('.')[0], retMap[jobID])
+            jobID = None
+    return retMap
+
+
 # monitor for PBS batch system
 class PBSMonitor(PluginBase):
     # constructor
     def __init__(self, **kwarg):
         PluginBase.__init__(self, **kwarg)
+        # query all workers with one qstat instead of one qstat per worker
+        try:
+            self.useBulkQuery
+        except AttributeError:
+            self.useBulkQuery = False
+        try:
+            self.maxJobsPerQuery
+        except AttributeError:
+            self.maxJobsPerQuery = 500
+        # options of qstat in bulk queries, e.g. '-f -x' to include finished jobs with PBS Pro
+        try:
+            self.bulkQstatOptions
+        except AttributeError:
+            self.bulkQstatOptions = '-f'
 
     # check workers
     def check_workers(self, workspec_list):
+        if self.useBulkQuery:
+            return self.check_workers_in_bulk(workspec_list)
+        return self.check_workers_one_by_one(workspec_list)
+
+    # check workers with one qstat per worker
+    def check_workers_one_by_one(self, workspec_list):
         retList = []
         for workSpec in workspec_list:
             # make logger
             tmpLog = self.make_logger(baseLogger, 'workerID={0}'.format(workSpec.workerID),
-                                      method_name='check_workers')
+                                      method_name='check_workers_one_by_one')
             # command
             comStr = "qstat {0}".format(workSpec.batchID)
             # check
             tmpLog.debug('check with {0}'.format(comStr))
             p = subprocess.Popen(comStr.split(),
                                  shell=False,
+                                 universal_newlines=True,
                                  stdout=subprocess.PIPE,
                                  stderr=subprocess.PIPE)
             newStatus = workSpec.status
@@ -46,16 +98,7 @@ class PBSMonitor(PluginBase):
                     if tmpMatch is not None:
                         errStr = tmpLine
                         batchStatus = tmpLine.split()[-2]
-                        if batchStatus in ['R', 'E']:
-                            newStatus = WorkSpec.ST_running
-                        elif batchStatus in ['C', 'H']:
-                            newStatus = WorkSpec.ST_finished
-                        elif batchStatus in ['CANCELLED']:
-                            newStatus = WorkSpec.ST_cancelled
-                        elif batchStatus in ['Q', 'W', 'S']:
-                            newStatus = WorkSpec.ST_submitted
-                        else:
-                            newStatus = WorkSpec.ST_failed
+                        newStatus = _map_batch_status(batchStatus)
                         tmpLog.debug('batchStatus {0} -> workerStatus {1}'.format(batchStatus,
                                                                                   newStatus))
                         break
@@ -69,3 +112,60 @@ class PBSMonitor(PluginBase):
                     newStatus = WorkSpec.ST_finished
                 retList.append((newStatus, errStr))
         return True, retList
+
+    # check workers with one qstat for all workers
+    def check_workers_in_bulk(self, workspec_list):
+        # make logger
+        tmpLog = self.make_logger(baseLogger, method_name='check_workers_in_bulk')
+        tmpLog.debug('start for {0} workers'.format(len(workspec_list)))
+        # built per call, so nothing is carried over to the next monitor cycle
+        batchStatusMap = dict()
+        unknownSet = set()
+        batchIDs = sorted(set([str(workSpec.batchID) for workSpec in workspec_list]))
+        for batchIDs_shard in core_utils.create_shards(batchIDs, self.maxJobsPerQuery):
+            comList = ['qstat'] + self.bulkQstatOptions.split() + batchIDs_shard
+            tmpLog.debug('check {0} jobs with qstat {1}'.format(len(batchIDs_shard), self.bulkQstatOptions))
+            p = subprocess.Popen(comList,
+                                 shell=False,
+                                 universal_newlines=True,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+            stdOut, stdErr = p.communicate()
+            retCode = p.returncode
+            # qstat returns non-zero when some of jobs are unknown while reporting the others
+            tmpMap = _parse_qstat_full(stdOut)
+            # unknown jobs of this shard only, so that a failure of this query is not masked by other shards
+            tmpUnknownSet = set()
+            for tmpLine in stdErr.split('\n'):
+                tmpMatch = re.search('Unknown Job Id( Error)? (\S+)', tmpLine)
+                if tmpMatch is not None:
+                    tmpUnknownSet.add(tmpMatch.group(2))
+                    tmpUnknownSet.add(tmpMatch.group(2).split('.')[0])
+            if retCode != 0 and not tmpMap and not tmpUnknownSet:
+                # check one by one if the bulk query failed
+                tmpLog.error('qstat failed with retCode={0} {1} {2}. check one by one'.format(retCode, stdOut,
+                                                                                             stdErr))
+                return self.check_workers_one_by_one(workspec_list)
+            batchStatusMap.update(tmpMap)
+            unknownSet.update(tmpUnknownSet)
+        retList = []
+        for workSpec in workspec_list:
+            batchID = str(workSpec.batchID)
+            if batchID in batchStatusMap:
+                batchStatus, errStr = batchStatusMap[batchID]
+            elif batchID.split('.')[0] in batchStatusMap:
+                batchStatus, errStr = batchStatusMap[batchID.split('.')[0]]
+            elif batchID in unknownSet or batchID.split('.')[0] in unknownSet:
+                tmpLog.info('workerID={0} batchID={1} Unknown Job Id. Mark job as finished.'.format(
+                    workSpec.workerID, batchID))
+                retList.append((WorkSpec.ST_finished, 'Unknown Job Id Error'))
+                continue
+            else:
+                retList.append((workSpec.status, ''))
+                continue
+            newStatus = _map_batch_status(batchStatus)
+            tmpLog.debug('workerID={0} batchStatus {1} -> workerStatus {2}'.format(workSpec.workerID,
+                                                                                 batchStatus, newStatus))
+            retList.append((newStatus, errStr))
+        tmpLog.debug('done')
+        return True, retList
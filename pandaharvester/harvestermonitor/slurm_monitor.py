@@ -1,10 +1,17 @@
 import re
+import time
+import getpass
+import threading
 try:
     import subprocess32 as subprocess
 except:
     import subprocess
 
+import six
+
 from pandaharvester.harvestercore import core_utils
+from pandaharvester.harvesterconfig import harvester_config
+from pandaharvester.harvestercore.core_utils import SingletonWithID
 from pandaharvester.harvestercore.work_spec import WorkSpec
 from pandaharvester.harvestercore.plugin_base import PluginBase
 
@@ -12,31 +19,157 @@ from pandaharvester.harvestercore.plugin_base import PluginBase
 baseLogger = core_utils.setup_logger('slurm_monitor')
 
 
+# run a command
+def _run_command(com_list):
+    p = subprocess.Popen(com_list,
+                         shell=False,
+                         universal_newlines=True,
+                         stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE)
+    stdOut, stdErr = p.communicate()
+    return p.returncode, stdOut, stdErr
+
+
+# map batch status to worker status
+def _map_batch_status(batch_status):
+    # remove suffix like 'CANCELLED by 1234'
+    batchStatus = batch_status.split()[0] if batch_status else ''
+    if batchStatus in ['RUNNING', 'COMPLETING', 'STOPPED', 'SUSPENDED']:
+        return WorkSpec.ST_running
+    elif batchStatus in ['COMPLETED', 'PREEMPTED', 'TIMEOUT']:
+        return WorkSpec.ST_finished
+    elif batchStatus in ['CANCELLED']:
+        return WorkSpec.ST_cancelled
+    elif batchStatus in ['CONFIGURING', 'PENDING']:
+        return WorkSpec.ST_submitted
+    return WorkSpec.ST_failed
+
+
+# parse parsable output of sacct or squeue to a dict of {batchID: (batchStatus, line)}
+def _parse_parsable_output(output):
+    retMap = dict()
+    for tmpLine in output.split('\n'):
+        items = tmpLine.strip().split('|')
+        if len(items) < 2:
+            continue
+        batchID = items[0]
+        # skip job steps like 1234.batch
+        if '.' in batchID:
+            continue
+        # the last record is the latest for requeued jobs
+        retMap[batchID] = (items[1], tmpLine.strip())
+    return retMap
+
+
+# SLURM job query for multiple jobs
+class SlurmJobQuery(six.with_metaclass(SingletonWithID, object)):
+    # class lock
+    classLock = threading.Lock()
+    # fields of sacct
+    sacctFormat = 'JobID,State,ExitCode'
+    # fields of squeue
+    squeueFormat = '%i|%T'
+
+    # constructor
+    def __init__(self, *args, **kwargs):
+        with self.classLock:
+            self.lock = threading.Lock()
+            # snapshot of active jobs and its timestamp
+            self.cache = (dict(), 0)
+            self.userName = getpass.getuser()
+
+    # get a dict of {batchID: (batchStatus, line)} for batchIDs. None if failed
+    def get_all(self, batchIDs_list, tmp_log, max_jobs_per_query=1000, cache_refresh_interval=None):
+        retMap = dict()
+        batchIDs_set = set(batchIDs_list)
+        # active jobs from a snapshot shared by threads
+        if cache_refresh_interval is not None:
+            activeJobs = self.get_active_jobs(tmp_log, cache_refresh_interval)
+            if activeJobs is not None:
+                for batchID in list(batchIDs_set):
+                    if batchID in activeJobs:
+                        retMap[batchID] = activeJobs[batchID]
+                        batchIDs_set.discard(batchID)
+        # others from accounting
+        for batchIDs_shard in core_utils.create_shards(sorted(batchIDs_set), max_jobs_per_query):
+            comList = ['sacct', '--parsable2', '--noheader', '--format={0}'.format(self.sacctFormat),
+                       '--jobs={0}'.format(','.join(batchIDs_shard))]
+            tmp_log.debug('check {0} jobs with sacct'.format(len(batchIDs_shard)))
+            retCode, stdOut, stdErr = _run_command(comList)
+            if retCode != 0:
+                tmp_log.error('sacct failed with retCode={0} {1} {2}'.format(retCode, stdOut, stdErr))
+                return None
+            retMap.update(_parse_parsable_output(stdOut))
+        return retMap
+
+    # get a dict of active jobs of the user, which is cached for cache_refresh_interval
+    def get_active_jobs(self, tmp_log, cache_refresh_interval):
+        activeJobs, lastUpdate = self.cache
+        if time.time() <= lastUpdate + cache_refresh_interval:
+            return activeJobs
+        with self.lock:
+            # updated by another thread while waiting for the lock
+            activeJobs, lastUpdate = self.cache
+            if time.time() <= lastUpdate + cache_refresh_interval:
+                tmp_log.debug('use snapshot updated by another thread')
+                return activeJobs
+            comList = ['squeue', '--noheader', '--user={0}'.format(self.userName),
+                       '--format={0}'.format(self.squeueFormat)]
+            tmp_log.debug('update snapshot with squeue')
+            timeNow = time.time()
+            retCode, stdOut, stdErr = _run_command(comList)
+            if retCode != 0:
+                tmp_log.error('squeue failed with retCode={0} {1} {2}'.format(retCode, stdOut, stdErr))
+                return None
+            activeJobs = _parse_parsable_output(stdOut)
+            self.cache = (activeJobs, timeNow)
+            tmp_log.debug('got {0} active jobs'.format(len(activeJobs)))
+            return activeJobs
+
+
 # monitor for SLURM batch system
 class SlurmMonitor(PluginBase):
     # constructor
     def __init__(self, **kwarg):
         PluginBase.__init__(self, **kwarg)
+        # query all workers with one sacct instead of one sacct per worker
+        try:
+            self.useBulkQuery
+        except AttributeError:
+            self.useBulkQuery = False
+        try:
+            self.maxJobsPerQuery
+        except AttributeError:
+            self.maxJobsPerQuery = 1000
+        try:
+            self.cacheEnable = harvester_config.monitor.pluginCacheEnable
+        except AttributeError:
+            self.cacheEnable = False
+        try:
+            self.cacheRefreshInterval = harvester_config.monitor.pluginCacheRefreshInterval
+        except AttributeError:
+            self.cacheRefreshInterval = harvester_config.monitor.checkInterval
 
     # check workers
     def check_workers(self, workspec_list):
+        if self.useBulkQuery:
+            return self.check_workers_in_bulk(workspec_list)
+        return self.check_workers_one_by_one(workspec_list)
+
+    # check workers with one sacct per worker
+    def check_workers_one_by_one(self, workspec_list):
         retList = []
         for workSpec in workspec_list:
             # make logger
             tmpLog = self.make_logger(baseLogger, 'workerID={0}'.format(workSpec.workerID),
-                                      method_name='check_workers')
+                                      method_name='check_workers_one_by_one')
             # command
             comStr = "sacct --jobs={0}".format(workSpec.batchID)
             # check
             tmpLog.debug('check with {0}'.format(comStr))
-            p = subprocess.Popen(comStr.split(),
-                                 shell=False,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
+            retCode, stdOut, stdErr = _run_command(comStr.split())
             newStatus = workSpec.status
             # check return code
-            stdOut, stdErr = p.communicate()
-            retCode = p.returncode
             tmpLog.debug('retCode={0}'.format(retCode))
             errStr = ''
             if retCode == 0:
@@ -46,16 +179,7 @@ class SlurmMonitor(PluginBase):
                     if tmpMatch is not None:
                         errStr = tmpLine
                         batchStatus = tmpLine.split()[5]
-                        if batchStatus in ['RUNNING', 'COMPLETING', 'STOPPED', 'SUSPENDED']:
-                            newStatus = WorkSpec.ST_running
-                        elif batchStatus in ['COMPLETED', 'PREEMPTED', 'TIMEOUT']:
-                            newStatus = WorkSpec.ST_finished
-                        elif batchStatus in ['CANCELLED']:
-                            newStatus = WorkSpec.ST_cancelled
-                        elif batchStatus in ['CONFIGURING', 'PENDING']:
-                            newStatus = WorkSpec.ST_submitted
-                        else:
-                            newStatus = WorkSpec.ST_failed
+                        newStatus = _map_batch_status(batchStatus)
                         tmpLog.debug('batchStatus {0} -> workerStatus {1}'.format(batchStatus,
                                                                                   newStatus))
                         break
@@ -68,3 +192,30 @@ class SlurmMonitor(PluginBase):
                     newStatus = WorkSpec.ST_failed
                 retList.append((newStatus, errStr))
         return True, retList
+
+    # check workers with one query for all workers
+    def check_workers_in_bulk(self, workspec_list):
+        # make logger
+        tmpLog = self.make_logger(baseLogger, method_name='check_workers_in_bulk')
+        tmpLog.debug('start for {0} workers'.format(len(workspec_list)))
+        jobQuery = SlurmJobQuery(id='slurm')
+        batchStatusMap = jobQuery.get_all([str(workSpec.batchID) for workSpec in workspec_list], tmpLog,
+                                          max_jobs_per_query=self.maxJobsPerQuery,
+                                          cache_refresh_interval=self.cacheRefreshInterval if self.cacheEnable else None)
+        if batchStatusMap is None:
+            # check one by one to handle invalid job IDs
+            tmpLog.debug('failed bulk query, check one by one')
+            return self.check_workers_one_by_one(workspec_list)
+        retList = []
+        for workSpec in workspec_list:
+            try:
+                batchStatus, errStr = batchStatusMap[str(workSpec.batchID)]
+            except KeyError:
+                retList.append((workSpec.status, ''))
+                continue
+            newStatus = _map_batch_status(batchStatus)
+            tmpLog.debug('workerID={0} batchStatus {1} -> workerStatus {2}'.format(workSpec.workerID,
+                                                                                 batchStatus, newStatus))
+            retList.append((newStatus, errStr))
+        tmpLog.debug('done')
+        return True, retList
@@ -109,6 +109,7 @@ def get(arguments):
 def fifo_benchmark(arguments):
     n_object = arguments.n_object
     n_thread = arguments.n_thread
+    n_batch = arguments.n_batch
     mq = harvesterFifos.BenchmarkFIFO()
     sw = core_utils.get_stopwatch()
     sum_dict = {
@@ -117,13 +118,25 @@ def fifo_benchmark(arguments):
                 'get_time' : 0.0,
                 'get_protective_time' : 0.0,
                 'clear_time' : 0.0,
+                'put_many_n' : 0,
+                'put_many_time' : 0.0,
+                'get_many_time' : 0.0,
+                'get_many_protective_time' : 0.0,
                 }
-    def _put_object(i_index):
+    def _make_object(i_index):
         workspec = WorkSpec()
         workspec.workerID = i_index
         data = {'random': [(i_index**2) % 2**16, random.random()]}
         workspec.workAttributes = data
-        mq.put(workspec)
+        return workspec
+    def _put_object(i_index):
+        mq.put(_make_object(i_index))
+    def _put_objects(i_index):
+        mq.put_many([(_make_object(i_index*n_batch + j), None) for j in range(n_batch)])
+    def _get_objects(i_index):
+        return mq.get_many(n_batch, timeout=3, protective=False)
+    def _get_objects_protective(i_index):
+        return mq.get_many(n_batch, timeout=3, protective=True)
     def _get_object(i_index):
         return mq.get(timeout=3, protective=False)
     def _get_object_protective(i_index):
@@ -147,6 +160,25 @@ def fifo_benchmark(arguments):
         sum_dict['get_protective_time'] = sw.get_elapsed_time_in_sec(True)
         print('Get {0} objects protective dequeue by {1} threads'.format(n_object, n_thread) + sw.get_elapsed_time())
         print('Now fifo size is {0}'.format(mq.size()))
+    def put_many_test():
+        sw.reset()
+        multithread_executer(_put_objects, n_object//n_batch, n_thread)
+        sum_dict['put_many_time'] += sw.get_elapsed_time_in_sec(True)
+        sum_dict['put_many_n'] += 1
+        print('Put {0} objects in batches of {1} by {2} threads'.format(n_object, n_batch, n_thread) + sw.get_elapsed_time())
+        print('Now fifo size is {0}'.format(mq.size()))
+    def get_many_test():
+        sw.reset()
+        multithread_executer(_get_objects, n_object//n_batch, n_thread)
+        sum_dict['get_many_time'] = sw.get_elapsed_time_in_sec(True)
+        print('Get {0} objects in batches of {1} by {2} threads'.format(n_object, n_batch, n_thread) + sw.get_elapsed_time())
+        print('Now fifo size is {0}'.format(mq.size()))
+    def get_many_protective_test():
+        sw.reset()
+        multithread_executer(_get_objects_protective, n_object//n_batch, n_thread)
+        sum_dict['get_many_protective_time'] = sw.get_elapsed_time_in_sec(True)
+        print('Get {0} objects in batches of {1} protective dequeue by {2} threads'.format(n_object, n_batch, n_thread) + sw.get_elapsed_time())
+        print('Now fifo size is {0}'.format(mq.size()))
     def clear_test():
         sw.reset()
         mq.fifo.clear()
@@ -163,6 +195,14 @@ def fifo_benchmark(arguments):
     get_protective_test()
     put_test()
     clear_test()
+    if n_batch > 0:
+        # batch operations with n_object rounded down to a multiple of n_batch
+        n_object = (n_object//n_batch) * n_batch
+        put_many_test()
+        get_many_test()
+        put_many_test()
+        get_many_protective_test()
+        clear_test()
     print('Finished fifo benchmark')
     # summary
     print('Summary:')
@@ -172,6 +212,11 @@ def fifo_benchmark(arguments):
     print('Get            : {0:.3f} ms / obj'.format(1000. * sum_dict['get_time']/n_object))
     print('Get protective : {0:.3f} ms / obj'.format(1000. * sum_dict['get_protective_time']/n_object))
     print('Clear          : {0:.3f} ms / obj'.format(1000. * sum_dict['clear_time']/n_object))
+    if n_batch > 0 and n_object > 0:
+        print('Batch operations in batches of {0} objects'.format(n_batch))
+        print('Put many            : {0:.3f} ms / obj'.format(1000. * sum_dict['put_many_time']/(sum_dict['put_many_n']*n_object)))
+        print('Get many            : {0:.3f} ms / obj'.format(1000. * sum_dict['get_many_time']/n_object))
+        print('Get many protective : {0:.3f} ms / obj'.format(1000. * sum_dict['get_many_protective_time']/n_object))
 
 def fifo_repopulate(arguments):
     if 'ALL' in arguments.name_list:
@@ -274,6 +319,7 @@ def main():
     fifo_benchmark_parser.set_defaults(which='fifo_benchmark')
     fifo_benchmark_parser.add_argument('-n', type=int, dest='n_object', action='store', default=500, metavar='<N>', help='Benchmark with N objects')
     fifo_benchmark_parser.add_argument('-t', type=int, dest='n_thread', action='store', default=1, metavar='<N>', help='Benchmark with N threads')
+    fifo_benchmark_parser.add_argument('-b', type=int, dest='n_batch', action='store', default=0, metavar='<N>', help='Also benchmark batch put/get with N objects per batch')
     # fifo repopuate command
     fifo_repopulate_parser = fifo_subparsers.add_parser('repopulate', help='Repopulate agent fifo')
     fifo_repopulate_parser.set_defaults(which='fifo_repopulate')
@@ -50,8 +50,13 @@ class GlobusRucioStager(GlobusBulkStager):
             tmpLog.debug('Warning srcRSE not defined in stager portion of queue config file')
         # get destination endpoint
         nucleus = jobspec.jobParams['nucleus']
-        agis = self.dbInterface.get_cache('panda_queues.json').data
-        dstRSE = [agis[x]["astorages"]['pr'][0] for x in agis if agis[x]["atlas_site"] == nucleus][0]
+        rseIndex = self.dbInterface.get_cache_index('panda_queues.json', 'nucleus_to_rse')
+        if rseIndex is not None:
+            dstRSE = rseIndex.get(nucleus)
+        else:
+            # scan the whole cache when the index is unavailable
+            agis = self.dbInterface.get_cache('panda_queues.json').data
+            dstRSE = [agis[x]["astorages"]['pr'][0] for x in agis if agis[x]["atlas_site"] == nucleus][0]
         # if debugging log source and destination RSEs 
         tmpLog.debug('srcRSE - {0} dstRSE - {1}'.format(srcRSE,dstRSE))
         # test that srcRSE and dstRSE are defined
@@ -161,8 +166,13 @@ class GlobusRucioStager(GlobusBulkStager):
                     fileList.append(tmpFile)
                     # get source RSE
                     if srcRSE is None and fileSpec.objstoreID is not None:
-                        ddm = self.dbInterface.get_cache('agis_ddmendpoints.json').data
-                        srcRSE = [x for x in ddm if ddm[x]["id"] == fileSpec.objstoreID][0]
+                        ddmIndex = self.dbInterface.get_cache_index('agis_ddmendpoints.json', 'objstore_id_to_rse')
+                        if ddmIndex is not None:
+                            srcRSE = ddmIndex.get(fileSpec.objstoreID)
+                        else:
+                            # scan the whole cache when the index is unavailable
+                            ddm = self.dbInterface.get_cache('agis_ddmendpoints.json').data
+                            srcRSE = [x for x in ddm if ddm[x]["id"] == fileSpec.objstoreID][0]
                 try:
                     # register dataset
                     tmpLog.debug('register {0}:{1} rse = {2} meta=(hidden: True) lifetime = {3}'
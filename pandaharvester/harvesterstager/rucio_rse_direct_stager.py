@@ -136,8 +136,13 @@ class RucioRseDirectStager(YodaRseDirectStager):
         datasetScope = 'transient'
         # get destination endpoint
         nucleus = jobspec.jobParams['nucleus']
-        agis = self.dbInterface.get_cache('panda_queues.json').data
-        dstRSE = [agis[x]["astorages"]['pr'][0] for x in agis if agis[x]["atlas_site"] == nucleus][0]
+        rseIndex = self.dbInterface.get_cache_index('panda_queues.json', 'nucleus_to_rse')
+        if rseIndex is not None:
+            dstRSE = rseIndex.get(nucleus)
+        else:
+            # scan the whole cache when the index is unavailable
+            agis = self.dbInterface.get_cache('panda_queues.json').data
+            dstRSE = [agis[x]["astorages"]['pr'][0] for x in agis if agis[x]["atlas_site"] == nucleus][0]
         
         # get the list of output files to transfer
         fileSpecs = jobspec.get_output_file_specs(skip_done=True)
@@ -154,8 +159,13 @@ class RucioRseDirectStager(YodaRseDirectStager):
             lfns.append(fileSpec.lfn)
             # get source RSE
             if srcRSE is None and fileSpec.objstoreID is not None:
-                ddm = self.dbInterface.get_cache('agis_ddmendpoints.json').data
-                srcRSE = [x for x in ddm if ddm[x]["id"] == fileSpec.objstoreID][0]
+                ddmIndex = self.dbInterface.get_cache_index('agis_ddmendpoints.json', 'objstore_id_to_rse')
+                if ddmIndex is not None:
+                    srcRSE = ddmIndex.get(fileSpec.objstoreID)
+                else:
+                    # scan the whole cache when the index is unavailable
+                    ddm = self.dbInterface.get_cache('agis_ddmendpoints.json').data
+                    srcRSE = [x for x in ddm if ddm[x]["id"] == fileSpec.objstoreID][0]
 
         # test that srcRSE and dstRSE are defined
         errStr = '' 
@@ -104,8 +104,13 @@ class YodaRucioRseDirectStager(BaseStager):
                 self.Yodajob = True
         # get destination endpoint
         nucleus = jobspec.jobParams['nucleus']
-        agis = self.dbInterface.get_cache('panda_queues.json').data
-        dstRSE = [agis[x]["astorages"]['pr'][0] for x in agis if agis[x]["atlas_site"] == nucleus][0]
+        rseIndex = self.dbInterface.get_cache_index('panda_queues.json', 'nucleus_to_rse')
+        if rseIndex is not None:
+            dstRSE = rseIndex.get(nucleus)
+        else:
+            # scan the whole cache when the index is unavailable
+            agis = self.dbInterface.get_cache('panda_queues.json').data
+            dstRSE = [agis[x]["astorages"]['pr'][0] for x in agis if agis[x]["atlas_site"] == nucleus][0]
         # set the location of the files in fileSpec.objstoreID
         # see file /cvmfs/atlas.cern.ch/repo/sw/local/etc/agis_ddmendpoints.json 
         ddm = self.dbInterface.get_cache('agis_ddmendpoints.json').data
@@ -224,8 +229,13 @@ class YodaRucioRseDirectStager(BaseStager):
                 self.Yodajob = True
         # get destination endpoint
         nucleus = jobspec.jobParams['nucleus']
-        agis = self.dbInterface.get_cache('panda_queues.json').data
-        dstRSE = [agis[x]["astorages"]['pr'][0] for x in agis if agis[x]["atlas_site"] == nucleus][0]
+        rseIndex = self.dbInterface.get_cache_index('panda_queues.json', 'nucleus_to_rse')
+        if rseIndex is not None:
+            dstRSE = rseIndex.get(nucleus)
+        else:
+            # scan the whole cache when the index is unavailable
+            agis = self.dbInterface.get_cache('panda_queues.json').data
+            dstRSE = [agis[x]["astorages"]['pr'][0] for x in agis if agis[x]["atlas_site"] == nucleus][0]
         # see file /cvmfs/atlas.cern.ch/repo/sw/local/etc/agis_ddmendpoints.json 
         ddm = self.dbInterface.get_cache('agis_ddmendpoints.json').data
         self.objstoreID = ddm[dstRSE]['id']
@@ -308,8 +318,13 @@ class YodaRucioRseDirectStager(BaseStager):
                 lfns.append(fileSpec.lfn)
                 # get source RSE
                 if srcRSE is None and fileSpec.objstoreID is not None:
-                    ddm = self.dbInterface.get_cache('agis_ddmendpoints.json').data
-                    srcRSE = [x for x in ddm if ddm[x]["id"] == fileSpec.objstoreID][0]
+                    ddmIndex = self.dbInterface.get_cache_index('agis_ddmendpoints.json', 'objstore_id_to_rse')
+                    if ddmIndex is not None:
+                        srcRSE = ddmIndex.get(fileSpec.objstoreID)
+                    else:
+                        # scan the whole cache when the index is unavailable
+                        ddm = self.dbInterface.get_cache('agis_ddmendpoints.json').data
+                        srcRSE = [x for x in ddm if ddm[x]["id"] == fileSpec.objstoreID][0]
                     tmpLog.debug('srcRSE - {0} defined from agis_ddmendpoints.json'.format(srcRSE))
             else :
                 if os.path.exists(srcURL) :
@@ -337,8 +352,13 @@ class YodaRucioRseDirectStager(BaseStager):
                         lfns.append(fileSpec.lfn)
                         # get source RSE if not already set
                         if srcRSE is None and fileSpec.objstoreID is not None:
-                            ddm = self.dbInterface.get_cache('agis_ddmendpoints.json').data
-                            srcRSE = [x for x in ddm if ddm[x]["id"] == fileSpec.objstoreID][0]
+                            ddmIndex = self.dbInterface.get_cache_index('agis_ddmendpoints.json', 'objstore_id_to_rse')
+                            if ddmIndex is not None:
+                                srcRSE = ddmIndex.get(fileSpec.objstoreID)
+                            else:
+                                # scan the whole cache when the index is unavailable
+                                ddm = self.dbInterface.get_cache('agis_ddmendpoints.json').data
+                                srcRSE = [x for x in ddm if ddm[x]["id"] == fileSpec.objstoreID][0]
                             tmpLog.debug('srcRSE - {0} defined from agis_ddmendpoints.json'.format(srcRSE))
                     except (IOError, os.error) as why:
                         errors.append((srcURL, dstURL, str(why)))
@@ -8,6 +8,7 @@ try:
 except Exception:
     import subprocess
 import random
+import string
 
 from concurrent.futures import ThreadPoolExecutor
 import re
@@ -19,6 +20,11 @@ from pandaharvester.harvestercore import core_utils
 from pandaharvester.harvestercore.plugin_base import PluginBase
 from pandaharvester.harvestermisc.info_utils import PandaQueuesDict
 
+try:
+    import htcondor
+except ImportError:
+    htcondor = None
+
 
 # logger
 baseLogger = core_utils.setup_logger('htcondor_submitter')
@@ -163,12 +169,121 @@ def _get_ce_stats_weighting_display(ce_list, worker_ce_all_tuple, ce_weighting):
     return stats_weighting_display_str
 
 
+# SDF template parsed into literal texts and placeholders
+class SdfTemplate(object):
+    # formatter to fill placeholders in the same way as str.format
+    formatter = string.Formatter()
+    # max number of partially rendered templates to keep
+    maxPartials = 64
+
+    # constructor
+    def __init__(self, template_str=None, parsed=None):
+        if parsed is None:
+            parsed = list(self.formatter.parse(template_str))
+        # list of (literal_text, field_name, format_spec, conversion)
+        self.parsed = parsed
+        self.fieldNames = set([_field for _, _field, _, _ in self.parsed if _field is not None])
+        self.partials = dict()
+        self.lock = threading.Lock()
+
+    # render a field
+    def _render_field(self, field_name, format_spec, conversion, kwarg):
+        obj, _ = self.formatter.get_field(field_name, (), kwarg)
+        obj = self.formatter.convert_field(obj, conversion)
+        if format_spec:
+            format_spec = self.formatter.vformat(format_spec, (), kwarg)
+        return self.formatter.format_field(obj, format_spec)
+
+    # get a template with the given fields filled in, which is cached with the values
+    def partial(self, **kwarg):
+        key = tuple(sorted([(_k, _v) for _k, _v in kwarg.items() if _k in self.fieldNames]))
+        try:
+            return self.partials[key]
+        except KeyError:
+            pass
+        parsed = []
+        literal = ''
+        for literal_text, field_name, format_spec, conversion in self.parsed:
+            literal += literal_text
+            if field_name is None:
+                continue
+            if field_name.split('.')[0].split('[')[0] in kwarg:
+                literal += self._render_field(field_name, format_spec, conversion, kwarg)
+            else:
+                parsed.append((literal, field_name, format_spec, conversion))
+                literal = ''
+        if literal:
+            parsed.append((literal, None, None, None))
+        tmpTemplate = SdfTemplate(parsed=parsed)
+        with self.lock:
+            if len(self.partials) >= self.maxPartials:
+                self.partials.clear()
+            self.partials[key] = tmpTemplate
+        return tmpTemplate
+
+    # render the template
+    def render(self, **kwarg):
+        ret = []
+        for literal_text, field_name, format_spec, conversion in self.parsed:
+            ret.append(literal_text)
+            if field_name is not None:
+                ret.append(self._render_field(field_name, format_spec, conversion, kwarg))
+        return ''.join(ret)
+
+
+# cache of SDF templates keyed by path and modification time
+class SdfTemplateCache(object):
+    # constructor
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cache = dict()
+
+    # get (SdfTemplate, batch_log_value, stdout_value, stderr_value) of a template file
+    def get(self, template_file):
+        mtime = os.path.getmtime(template_file)
+        try:
+            cached_mtime, ret = self.cache[template_file]
+            if cached_mtime == mtime:
+                return ret
+        except KeyError:
+            pass
+        with open(template_file) as tmpFile:
+            sdf_template_raw = tmpFile.read()
+        # get batch_log, stdout, stderr filename, and remove commented lines
+        batch_log_value, stdout_value, stderr_value = None, None, None
+        sdf_template_str_list = []
+        for _line in sdf_template_raw.split('\n'):
+            if _line.startswith('#'):
+                continue
+            sdf_template_str_list.append(_line)
+            _match_batch_log = re.match('log = (.+)', _line)
+            _match_stdout = re.match('output = (.+)', _line)
+            _match_stderr = re.match('error = (.+)', _line)
+            if _match_batch_log:
+                batch_log_value = _match_batch_log.group(1)
+                continue
+            if _match_stdout:
+                stdout_value = _match_stdout.group(1)
+                continue
+            if _match_stderr:
+                stderr_value = _match_stderr.group(1)
+                continue
+        ret = (SdfTemplate('\n'.join(sdf_template_str_list)), batch_log_value, stdout_value, stderr_value)
+        with self.lock:
+            self.cache[template_file] = (mtime, ret)
+        return ret
+
+
+# SDF template cache shared by submitters
+sdf_template_cache = SdfTemplateCache()
+
+
 # Replace condor Marco from SDF file, return string
 def _condor_macro_replace(string, **kwarg):
     new_string = string
     macro_map = {
                 '\$\(Cluster\)': str(kwarg['ClusterId']),
-                '\$\(Process\)': '0',
+                '\$\(Process\)': str(kwarg.get('ProcId', 0)),
                 }
     for k, v in macro_map.items():
         new_string = re.sub(k, v, new_string)
@@ -201,6 +316,42 @@ def _get_prod_source_label(pilot_type):
     return prod_source_label
 
 
+# set attributes of a worker submitted to cluster_id; batchID is cluster_id.proc_id if proc_id is not None
+def _set_submitted_attributes(workspec, data, cluster_id, proc_id, tmpLog):
+    ce_info_dict = data['ce_info_dict']
+    batch_log_dict = data['batch_log_dict']
+    condor_schedd = data['condor_schedd']
+    condor_pool = data['condor_pool']
+    if proc_id is None:
+        workspec.batchID = cluster_id
+    else:
+        workspec.batchID = '{0}.{1}'.format(cluster_id, proc_id)
+    # set submissionHost
+    if not condor_schedd and not condor_pool:
+        workspec.submissionHost = 'LOCAL'
+    else:
+        workspec.submissionHost = '{0},{1}'.format(condor_schedd, condor_pool)
+    tmpLog.debug('submissionHost={0} batchID={1}'.format(workspec.submissionHost, workspec.batchID))
+    # set computingElement
+    workspec.computingElement = ce_info_dict.get('ce_endpoint', '')
+    # set log
+    macro_kwarg = {'ClusterId': cluster_id, 'ProcId': proc_id if proc_id is not None else 0}
+    batch_log = _condor_macro_replace(batch_log_dict['batch_log'], **macro_kwarg)
+    batch_stdout = _condor_macro_replace(batch_log_dict['batch_stdout'], **macro_kwarg)
+    batch_stderr = _condor_macro_replace(batch_log_dict['batch_stderr'], **macro_kwarg)
+    workspec.set_log_file('batch_log', batch_log)
+    workspec.set_log_file('stdout', batch_stdout)
+    workspec.set_log_file('stderr', batch_stderr)
+    if not workspec.get_jobspec_list():
+        tmpLog.debug('No jobspec associated in the worker of workerID={0}'.format(workspec.workerID))
+    else:
+        for jobSpec in workspec.get_jobspec_list():
+            # using batchLog and stdOut URL as pilotID and pilotLog
+            jobSpec.set_one_attribute('pilotID', workspec.workAttributes['stdOut'])
+            jobSpec.set_one_attribute('pilotLog', workspec.workAttributes['batchLog'])
+    tmpLog.debug('Done set_log_file after submission')
+
+
 # submit a worker
 def submit_a_worker(data):
     workspec = data['workspec']
@@ -263,31 +414,7 @@ def submit_a_worker(data):
             if job_id_match:
                 break
         if job_id_match is not None:
-            workspec.batchID = job_id_match.group(2)
-            # set submissionHost
-            if not condor_schedd and not condor_pool:
-                workspec.submissionHost = 'LOCAL'
-            else:
-                workspec.submissionHost = '{0},{1}'.format(condor_schedd, condor_pool)
-
-            tmpLog.debug('submissionHost={0} batchID={1}'.format(workspec.submissionHost, workspec.batchID))
-            # set computingElement
-            workspec.computingElement = ce_info_dict.get('ce_endpoint', '')
-            # set log
-            batch_log = _condor_macro_replace(batch_log_dict['batch_log'], ClusterId=workspec.batchID)
-            batch_stdout = _condor_macro_replace(batch_log_dict['batch_stdout'], ClusterId=workspec.batchID)
-            batch_stderr = _condor_macro_replace(batch_log_dict['batch_stderr'], ClusterId=workspec.batchID)
-            workspec.set_log_file('batch_log', batch_log)
-            workspec.set_log_file('stdout', batch_stdout)
-            workspec.set_log_file('stderr', batch_stderr)
-            if not workspec.get_jobspec_list():
-                tmpLog.debug('No jobspec associated in the worker of workerID={0}'.format(workspec.workerID))
-            else:
-                for jobSpec in workspec.get_jobspec_list():
-                    # using batchLog and stdOut URL as pilotID and pilotLog
-                    jobSpec.set_one_attribute('pilotID', workspec.workAttributes['stdOut'])
-                    jobSpec.set_one_attribute('pilotLog', workspec.workAttributes['batchLog'])
-            tmpLog.debug('Done set_log_file after submission')
+            _set_submitted_attributes(workspec, data, job_id_match.group(2), None, tmpLog)
             tmpRetVal = (True, '')
 
         else:
@@ -302,8 +429,218 @@ def submit_a_worker(data):
     return tmpRetVal, workspec.get_changed_attributes()
 
 
+# parse submit description into a list of (command, value) without queue statements
+def _parse_sdf(sdf_content):
+    sdf_items = []
+    continued_line = ''
+    for _line in sdf_content.split('\n'):
+        # join continuation lines
+        if _line.endswith('\\'):
+            continued_line += _line[:-1]
+            continue
+        _line = (continued_line + _line).strip()
+        continued_line = ''
+        if not _line or _line.startswith('#'):
+            continue
+        if re.match('queue(\s|$)', _line, re.IGNORECASE):
+            continue
+        _match = re.match('([^=]+?)\s*=\s*(.*)$', _line)
+        if _match:
+            sdf_items.append((_match.group(1), _match.group(2)))
+        else:
+            sdf_items.append((_line, None))
+    return sdf_items
+
+
+# split submit descriptions of workers into common commands and per-worker commands.
+# per-worker commands are given for every worker, empty if missing, since commands carry over to following procs
+def _split_sdf_items(sdf_items_list):
+    value_maps = [dict(sdf_items) for sdf_items in sdf_items_list]
+    # keys of all workers in order of appearance
+    all_keys = []
+    key_set = set()
+    for sdf_items in sdf_items_list:
+        for key, value in sdf_items:
+            if key not in key_set:
+                key_set.add(key)
+                all_keys.append(key)
+    common_items = []
+    per_worker_keys = []
+    for key in all_keys:
+        value = value_maps[0].get(key, None)
+        if all([key in value_map and value_map[key] == value for value_map in value_maps]):
+            common_items.append((key, value))
+        else:
+            per_worker_keys.append(key)
+    per_worker_items_list = [[(key, value_map.get(key, '')) for key in per_worker_keys]
+                             for value_map in value_maps]
+    return common_items, per_worker_items_list
+
+
+# make submit description of a cluster with a queue statement per worker
+def _make_cluster_sdf(common_items, per_worker_items_list):
+    lines = []
+    for key, value in common_items:
+        lines.append(key if value is None else '{0} = {1}'.format(key, value))
+    for per_worker_items in per_worker_items_list:
+        for key, value in per_worker_items:
+            lines.append(key if value is None else '{0} = {1}'.format(key, value))
+        lines.append('queue 1')
+    return '\n'.join(lines) + '\n'
+
+
+# submit a cluster with python bindings and return the cluster ID and the number of procs
+def _submit_a_cluster_with_python(common_items, per_worker_items_list, condor_schedd, condor_pool):
+    # per-worker commands refer to item data
+    submit_dict = dict(common_items)
+    item_key_map = dict()
+    for per_worker_items in per_worker_items_list:
+        for key, value in per_worker_items:
+            if key not in item_key_map:
+                item_key_map[key] = 'harvesterItem{0}'.format(len(item_key_map))
+                submit_dict[key] = '$({0})'.format(item_key_map[key])
+    item_data = [dict([(item_key_map[key], value) for key, value in per_worker_items])
+                 for per_worker_items in per_worker_items_list]
+    if condor_pool:
+        collector = htcondor.Collector(condor_pool)
+    else:
+        collector = htcondor.Collector()
+    if condor_schedd:
+        schedd_ad = collector.locate(htcondor.DaemonTypes.Schedd, condor_schedd)
+    else:
+        schedd_ad = collector.locate(htcondor.DaemonTypes.Schedd)
+    schedd = htcondor.Schedd(schedd_ad)
+    submit_obj = htcondor.Submit(submit_dict)
+    with schedd.transaction() as txn:
+        submit_result = submit_obj.queue_with_itemdata(txn, 1, iter(item_data))
+    return str(submit_result.cluster()), submit_result.num_procs()
+
+
+# submit workers sharing CE and template as procs of a cluster; fall back to submit_a_worker if failed
+def submit_a_cluster(data_list, use_python_api=False):
+    # make logger
+    tmpLog = core_utils.make_logger(baseLogger, 'workerIDs={0}-{1}'.format(data_list[0]['workspec'].workerID,
+                                                                       data_list[-1]['workspec'].workerID),
+                                    method_name='submit_a_cluster')
+    nWorkers = len(data_list)
+    tmpLog.debug('start nWorkers={0}'.format(nWorkers))
+    # make batch scripts
+    sdf_items_list = []
+    sdf_dir = None
+    try:
+        for data in data_list:
+            data['workspec'].reset_changed_list()
+            sdf_file, sdf_content = make_batch_script_with_content(**data)
+            sdf_items_list.append(_parse_sdf(sdf_content))
+            if sdf_dir is None:
+                sdf_dir = os.path.dirname(sdf_file)
+    except Exception:
+        core_utils.dump_error_message(tmpLog)
+        tmpLog.debug('fall back to submission per worker')
+        return [submit_a_worker(data) for data in data_list]
+    common_items, per_worker_items_list = _split_sdf_items(sdf_items_list)
+    condor_schedd = data_list[0]['condor_schedd']
+    condor_pool = data_list[0]['condor_pool']
+    use_spool = data_list[0]['use_spool']
+    cluster_id = None
+    n_procs = 0
+    # submit with python bindings, not for remote spooling which needs to transfer input files
+    if use_python_api and htcondor is not None and not (use_spool and condor_schedd):
+        try:
+            cluster_id, n_procs = _submit_a_cluster_with_python(common_items, per_worker_items_list,
+                                                                condor_schedd, condor_pool)
+        except Exception:
+            core_utils.dump_error_message(tmpLog)
+    # submit with command
+    if cluster_id is None:
+        tmpFile = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='_cluster_submit.sdf', dir=sdf_dir)
+        tmpFile.write(_make_cluster_sdf(common_items, per_worker_items_list))
+        tmpFile.close()
+        name_opt = '-name {0}'.format(condor_schedd) if condor_schedd else ''
+        pool_opt = '-pool {0}'.format(condor_pool) if condor_pool else ''
+        spool_opt = '-remote -spool' if use_spool and condor_schedd else ''
+        comStr = 'condor_submit {spool_opt} {name_opt} {pool_opt} {sdf_file}'.format(sdf_file=tmpFile.name,
+                                                                                    name_opt=name_opt,
+                                                                                    pool_opt=pool_opt,
+                                                                                    spool_opt=spool_opt)
+        tmpLog.debug('submit with command: {0}'.format(comStr))
+        try:
+            p = subprocess.Popen(comStr.split(),
+                                 shell=False,
+                                 universal_newlines=True,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+            stdOut, stdErr = p.communicate()
+            retCode = p.returncode
+        except Exception:
+            stdOut = ''
+            stdErr = core_utils.dump_error_message(tmpLog, no_message=True)
+            retCode = 1
+        tmpLog.debug('retCode={0}'.format(retCode))
+        if retCode == 0:
+            for tmp_line_str in stdOut.split('\n'):
+                job_id_match = re.search('^(\d+) job[(]s[)] submitted to cluster (\d+)\.$', tmp_line_str)
+                if job_id_match:
+                    n_procs = int(job_id_match.group(1))
+                    cluster_id = job_id_match.group(2)
+                    break
+        else:
+            tmpLog.error('{0} \n {1}'.format(stdOut, stdErr))
+    # set attributes of submitted workers; procs are numbered in the order of queue statements
+    retList = []
+    for proc_id, data in enumerate(data_list):
+        workspec = data['workspec']
+        if cluster_id is not None and proc_id < n_procs:
+            tmpWorkerLog = core_utils.make_logger(baseLogger, 'workerID={0}'.format(workspec.workerID),
+                                                  method_name='submit_a_cluster')
+            _set_submitted_attributes(workspec, data, cluster_id, proc_id, tmpWorkerLog)
+            retList.append(((True, ''), workspec.get_changed_attributes()))
+        else:
+            # fall back for workers not submitted in the cluster
+            retList.append(submit_a_worker(data))
+    tmpLog.debug('done cluster={0} nProcs={1} nFallback={2}'.format(cluster_id, n_procs,
+                                                                   nWorkers - min(n_procs, nWorkers)))
+    return retList
+
+
+# submit workers in clusters grouped by schedd, CE, and template, and return results in the order of data_list
+def submit_workers_in_clusters(data_list, max_workers_per_cluster, n_processes, use_python_api=False):
+    retList = [None] * len(data_list)
+    group_map = dict()
+    single_index_list = []
+    for i_data, data in enumerate(data_list):
+        try:
+            if not data['to_submit']:
+                raise KeyError
+            group_key = (data['condor_schedd'], data['condor_pool'], data['use_spool'], data['template'],
+                         data['ce_info_dict'].get('ce_endpoint'), data['executable_file'], data['x509_user_proxy'])
+        except (KeyError, TypeError):
+            # let submit_a_worker handle incomplete data
+            single_index_list.append(i_data)
+            continue
+        group_map.setdefault(group_key, []).append(i_data)
+    index_chunk_list = []
+    for index_list in group_map.values():
+        index_chunk_list += list(core_utils.create_shards(index_list, max_workers_per_cluster))
+    def _submit_chunk(index_chunk):
+        return index_chunk, submit_a_cluster([data_list[i_data] for i_data in index_chunk], use_python_api)
+    with ThreadPoolExecutor(n_processes) as thread_pool:
+        for index_chunk, tmpRetList in thread_pool.map(_submit_chunk, index_chunk_list):
+            for i_data, tmpRetVal in zip(index_chunk, tmpRetList):
+                retList[i_data] = tmpRetVal
+    for i_data in single_index_list:
+        retList[i_data] = submit_a_worker(data_list[i_data])
+    return retList
+
+
 # make batch script
-def make_batch_script(workspec, template, n_core_per_node, log_dir, panda_queue_name, executable_file,
+def make_batch_script(**kwarg):
+    sdf_file, sdf_content = make_batch_script_with_content(**kwarg)
+    return sdf_file
+
+
+# make batch script and return its filename and content
+def make_batch_script_with_content(workspec, template, n_core_per_node, log_dir, panda_queue_name, executable_file,
                         x509_user_proxy, log_subdir=None, ce_info_dict=dict(), batch_log_dict=dict(),
                         special_par='', harvester_queue_config=None, is_unified_queue=False, **kwarg):
     # make logger
@@ -349,11 +686,29 @@ def make_batch_script(workspec, template, n_core_per_node, log_dir, panda_queue_
     if prod_source_label is None:
         prod_source_label = harvester_queue_config.get_source_label()
 
-    # fill in template
-    tmpFile.write(template.format(
-        sdfPath=tmpFile.name,
+    # fields common to workers of the queue and CE
+    common_fields = dict(
         executableFile=executable_file,
         nCorePerNode=n_core_per_node,
+        logDir=log_dir,
+        logSubdir=log_subdir,
+        harvesterID=harvester_config.master.harvester_id,
+        pandaQueueName=panda_queue_name,
+        x509UserProxy=x509_user_proxy,
+        ceEndpoint=ce_info_dict.get('ce_endpoint', ''),
+        ceHostname=ce_info_dict.get('ce_hostname', ''),
+        ceFlavour=ce_info_dict.get('ce_flavour', ''),
+        ceJobmanager=ce_info_dict.get('ce_jobmanager', ''),
+        ceQueueName=ce_info_dict.get('ce_queue_name', ''),
+        ceVersion=ce_info_dict.get('ce_version', ''),
+        )
+    # fill in template
+    if isinstance(template, SdfTemplate):
+        render = template.partial(**common_fields).render
+    else:
+        render = lambda **kwarg: template.format(**dict(common_fields, **kwarg))
+    sdf_content = render(
+        sdfPath=tmpFile.name,
         nCoreTotal=n_core_total,
         nNode=n_node,
         requestRam=request_ram,
@@ -364,19 +719,8 @@ def make_batch_script(workspec, template, n_core_per_node, log_dir, panda_queue_
         requestCputime=request_cputime,
         requestCputimeMinute=request_cputime_minute,
         accessPoint=workspec.accessPoint,
-        harvesterID=harvester_config.master.harvester_id,
         workerID=workspec.workerID,
         computingSite=workspec.computingSite,
-        pandaQueueName=panda_queue_name,
-        x509UserProxy=x509_user_proxy,
-        ceEndpoint=ce_info_dict.get('ce_endpoint', ''),
-        ceHostname=ce_info_dict.get('ce_hostname', ''),
-        ceFlavour=ce_info_dict.get('ce_flavour', ''),
-        ceJobmanager=ce_info_dict.get('ce_jobmanager', ''),
-        ceQueueName=ce_info_dict.get('ce_queue_name', ''),
-        ceVersion=ce_info_dict.get('ce_version', ''),
-        logDir=log_dir,
-        logSubdir=log_subdir,
         gtag=batch_log_dict.get('gtag', 'fake_GTAG_string'),
         prodSourceLabel=prod_source_label,
         resourceType=_get_resource_type(workspec.resourceType, is_unified_queue),
@@ -384,10 +728,10 @@ def make_batch_script(workspec, template, n_core_per_node, log_dir, panda_queue_
         ioIntensity=io_intensity,
         pilotType=workspec.pilotType,
         )
-    )
+    tmpFile.write(sdf_content)
     tmpFile.close()
     tmpLog.debug('done')
-    return tmpFile.name
+    return tmpFile.name, sdf_content
 
 
 # parse log, stdout, stderr filename
@@ -466,6 +810,19 @@ class HTCondorSubmitter(PluginBase):
             self.useSpool
         except AttributeError:
             self.useSpool = True
+        # submit workers sharing CE and template as procs of a condor cluster
+        try:
+            self.useClusterSubmission = bool(self.useClusterSubmission)
+        except AttributeError:
+            self.useClusterSubmission = False
+        try:
+            self.maxWorkersPerCluster
+        except AttributeError:
+            self.maxWorkersPerCluster = 500
+        try:
+            self.useCondorPythonAPI = bool(self.useCondorPythonAPI)
+        except AttributeError:
+            self.useCondorPythonAPI = False
         # record of information of CE statistics
         self.ceStatsLock = threading.Lock()
         self.ceStats = dict()
@@ -621,33 +978,12 @@ class HTCondorSubmitter(PluginBase):
                         pass
                 # template for batch script
                 try:
-                    tmpFile = open(self.templateFile)
-                    sdf_template_raw = tmpFile.read()
-                    tmpFile.close()
+                    sdf_template, batch_log_value, stdout_value, stderr_value = sdf_template_cache.get(self.templateFile)
                 except AttributeError:
                     tmpLog.error('No valid templateFile found. Maybe templateFile, CEtemplateDir invalid, or no valid CE found')
                     to_submit = False
                     return data
                 else:
-                    # get batch_log, stdout, stderr filename, and remobe commented liness
-                    sdf_template_str_list = []
-                    for _line in sdf_template_raw.split('\n'):
-                        if _line.startswith('#'):
-                            continue
-                        sdf_template_str_list.append(_line)
-                        _match_batch_log = re.match('log = (.+)', _line)
-                        _match_stdout = re.match('output = (.+)', _line)
-                        _match_stderr = re.match('error = (.+)', _line)
-                        if _match_batch_log:
-                            batch_log_value = _match_batch_log.group(1)
-                            continue
-                        if _match_stdout:
-                            stdout_value = _match_stdout.group(1)
-                            continue
-                        if _match_stderr:
-                            stderr_value = _match_stderr.group(1)
-                            continue
-                    sdf_template = '\n'.join(sdf_template_str_list)
                     # Choose from Condor schedd and central managers
                     if isinstance(self.condorSchedd, list) and len(self.condorSchedd) > 0:
                         if isinstance(self.condorPool, list) and len(self.condorPool) > 0:
@@ -728,8 +1064,12 @@ class HTCondorSubmitter(PluginBase):
         tmpLog.debug('{0} workers handled'.format(nWorkers))
 
         # exec with mcore
-        with ThreadPoolExecutor(self.nProcesses) as thread_pool:
-            retValList = thread_pool.map(submit_a_worker, dataIterator)
+        if self.useClusterSubmission:
+            retValList = submit_workers_in_clusters(list(dataIterator), self.maxWorkersPerCluster,
+                                                    self.nProcesses, self.useCondorPythonAPI)
+        else:
+            with ThreadPoolExecutor(self.nProcesses) as thread_pool:
+                retValList = thread_pool.map(submit_a_worker, dataIterator)
         tmpLog.debug('{0} workers submitted'.format(nWorkers))
 
         # propagate changed attributes
@@ -35,6 +35,10 @@ def _runShell(cmd):
 
 # sweeper for HTCONDOR batch system
 class HTCondorSweeper(BaseSweeper):
+    # instances are reused for the same config and shared among threads
+    instanceCacheable = True
+    threadSafe = True
+
     # constructor
     def __init__(self, **kwarg):
         BaseSweeper.__init__(self, **kwarg)
@@ -76,7 +80,7 @@ class HTCondorSweeper(BaseSweeper):
                                                                         pool_opt=pool_opt,
                                                                         batchID=workspec.batchID)
             (retCode, stdOut, stdErr) = _runShell(comStr)
-            if ('ClusterId = {0}'.format(workspec.batchID) in str(stdOut) \
+            if ('ClusterId = {0}'.format(workspec.batchID.split('.')[0]) in str(stdOut) \
                 and 'JobStatus = 3' not in str(stdOut)) or retCode != 0:
                 ## Force to cancel if batch job not terminated first time
                 comStr = 'condor_rm -forcex {name_opt} {pool_opt} {batchID}'.format(name_opt=name_opt,
@@ -135,7 +139,7 @@ class HTCondorSweeper(BaseSweeper):
                                                                             pool_opt=pool_opt,
                                                                             batchID=workspec.batchID)
                 (retCode, stdOut, stdErr) = _runShell(comStr)
-                if ('ClusterId = {0}'.format(workspec.batchID) in str(stdOut) \
+                if ('ClusterId = {0}'.format(workspec.batchID.split('.')[0]) in str(stdOut) \
                     and 'JobStatus = 3' not in str(stdOut)) or retCode != 0:
                     ## Force to cancel if batch job not terminated first time
                     comStr = 'condor_rm -forcex {name_opt} {pool_opt} {batchID}'.format(name_opt=name_opt,
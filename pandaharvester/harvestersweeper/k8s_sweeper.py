@@ -11,13 +11,17 @@ baseLogger = core_utils.setup_logger('k8s_sweeper')
 
 # sweeper for K8S
 class K8sSweeper(BaseSweeper):
+    # instances are reused for the same config in each thread since pods info is kept during a call
+    instanceCacheable = True
+
     # constructor
     def __init__(self, **kwarg):
         BaseSweeper.__init__(self, **kwarg)
 
         self.k8s_client = k8s_Client(namespace=self.k8s_namespace, config_file=self.k8s_config_file)
 
-        self._all_pods_list = []
+        # {job_name: [pod_info, ...]}
+        self._all_pods_dict = {}
 
     # # kill a worker
     # def kill_worker(self, workspec):
@@ -59,39 +63,48 @@ class K8sSweeper(BaseSweeper):
     def kill_workers(self, workspec_list):
         tmpLog = self.make_logger(baseLogger, method_name='kill_workers')
 
-        self._all_pods_list = self.k8s_client.get_pods_info()
+        self._all_pods_dict = self.k8s_client.get_pods_info(group_by_job_name=True)
 
-        retList = []
+        retMap = {}
         for workspec in workspec_list:
-            tmpRetVal = (None, 'Nothing done')
-
             job_id = workspec.batchID
+            retMap[job_id] = (None, 'Nothing done')
             try:
                 self.k8s_client.delete_job(job_id)
             except Exception as _e:
                 errStr = 'Failed to delete a JOB with id={0} ; {1}'.format(job_id, _e)
                 tmpLog.error(errStr)
-                tmpRetVal = (False, errStr)
-
-            pods_list = self.k8s_client.filter_pods_info(self._all_pods_list, job_name=job_id)
-            pods_name = [ pods_info['name'] for pods_info in pods_list ]
-            job_info = self.k8s_client.get_jobs_info(job_id)
-
-            if not job_info:
-                retList = self.k8s_client.delete_pods(pods_name)
-                if all(item['errMsg'] == '' for item in retList):
-                    tmpLog.info('Deleted a JOB & POD with id={0}'.format(job_id))
-                    tmpRetVal = (True, '')
-                else:
-                    errStrList = list()
-                    for item in retList:
-                        if item['errMsg']:
-                            errStr = 'Failed to delete a POD with id={0} ; {1}'.format(item['name'], item['errMsg'])
-                            tmpLog.error(errStr)
-                            errStrList.append(errStr)
-                    tmpRetVal = (False, ','.join(errStrList))
-
-            retList.append(tmpRetVal)
+                retMap[job_id] = (False, errStr)
+
+        # delete pods of deleted jobs
+        remaining_job_names = set([job_info['name'] for job_info in self.k8s_client.get_jobs_info()])
+        job_names_to_delete_pods = [workspec.batchID for workspec in workspec_list
+                                    if workspec.batchID not in remaining_job_names]
+        # delete pods with label selector of job names
+        job_names_with_pods = [job_id for job_id in job_names_to_delete_pods
+                               if self.k8s_client.filter_pods_info(self._all_pods_dict, job_name=job_id)]
+        pods_errMsg_map = {}
+        for item in self.k8s_client.delete_pods_by_job_names(job_names_with_pods):
+            if item['errMsg']:
+                pods_errMsg_map[item['name']] = item['errMsg']
+        # delete pods one by one if failed with label selector
+        for job_id in job_names_to_delete_pods:
+            if job_id in pods_errMsg_map:
+                pods_list = self.k8s_client.filter_pods_info(self._all_pods_dict, job_name=job_id)
+                pods_name = [pods_info['name'] for pods_info in pods_list]
+                errStrList = list()
+                for item in self.k8s_client.delete_pods(pods_name):
+                    if item['errMsg']:
+                        errStr = 'Failed to delete a POD with id={0} ; {1}'.format(item['name'], item['errMsg'])
+                        tmpLog.error(errStr)
+                        errStrList.append(errStr)
+                if errStrList:
+                    retMap[job_id] = (False, ','.join(errStrList))
+                    continue
+            tmpLog.info('Deleted a JOB & POD with id={0}'.format(job_id))
+            retMap[job_id] = (True, '')
+
+        retList = [retMap[workspec.batchID] for workspec in workspec_list]
 
         return retList
 
@@ -17,6 +17,11 @@ class PBSSweeper(PluginBase):
     # constructor
     def __init__(self, **kwarg):
         PluginBase.__init__(self, **kwarg)
+        # max number of jobs in one qdel
+        try:
+            self.maxJobsPerKill
+        except AttributeError:
+            self.maxJobsPerKill = 500
 
     # kill a worker
     def kill_worker(self, workspec):
@@ -46,6 +51,58 @@ class PBSSweeper(PluginBase):
         # return
         return True, ''
 
+    # kill workers
+    def kill_workers(self, workspec_list):
+        """Kill workers with one qdel for multiple batch jobs.
+
+        :param workspec_list: a list of workspecs
+        :type workspec_list: list
+        :return: A list of tuples of return code (True for success, False otherwise) and error dialog
+        :rtype: [(bool, string)]
+        """
+        # make logger
+        tmpLog = self.make_logger(baseLogger, method_name='kill_workers')
+        batchIDs = sorted(set([str(workspec.batchID) for workspec in workspec_list
+                               if workspec.batchID is not None]))
+        # error messages for batchIDs
+        errMap = dict()
+        for batchIDs_shard in core_utils.create_shards(batchIDs, self.maxJobsPerKill):
+            comList = ['qdel'] + batchIDs_shard
+            p = subprocess.Popen(comList, shell=False, universal_newlines=True,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stdOut, stdErr = p.communicate()
+            retCode = p.returncode
+            if retCode == 0:
+                continue
+            # qdel reports errors per job, e.g. 'qdel: Unknown Job Id 1234.server'
+            errLines = [tmpLine for tmpLine in (stdOut + '\n' + stdErr).split('\n') if tmpLine.strip()]
+            for batchID in batchIDs_shard:
+                for tmpLine in errLines:
+                    if batchID in tmpLine.split():
+                        errMap[batchID] = 'command "qdel {0}" failed, retCode={1}, error: {2}'.format(
+                            batchID, retCode, tmpLine)
+                        break
+            # failed for all jobs if no error is specific to jobs
+            if not any(batchID in errMap for batchID in batchIDs_shard):
+                for batchID in batchIDs_shard:
+                    errMap[batchID] = 'command "qdel" for {0} jobs failed, retCode={1}, error: {2} {3}'.format(
+                        len(batchIDs_shard), retCode, stdOut, stdErr)
+        retList = []
+        for workspec in workspec_list:
+            if workspec.batchID is None:
+                tmpLog.info('Found workerID={0} has batchID=None . Cannot kill. Skipped'.format(workspec.workerID))
+                retList.append((True, ''))
+            elif str(workspec.batchID) in errMap:
+                errStr = errMap[str(workspec.batchID)]
+                tmpLog.error('workerID={0} {1}'.format(workspec.workerID, errStr))
+                retList.append((False, errStr))
+            else:
+                tmpLog.info('Succeeded to kill workerID={0} batchID={1}'.format(workspec.workerID,
+                                                                                workspec.batchID))
+                retList.append((True, ''))
+        # return
+        return retList
+
     # cleanup for a worker
     def sweep_worker(self, workspec):
         """Perform cleanup procedures for a worker, such as deletion of work directory.
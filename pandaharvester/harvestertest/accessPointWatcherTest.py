@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestermessenger import access_point_watcher
+from pandaharvester.harvestermessenger.access_point_watcher import AccessPointWatcher
+
+# measure latency between a file put by a worker and the worker pushed to monitor FIFO head
+# with inotify watches, with polling, and with directories taken as on a network file system, against fake DB and FIFO
+# usage: python accessPointWatcherTest.py [nWorkers] [pollInterval]
+
+nWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+pollInterval = float(sys.argv[2]) if len(sys.argv) > 2 else 2
+nRequests = 20
+fileName = 'worker_requestevents.json'
+
+
+# fake DB proxy returning running workers
+class FakeDBProxy(object):
+    def get_worker_with_id(self, worker_id):
+        workSpec = WorkSpec()
+        workSpec.workerID = worker_id
+        workSpec.status = WorkSpec.ST_running
+        workSpec.mapType = WorkSpec.MT_OneToOne
+        workSpec.computingSite = 'TEST_SITE'
+        return workSpec
+
+    def get_jobs_with_worker_id(self, worker_id, locked_by, only_running=False, slim=False):
+        return []
+
+
+# fake monitor FIFO recording when workers are pushed
+class FakeMonitorFIFO(object):
+    enabled = True
+
+    def __init__(self):
+        self.pushedAt = dict()
+        self.cond = threading.Condition()
+
+    def put(self, obj, score=None):
+        queueName, workSpecsList, isOneShot = obj
+        assert isOneShot and score < 0
+        with self.cond:
+            for workSpecs in workSpecsList:
+                self.pushedAt[workSpecs[0].workerID] = time.time()
+            self.cond.notify_all()
+
+
+access_point_watcher.DBProxy = FakeDBProxy
+fifo = FakeMonitorFIFO()
+access_point_watcher.MonitorFIFO = lambda: fifo
+
+
+def run(label, use_inotify, as_network_fs=False):
+    baseDir = tempfile.mkdtemp()
+    watcher = AccessPointWatcher([fileName], poll_interval=pollInterval, push_delay=0.1)
+    if not use_inotify:
+        watcher.libc = None
+    # take the file system of the test directory as a network file system
+    fsType = access_point_watcher.get_fs_type(watcher.libc, baseDir.encode('utf-8'))
+    if as_network_fs:
+        assert fsType is not None
+        access_point_watcher.networkFsTypes[fsType] = 'test'
+    for i in range(nWorkers):
+        accessPoint = os.path.join(baseDir, str(i))
+        os.makedirs(accessPoint)
+        watcher.register(i, [accessPoint])
+    nWatched, nPolled = watcher.get_stats()
+    if as_network_fs:
+        assert nWatched == 0 and nPolled == nWorkers
+    fifo.pushedAt.clear()
+    latencies = []
+    for i in range(0, nWorkers, nWorkers // nRequests):
+        sTime = time.time()
+        with open(os.path.join(baseDir, str(i), fileName), 'w') as f:
+            f.write('{}')
+        with fifo.cond:
+            while i not in fifo.pushedAt:
+                fifo.cond.wait(1)
+        latencies.append(fifo.pushedAt[i] - sTime)
+    assert sorted(fifo.pushedAt) == list(range(0, nWorkers, nWorkers // nRequests))
+    print('{0:10} : {1} watched, {2} polled, latency avg {3:.2f} sec max {4:.2f} sec'.format(
+        label, nWatched, nPolled, sum(latencies) / len(latencies), max(latencies)))
+    shutil.rmtree(baseDir)
+    if as_network_fs:
+        del access_point_watcher.networkFsTypes[fsType]
+
+
+run('inotify', True)
+run('polling', False)
+run('network fs', True, True)
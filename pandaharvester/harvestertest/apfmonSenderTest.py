@@ -0,0 +1,92 @@
+import sys
+import json
+import time
+import threading
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+from pandaharvester.harvesterconfig import harvester_config
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestermisc.apfmon import Apfmon
+
+# measure time agents spend in Apfmon.create_workers and update_worker, and the number of requests
+# to a fake APFMon server which takes serverTime sec per request
+# usage: python apfmonSenderTest.py [nWorkers] [serverTime]
+
+nWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+serverTime = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+# requests and states received by the fake server
+received = {'requests': 0, 'states': dict()}
+lock = threading.Lock()
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    def handle_request(self):
+        time.sleep(serverTime)
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with lock:
+            received['requests'] += 1
+            if self.command == 'POST':
+                for apfmonWorker in json.loads(body):
+                    received['states'].setdefault(apfmonWorker['cid'], []).append(apfmonWorker['state'])
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'OK')
+
+    do_PUT = handle_request
+    do_POST = handle_request
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), FakeHandler)
+serverThread = threading.Thread(target=server.serve_forever)
+serverThread.daemon = True
+serverThread.start()
+
+harvester_config.apfmon.active = True
+harvester_config.apfmon.base_url = 'http://127.0.0.1:{0}/api'.format(server.server_address[1])
+apfmon = Apfmon(None)
+
+workSpecs = []
+for i in range(nWorkers):
+    workSpec = WorkSpec()
+    workSpec.workerID = i
+    workSpec.batchID = str(1000 + i)
+    workSpec.computingSite = 'TEST_SITE'
+    workSpec.computingElement = 'ce.example.org'
+    workSpec.workAttributes = dict()
+    workSpec.pandaid_list = [i]
+    workSpecs.append(workSpec)
+
+# create workers in shards as submitter, then update them as monitor
+sTime = time.time()
+for i in range(0, nWorkers, 20):
+    apfmon.create_workers(workSpecs[i:i + 20])
+for workSpec in workSpecs:
+    apfmon.update_worker(workSpec, WorkSpec.ST_running)
+for workSpec in workSpecs:
+    apfmon.update_worker(workSpec, WorkSpec.ST_finished)
+timeInAgents = time.time() - sTime
+while apfmon.get_stats()['queued'] > 0 or \
+        apfmon.get_stats()['sent'] + apfmon.get_stats()['coalesced'] < nWorkers * 4:
+    time.sleep(0.1)
+stats = apfmon.get_stats()
+print('{0} workers : {1:.3f} sec in agents, {2} requests in {3:.1f} sec, stats {4}'.format(
+    nWorkers, timeInAgents, received['requests'], time.time() - sTime, stats))
+# each worker ends with exiting and done
+for batchID, states in received['states'].items():
+    assert states[-2:] == ['exiting', 'done']
+assert len(received['states']) == nWorkers
@@ -0,0 +1,89 @@
+import sys
+import json
+import time
+import multiprocessing
+
+from pandaharvester.harvestercore import db_proxy
+from pandaharvester.harvestercore.db_proxy import DBProxy
+from pandaharvester.harvestercore.cache_spec import CacheSpec
+
+# check that get_cache in a process picks up data refreshed by another process, and compare get_cache
+# with re-reading the blob for every call. Fake data is cached under a test key on the DB defined in
+# panda_harvester.cfg
+# usage: python cacheCoherenceTest.py [nQueues] [nCalls]
+
+nQueues = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+nCalls = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+mainKey = 'panda_queues.json'
+subKey = 'cacheCoherenceTest'
+checkInterval = 0.5
+
+
+def make_data(version):
+    data = dict()
+    for i in range(nQueues):
+        data['QUEUE_{0}'.format(i)] = {'atlas_site': 'SITE_{0}'.format(i // 5),
+                                       'astorages': {'pr': ['RSE_{0}'.format(i)]},
+                                       'version': version}
+    return data
+
+
+# refresh in another process
+def refresh(version):
+    DBProxy().refresh_cache(mainKey, subKey, make_data(version))
+
+
+def refresh_in_another_process(version):
+    proc = multiprocessing.Process(target=refresh, args=(version,))
+    proc.start()
+    proc.join()
+
+
+# naive way to read the blob for every call
+def read_blob(proxy):
+    sql = 'SELECT {0} FROM {1} WHERE mainKey=:mainKey AND subKey=:subKey'.format(CacheSpec.column_names(),
+                                                                               db_proxy.cacheTableName)
+    proxy.execute(sql, {':mainKey': mainKey, ':subKey': subKey})
+    cacheSpec = CacheSpec()
+    cacheSpec.pack(proxy.cur.fetchone())
+    proxy.commit()
+    return cacheSpec
+
+
+if __name__ == '__main__':
+    db_proxy.cacheCheckInterval = checkInterval
+    proxy = DBProxy()
+    refresh_in_another_process(0)
+    assert proxy.get_cache(mainKey, subKey).data['QUEUE_0']['version'] == 0
+    # refreshed by another process
+    refresh_in_another_process(1)
+    assert proxy.get_cache(mainKey, subKey).data['QUEUE_0']['version'] == 0
+    time.sleep(checkInterval)
+    assert proxy.get_cache(mainKey, subKey).data['QUEUE_0']['version'] == 1
+    assert proxy.get_cache_index(mainKey, 'nucleus_to_rse', subKey)['SITE_0'] == 'RSE_0'
+    # refreshed again within the same second, which lastUpdate cannot tell on MariaDB
+    lastUpdate = read_blob(proxy).lastUpdate
+    refresh_in_another_process(2)
+    proxy.execute('UPDATE {0} SET lastUpdate=:lastUpdate WHERE mainKey=:mainKey AND subKey=:subKey'.format(
+        db_proxy.cacheTableName), {':lastUpdate': lastUpdate, ':mainKey': mainKey, ':subKey': subKey})
+    proxy.commit()
+    time.sleep(checkInterval)
+    assert proxy.get_cache(mainKey, subKey).data['QUEUE_0']['version'] == 2
+    refresh_in_another_process(1)
+    time.sleep(checkInterval)
+    assert proxy.get_cache(mainKey, subKey).data['QUEUE_0']['version'] == 1
+    # data is shared
+    assert proxy.get_cache(mainKey, subKey).data is proxy.get_cache(mainKey, subKey).data
+    # throughput
+    for label, func in [('re-read', read_blob),
+                        ('versioned', lambda p: p.get_cache(mainKey, subKey))]:
+        sTime = time.time()
+        for i in range(nCalls):
+            assert func(proxy).data['QUEUE_0']['version'] == 1
+        print('nQueues={0} blob={1}kB nCalls={2} {3:10} : {4:.3f} sec'.format(
+            nQueues, len(json.dumps(make_data(1))) // 1024, nCalls, label, time.time() - sTime))
+    print('stats {0}'.format(proxy.get_cache_stats()))
+    # clean up
+    proxy.execute('DELETE FROM {0} WHERE subKey=:subKey'.format(db_proxy.cacheTableName), {':subKey': subKey})
+    proxy.commit()
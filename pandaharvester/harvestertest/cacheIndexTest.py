@@ -0,0 +1,64 @@
+import sys
+import time
+
+from pandaharvester.harvestercore import db_proxy
+from pandaharvester.harvestercore.db_proxy import DBProxy
+from pandaharvester.harvestercore.db_interface import DBInterface
+
+# compare per-job scans over cached panda_queues.json and agis_ddmendpoints.json with derived indexes,
+# as used by rucio stagers. Fake data is cached under test keys on the DB defined in panda_harvester.cfg
+# usage: python cacheIndexTest.py [nQueues] [nJobs]
+
+nQueues = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+nJobs = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+subKey = 'cacheIndexTest'
+
+# fake data; several queues at each nucleus, and objectstores with IDs
+pandaQueues = dict()
+ddmEndpoints = dict()
+for i in range(nQueues):
+    pandaQueues['QUEUE_{0}'.format(i)] = {'atlas_site': 'SITE_{0}'.format(i // 5),
+                                          'astorages': {'pr': ['RSE_{0}_{1}'.format(i // 5, i % 5)]}}
+    ddmEndpoints['RSE_{0}'.format(i)] = {'id': i + 10}
+
+proxy = DBProxy()
+proxy.refresh_cache('panda_queues.json', subKey, pandaQueues)
+proxy.refresh_cache('agis_ddmendpoints.json', subKey, ddmEndpoints)
+dbInterface = DBInterface()
+
+
+def scan(nucleus, objstore_id):
+    agis = proxy.get_cache('panda_queues.json', subKey).data
+    dstRSE = [agis[x]["astorages"]['pr'][0] for x in agis if agis[x]["atlas_site"] == nucleus][0]
+    ddm = proxy.get_cache('agis_ddmendpoints.json', subKey).data
+    srcRSE = [x for x in ddm if ddm[x]["id"] == objstore_id][0]
+    return dstRSE, srcRSE
+
+
+def index(nucleus, objstore_id):
+    dstRSE = proxy.get_cache_index('panda_queues.json', 'nucleus_to_rse', subKey).get(nucleus)
+    srcRSE = proxy.get_cache_index('agis_ddmendpoints.json', 'objstore_id_to_rse', subKey).get(objstore_id)
+    return dstRSE, srcRSE
+
+
+def run(label, func):
+    sTime = time.time()
+    retVal = [func('SITE_{0}'.format(i % (nQueues // 5)), (i * 7) % nQueues + 10) for i in range(nJobs)]
+    print('nQueues={0} nJobs={1} {2:6} : {3:.3f} sec'.format(nQueues, nJobs, label, time.time() - sTime))
+    return retVal
+
+
+retScan = run('scan', scan)
+retIndex = run('index', index)
+assert retScan == retIndex
+# indexes are rebuilt when data is refreshed
+pandaQueues['QUEUE_0']['atlas_site'] = 'NEW_SITE'
+proxy.refresh_cache('panda_queues.json', subKey, pandaQueues)
+assert proxy.get_cache_index('panda_queues.json', 'nucleus_to_rse', subKey)['NEW_SITE'] == 'RSE_0_0'
+assert proxy.get_cache_index('panda_queues.json', 'nucleus_to_rse', subKey)['SITE_0'] == 'RSE_0_1'
+# unregistered index
+assert dbInterface.get_cache_index('panda_queues.json', 'no_such_index') is None
+# clean up
+proxy.execute('DELETE FROM {0} WHERE subKey=:subKey'.format(db_proxy.cacheTableName), {':subKey': subKey})
+proxy.commit()
@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import stat
+import shutil
+import tempfile
+
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestersubmitter import htcondor_submitter
+
+# compare per-worker and cluster submission of HTCondorSubmitter with a fake condor_submit
+# which takes negotiationTime sec per invocation
+# usage: python condorClusterSubmitTest.py [nWorkers] [negotiationTime]
+
+nWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+negotiationTime = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+template = """executable = {executableFile}
+arguments = -s {computingSite} -h {pandaQueueName} -u {prodSourceLabel} -f false
+initialdir = {accessPoint}
+universe = grid
+log = {logDir}/{logSubdir}/grid.$(Cluster).$(Process).log
+output = {logDir}/{logSubdir}/grid.$(Cluster).$(Process).out
+error = {logDir}/{logSubdir}/grid.$(Cluster).$(Process).err
+environment = "PANDA_JSID=harvester-{harvesterID} HARVESTER_ID={harvesterID} HARVESTER_WORKER_ID={workerID} GTAG={gtag}"
++harvesterID = "{harvesterID}"
+grid_resource = condor {ceHostname} {ceEndpoint}
++xcount = {nCoreTotal}
++maxMemory = {requestRam}
++sdfPath = "{sdfPath}"
+
+queue 1
+"""
+
+fakeCondorSubmit = """#!{python}
+import os
+import re
+import sys
+import time
+time.sleep({negotiationTime})
+nProcs = len([l for l in open(sys.argv[-1]) if re.match('queue(\\\\s|$)', l)])
+if nProcs > 1 and os.environ.get('FAKE_CONDOR_FAIL_CLUSTER'):
+    sys.stderr.write('ERROR: fake failure')
+    sys.exit(1)
+counterFile = os.path.join(os.path.dirname(sys.argv[0]), 'counter')
+with open(counterFile, 'a') as f:
+    f.write('{{0}}\\n'.format(nProcs))
+clusterID = len(open(counterFile).readlines())
+print('Submitting job(s).')
+print('{{0}} job(s) submitted to cluster {{1}}.'.format(nProcs, clusterID))
+"""
+
+tmpDir = tempfile.mkdtemp()
+binDir = os.path.join(tmpDir, 'bin')
+os.makedirs(binDir)
+fakeCommand = os.path.join(binDir, 'condor_submit')
+with open(fakeCommand, 'w') as f:
+    f.write(fakeCondorSubmit.format(python=sys.executable, negotiationTime=negotiationTime))
+os.chmod(fakeCommand, os.stat(fakeCommand).st_mode | stat.S_IEXEC)
+os.environ['PATH'] = binDir + os.pathsep + os.environ['PATH']
+
+
+def make_data_list():
+    data_list = []
+    for i in range(nWorkers):
+        workspec = WorkSpec()
+        workspec.workerID = i
+        workspec.computingSite = 'TEST_SITE'
+        workspec.pilotType = 'RC'
+        workspec.nCore = 8
+        workspec.accessPoint = os.path.join(tmpDir, 'workers', str(i))
+        os.makedirs(workspec.accessPoint)
+        workspec.workAttributes = {'stdOut': 'https://logs/{0}.out'.format(i),
+                                   'batchLog': 'https://logs/{0}.log'.format(i)}
+        data_list.append({
+            'workspec': workspec,
+            'to_submit': True,
+            'template': template,
+            'executable_file': '/bin/true',
+            'log_dir': tmpDir,
+            'log_subdir': 'logs',
+            'n_core_per_node': 8,
+            'panda_queue_name': 'TEST_SITE',
+            'x509_user_proxy': None,
+            'ce_info_dict': {'ce_endpoint': 'ce{0}.test:9619'.format(i % 2), 'ce_hostname': 'ce{0}.test'.format(i % 2)},
+            'batch_log_dict': {'batch_log': 'https://logs/grid.$(Cluster).$(Process).log',
+                               'batch_stdout': 'https://logs/grid.$(Cluster).$(Process).out',
+                               'batch_stderr': 'https://logs/grid.$(Cluster).$(Process).err',
+                               'gtag': workspec.workAttributes['stdOut']},
+            'special_par': '',
+            'harvester_queue_config': None,
+            'is_unified_queue': False,
+            'condor_schedd': None,
+            'condor_pool': None,
+            'use_spool': False,
+        })
+    return data_list
+
+
+def run(label, func):
+    shutil.rmtree(os.path.join(tmpDir, 'workers'), ignore_errors=True)
+    data_list = make_data_list()
+    sTime = time.time()
+    retList = func(data_list)
+    timeConsumed = time.time() - sTime
+    nOK = len([tmpRetVal for (tmpRetVal, tmpDict) in retList if tmpRetVal[0]])
+    batchIDs = set([data['workspec'].batchID for data in data_list])
+    print('{0:30} : {1} submitted, {2} distinct batchIDs, {3:.1f} workers/sec'.format(
+        label, nOK, len(batchIDs), nWorkers / timeConsumed))
+
+
+# commands in only some workers are given for every proc
+commonItems, perWorkerItemsList = htcondor_submitter._split_sdf_items([[('universe', 'grid'), ('+a', '1')],
+                                                                       [('universe', 'grid'), ('+b', '2')],
+                                                                       [('universe', 'grid'), ('+a', '3')]])
+assert commonItems == [('universe', 'grid')]
+assert perWorkerItemsList == [[('+a', '1'), ('+b', '')], [('+a', ''), ('+b', '2')], [('+a', '3'), ('+b', '')]]
+
+run('per worker', lambda data_list: [htcondor_submitter.submit_a_worker(data) for data in data_list])
+run('cluster', lambda data_list: htcondor_submitter.submit_workers_in_clusters(data_list, 500, 1))
+os.environ['FAKE_CONDOR_FAIL_CLUSTER'] = '1'
+run('cluster with fallback', lambda data_list: htcondor_submitter.submit_workers_in_clusters(data_list, 500, 1))
+shutil.rmtree(tmpDir)
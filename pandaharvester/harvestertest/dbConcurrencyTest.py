@@ -0,0 +1,135 @@
+import sys
+import time
+import datetime
+import threading
+
+from pandaharvester.harvesterconfig import harvester_config
+from pandaharvester.harvestercore import db_proxy
+from pandaharvester.harvestercore.db_proxy import DBProxy
+from pandaharvester.harvestercore.job_spec import JobSpec
+from pandaharvester.harvestercore.file_spec import FileSpec
+from pandaharvester.harvestercore.event_spec import EventSpec
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestercore.panda_queue_spec import PandaQueueSpec
+from pandaharvester.harvestercore.job_worker_relation_spec import JobWorkerRelationSpec
+
+# measure throughput of monitor, submitter and propagator query mixes running in parallel threads
+# with and without db.sqliteConcurrentRead
+# usage: python dbConcurrencyTest.py [nThreadsPerAgent] [duration in sec] [nWorkers]
+
+if harvester_config.db.engine != 'sqlite':
+    print('only for sqlite')
+    sys.exit(0)
+
+nThreadsPerAgent = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+duration = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+nWorkers = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+
+# offset of IDs not to collide with real workers and jobs
+idOffset = 10 ** 12
+queueName = 'HARVESTER_DB_CONCURRENCY_TEST'
+
+proxy = DBProxy()
+for tmpSpec, tmpTableName in [(JobSpec, db_proxy.jobTableName),
+                              (WorkSpec, db_proxy.workTableName),
+                              (FileSpec, db_proxy.fileTableName),
+                              (EventSpec, db_proxy.eventTableName),
+                              (PandaQueueSpec, db_proxy.pandaQueueTableName),
+                              (JobWorkerRelationSpec, db_proxy.jobWorkerTableName)]:
+    proxy.make_table(tmpSpec, tmpTableName)
+
+
+def clean_up():
+    varMap = dict()
+    varMap[':low'] = idOffset
+    for tmpTableName, tmpKey in [(db_proxy.workTableName, 'workerID'),
+                                 (db_proxy.jobWorkerTableName, 'workerID'),
+                                 (db_proxy.jobTableName, 'PandaID')]:
+        proxy.execute('DELETE FROM {0} WHERE {1}>=:low'.format(tmpTableName, tmpKey), varMap)
+    proxy.commit()
+
+
+def populate():
+    clean_up()
+    timeOld = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    varMapsW = []
+    varMapsJ = []
+    varMapsR = []
+    for i in range(nWorkers):
+        workSpec = WorkSpec()
+        workSpec.workerID = idOffset + i
+        workSpec.computingSite = queueName
+        workSpec.computingElement = 'ce{0}'.format(i % 5)
+        workSpec.status = WorkSpec.ST_running
+        workSpec.mapType = WorkSpec.MT_OneToOne
+        workSpec.modificationTime = timeOld
+        workSpec.lastUpdate = timeOld
+        varMapsW.append(workSpec.values_map())
+        jobSpec = JobSpec()
+        jobSpec.PandaID = idOffset + i
+        jobSpec.computingSite = queueName
+        jobSpec.status = 'running'
+        jobSpec.propagatorTime = timeOld
+        varMapsJ.append(jobSpec.values_map())
+        relSpec = JobWorkerRelationSpec()
+        relSpec.PandaID = jobSpec.PandaID
+        relSpec.workerID = workSpec.workerID
+        varMapsR.append(relSpec.values_map())
+    for tmpSpec, tmpTableName, varMaps in [(WorkSpec, db_proxy.workTableName, varMapsW),
+                                           (JobSpec, db_proxy.jobTableName, varMapsJ),
+                                           (JobWorkerRelationSpec, db_proxy.jobWorkerTableName, varMapsR)]:
+        sql = 'INSERT INTO {0} ({1}) {2}'.format(tmpTableName, tmpSpec.column_names(),
+                                                 tmpSpec.bind_values_expression())
+        proxy.executemany(sql, varMaps)
+    proxy.commit()
+
+
+# query mixes
+def monitor_mix(tmp_proxy, locked_by):
+    tmp_proxy.get_workers_to_update(100, 0, 600, locked_by)
+    tmp_proxy.get_worker_ce_stats(queueName)
+
+
+def submitter_mix(tmp_proxy, locked_by):
+    tmp_proxy.get_worker_stats_bulk(None)
+    tmp_proxy.get_worker_ce_stats(queueName)
+    tmp_proxy.get_worker_stats(queueName)
+
+
+def propagator_mix(tmp_proxy, locked_by):
+    tmp_proxy.get_jobs_to_propagate(100, 600, 0, locked_by)
+    tmp_proxy.get_workers_to_propagate(100, 0)
+
+
+def run_mode(concurrent_read):
+    harvester_config.db.sqliteConcurrentRead = concurrent_read
+    populate()
+    nCalls = dict()
+    stopEvent = threading.Event()
+    threadList = []
+
+    def run_mix(mix_name, func, locked_by):
+        tmpProxy = DBProxy(thr_name=locked_by)
+        while not stopEvent.is_set():
+            func(tmpProxy, locked_by)
+            nCalls[locked_by] = nCalls.get(locked_by, 0) + 1
+
+    for mixName, func in [('monitor', monitor_mix), ('submitter', submitter_mix), ('propagator', propagator_mix)]:
+        for i in range(nThreadsPerAgent):
+            thr = threading.Thread(target=run_mix, args=(mixName, func, '{0}-{1}'.format(mixName, i)))
+            threadList.append(thr)
+    for thr in threadList:
+        thr.start()
+    time.sleep(duration)
+    stopEvent.set()
+    for thr in threadList:
+        thr.join()
+    for mixName in ['monitor', 'submitter', 'propagator']:
+        nTotal = sum([v for k, v in nCalls.items() if k.startswith(mixName)])
+        print('sqliteConcurrentRead={0} {1} : {2:.2f} mixes/sec'.format(concurrent_read, mixName,
+                                                                     float(nTotal) / duration))
+
+
+run_mode(False)
+run_mode(True)
+clean_up()
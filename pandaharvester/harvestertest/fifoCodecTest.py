@@ -0,0 +1,83 @@
+import sys
+import time
+import random
+import datetime
+
+from pandaharvester.harvestercore import fifo_codec
+from pandaharvester.harvestercore.fifo_codec import FifoSerializer
+from pandaharvester.harvestercore.work_spec import WorkSpec
+
+# compare size and speed of fifo codecs with monitor fifo chunks
+# usage: python fifoCodecTest.py [nWorkersPerChunk] [nRepeat]
+
+nWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+nRepeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+
+def make_chunk(n_workers):
+    timeNow = datetime.datetime.utcnow()
+    workspec_chunk = []
+    for i in range(n_workers):
+        workSpec = WorkSpec()
+        workSpec.workerID = 10 ** 8 + i
+        workSpec.batchID = '{0}.0'.format(3 * 10 ** 6 + i)
+        workSpec.computingSite = 'CERN-PROD'
+        workSpec.computingElement = 'ce{0}.cern.ch'.format(i % 5)
+        workSpec.status = WorkSpec.ST_running
+        workSpec.mapType = WorkSpec.MT_OneToOne
+        workSpec.submitTime = timeNow
+        workSpec.startTime = timeNow
+        workSpec.modificationTime = timeNow
+        workSpec.accessPoint = '/data/harvester/workers/{0}'.format(workSpec.workerID)
+        workSpec.workAttributes = {'random': random.random()}
+        workSpec.workParams = {'lastCheckAt': time.time()}
+        workSpec.nCore = 8
+        workSpec.hasJob = 1
+        workspec_chunk.append([workSpec])
+    return ('CERN-PROD', workspec_chunk)
+
+
+obj = make_chunk(nWorkers)
+plainPickle = FifoSerializer()
+
+compressionList = [None, 'zlib']
+if fifo_codec.lz4frame is not None:
+    compressionList.append('lz4')
+
+print('chunk of {0} workers, {1} repeats'.format(nWorkers, nRepeat))
+for codecName in ['pickle', 'compact']:
+    for compressionName in compressionList:
+        serializer = FifoSerializer(codecName, compressionName)
+        sTime = time.time()
+        for i in range(nRepeat):
+            data = serializer.encode(obj)
+        encodeTime = (time.time() - sTime) / nRepeat
+        sTime = time.time()
+        for i in range(nRepeat):
+            newObj = plainPickle.decode(data)
+        decodeTime = (time.time() - sTime) / nRepeat
+        # check round trip
+        for workSpecs, newWorkSpecs in zip(obj[1], newObj[1]):
+            assert workSpecs[0].values_list() == newWorkSpecs[0].values_list()
+        print('codec={0:8} compression={1:5} : {2:8} bytes, encode {3:.2f} ms, decode {4:.2f} ms'.format(
+            codecName, str(compressionName), len(data), encodeTime * 1000., decodeTime * 1000.))
+
+# round trip of nested specs, attributes added after construction, and items of the tree-based compact codec
+from pandaharvester.harvestercore.job_spec import JobSpec
+workSpec = obj[1][0][0]
+jobSpec = JobSpec()
+jobSpec.PandaID = 123
+workSpec.jobspec_list = [jobSpec]
+workSpec.pandaid_list = [123]
+dynSpec = obj[1][1][0]
+object.__setattr__(dynSpec, 'someAttribute', 'test')
+compactSerializer = FifoSerializer('compact')
+for data in [compactSerializer.encode(obj),
+             fifo_codec._magic + fifo_codec._codec_compact + fifo_codec._compression_none +
+             fifo_codec.CompactCodec().dumps(obj)]:
+    newObj = plainPickle.decode(data)
+    newWorkSpec = newObj[1][0][0]
+    assert newWorkSpec.values_list() == workSpec.values_list()
+    assert newWorkSpec.jobspec_list[0].PandaID == 123 and newWorkSpec.pandaid_list == [123]
+    assert newWorkSpec.isNew is False and newWorkSpec.changedAttrs == {}
+    assert newObj[1][1][0].someAttribute == 'test'
@@ -0,0 +1,119 @@
+import sys
+import time
+import datetime
+
+from pandaharvester.harvesterconfig import harvester_config
+from pandaharvester.harvestercore import db_proxy
+from pandaharvester.harvestercore.db_proxy import DBProxy
+from pandaharvester.harvestercore.job_spec import JobSpec
+from pandaharvester.harvestercore.file_spec import FileSpec
+
+# compare per-LFN get_file_status/get_group_for_file and get_file_status_bulk/get_groups_for_files
+# on file_table of the DB defined in panda_harvester.cfg
+# usage: python fileStatusTest.py [nJobs] [nFilesPerJob]
+
+nJobs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+nFilesPerJob = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+# offset of IDs not to collide with real jobs
+idOffset = 10 ** 12
+endpoint = 'HARVESTER_FILE_STATUS_TEST'
+statusList = ['to_prepare', 'preparing', 'ready']
+
+proxy = DBProxy()
+
+# count round-trips
+nExec = [0]
+origExecute = proxy.execute
+
+
+def counting_execute(sql, varmap=None):
+    nExec[0] += 1
+    return origExecute(sql, varmap)
+
+
+proxy.execute = counting_execute
+
+
+def clean_up():
+    varMap = dict()
+    varMap[':low'] = idOffset
+    sqlJ = 'DELETE FROM {0} WHERE PandaID>=:low'.format(db_proxy.jobTableName)
+    origExecute(sqlJ, varMap)
+    sqlF = 'DELETE FROM {0} WHERE PandaID>=:low'.format(db_proxy.fileTableName)
+    origExecute(sqlF, varMap)
+    proxy.commit()
+
+
+# jobs share half of input files with the previous job
+def populate():
+    clean_up()
+    timeNow = datetime.datetime.utcnow()
+    sqlJ = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.jobTableName, JobSpec.column_names(),
+                                              JobSpec.bind_values_expression())
+    sqlF = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.fileTableName, FileSpec.column_names(),
+                                              FileSpec.bind_values_expression())
+    varMapsJ = []
+    varMapsF = []
+    lfns = set()
+    fileID = idOffset
+    for i in range(nJobs):
+        jobSpec = JobSpec()
+        jobSpec.PandaID = idOffset + i
+        jobSpec.status = 'starting'
+        varMapsJ.append(jobSpec.values_map())
+        for j in range(nFilesPerJob):
+            fileSpec = FileSpec()
+            fileSpec.fileID = fileID
+            fileSpec.PandaID = jobSpec.PandaID
+            fileSpec.lfn = 'file_{0}.root'.format(i * nFilesPerJob // 2 + j)
+            fileSpec.fileType = 'input'
+            fileSpec.endpoint = endpoint
+            fileSpec.status = statusList[fileID % len(statusList)]
+            if fileSpec.status == 'ready':
+                fileSpec.groupID = 'group_{0}'.format(fileID % 7)
+                fileSpec.groupStatus = 'active'
+                fileSpec.groupUpdateTime = timeNow - datetime.timedelta(seconds=fileID % 11)
+            varMapsF.append(fileSpec.values_map())
+            lfns.add(fileSpec.lfn)
+            fileID += 1
+    proxy.executemany(sqlJ, varMapsJ)
+    proxy.executemany(sqlF, varMapsF)
+    proxy.commit()
+    return sorted(lfns)
+
+
+def run(label, func):
+    nExec[0] = 0
+    sTime = time.time()
+    retVal = func()
+    timeConsumed = time.time() - sTime
+    print('engine={0} nJobs={1} nFilesPerJob={2} {3:12} : {4} queries in {5:.3f} sec'.format(
+        harvester_config.db.engine, nJobs, nFilesPerJob, label, nExec[0], timeConsumed))
+    return retVal
+
+
+def one_by_one(lfns):
+    statMap = dict()
+    groupMap = dict()
+    for lfn in lfns:
+        statMap[lfn] = proxy.get_file_status(lfn, 'input', endpoint, 'starting')
+        if 'ready' in statMap[lfn]:
+            groupInfo = proxy.get_group_for_file(lfn, 'input', endpoint)
+            if groupInfo is not None:
+                groupMap[lfn] = groupInfo
+    return statMap, groupMap
+
+
+def bulk(lfns):
+    statMap = proxy.get_file_status_bulk(lfns, 'input', endpoint, 'starting')
+    readyLFNs = [lfn for lfn in lfns if 'ready' in statMap[lfn]]
+    groupMap = proxy.get_groups_for_files(readyLFNs, 'input', endpoint)
+    return statMap, groupMap
+
+
+allLFNs = populate()
+retOneByOne = run('one by one', lambda: one_by_one(allLFNs))
+retBulk = run('bulk', lambda: bulk(allLFNs))
+assert retOneByOne == retBulk
+clean_up()
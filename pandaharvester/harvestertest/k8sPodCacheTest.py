@@ -0,0 +1,193 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import datetime
+import tempfile
+import threading
+
+from kubernetes import client
+
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestermisc.k8s_utils import k8s_Client
+from pandaharvester.harvestermonitor.k8s_monitor import K8sMonitor
+from pandaharvester.harvestersweeper.k8s_sweeper import K8sSweeper
+
+# check K8sMonitor and K8sSweeper with pods grouped by job name and a watch-based pod cache
+# against a fake CoreV1 API which takes listTime sec to list pods
+# usage: python k8sPodCacheTest.py [nWorkers] [listTime]
+
+nWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+listTime = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+
+
+# fake response of watch streaming events as JSON lines
+class FakeWatchResponse(object):
+    def __init__(self, api, resource_version, timeout_seconds):
+        self.api = api
+        self.resourceVersion = int(resource_version)
+        self.deadline = time.time() + timeout_seconds
+
+    def stream(self, amt=None, decode_content=False):
+        while time.time() < self.deadline:
+            with self.api.cond:
+                events = [e for e in self.api.events if e[0] > self.resourceVersion]
+                if not events:
+                    self.api.cond.wait(0.1)
+                    continue
+            for rv, eventType, rawObject in events:
+                self.resourceVersion = rv
+                yield json.dumps({'type': eventType, 'object': rawObject}) + '\n'
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+# fake CoreV1Api keeping pods in memory
+class FakeCoreV1Api(object):
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.pods = dict()
+        self.events = []
+        self.resourceVersion = 0
+        self.nList = 0
+        self.nDelete = 0
+        self.apiClient = client.ApiClient()
+
+    def set_pod(self, name, job_name, phase):
+        with self.cond:
+            self.resourceVersion += 1
+            pod = client.V1Pod(metadata=client.V1ObjectMeta(name=name, labels={'job-name': job_name},
+                                                            resource_version=str(self.resourceVersion)),
+                               status=client.V1PodStatus(phase=phase, start_time=datetime.datetime.utcnow()))
+            eventType = 'MODIFIED' if name in self.pods else 'ADDED'
+            self.pods[name] = pod
+            self.events.append((self.resourceVersion, eventType, self.apiClient.sanitize_for_serialization(pod)))
+            self.cond.notify_all()
+
+    def remove_pod(self, name):
+        with self.cond:
+            self.resourceVersion += 1
+            pod = self.pods.pop(name)
+            pod.metadata.resource_version = str(self.resourceVersion)
+            self.events.append((self.resourceVersion, 'DELETED', self.apiClient.sanitize_for_serialization(pod)))
+            self.cond.notify_all()
+
+    def list_namespaced_pod(self, namespace, watch=False, resource_version=None, timeout_seconds=None, **kwarg):
+        """
+        :rtype: V1PodList
+        """
+        if watch:
+            return FakeWatchResponse(self, resource_version, timeout_seconds)
+        self.nList += 1
+        time.sleep(listTime)
+        with self.cond:
+            return client.V1PodList(items=list(self.pods.values()),
+                                    metadata=client.V1ListMeta(resource_version=str(self.resourceVersion)))
+
+    def delete_collection_namespaced_pod(self, namespace, label_selector, **kwarg):
+        self.nDelete += 1
+        job_names = re.match(r'job-name in \((.*)\)', label_selector).group(1).split(',')
+        for pod in list(self.pods.values()):
+            if pod.metadata.labels['job-name'] in job_names:
+                self.remove_pod(pod.metadata.name)
+
+    def delete_namespaced_pod(self, name, namespace, **kwarg):
+        self.nDelete += 1
+        self.remove_pod(name)
+
+
+# fake BatchV1Api where jobs are deleted immediately
+class FakeBatchV1Api(object):
+    def delete_namespaced_job(self, **kwarg):
+        pass
+
+    def list_namespaced_job(self, **kwarg):
+        return client.V1JobList(items=[])
+
+
+tmpDir = tempfile.mkdtemp()
+configFile = os.path.join(tmpDir, 'kubeconfig')
+with open(configFile, 'w') as f:
+    f.write("""apiVersion: v1
+kind: Config
+clusters:
+- cluster: {server: 'https://localhost:6443'}
+  name: fake
+contexts:
+- context: {cluster: fake, user: fake}
+  name: fake
+current-context: fake
+users:
+- name: fake
+  user: {token: fake}
+""")
+k8sClient = k8s_Client(namespace='default', config_file=configFile)
+fakeApi = FakeCoreV1Api()
+k8sClient.corev1 = fakeApi
+k8sClient.batchv1 = FakeBatchV1Api()
+
+phases = ['Pending', 'Running', 'Succeeded']
+for i in range(nWorkers):
+    fakeApi.set_pod('job-{0}-abcde'.format(i), 'job-{0}'.format(i), phases[i % 3])
+workSpecs = []
+for i in range(nWorkers):
+    workSpec = WorkSpec()
+    workSpec.workerID = i
+    workSpec.batchID = 'job-{0}'.format(i)
+    workSpec.status = WorkSpec.ST_submitted
+    workSpecs.append(workSpec)
+statusMap = {'Pending': WorkSpec.ST_submitted, 'Running': WorkSpec.ST_running, 'Succeeded': WorkSpec.ST_finished}
+
+
+def check(label, monitor, expected):
+    nList = fakeApi.nList
+    sTime = time.time()
+    tmpStat, retList = monitor.check_workers(workSpecs)
+    timeConsumed = time.time() - sTime
+    assert tmpStat
+    assert [newStatus for newStatus, errStr in retList] == expected
+    print('{0:30} : {1} workers in {2:.3f} sec with {3} list calls'.format(label, nWorkers, timeConsumed,
+                                                                           fakeApi.nList - nList))
+
+
+# lookup of pods for a job
+allPodsList = k8sClient.get_pods_info()
+allPodsDict = k8sClient.get_pods_info(group_by_job_name=True)
+for label, allPods in [('linear filter', allPodsList), ('grouped by job name', allPodsDict)]:
+    sTime = time.time()
+    for workSpec in workSpecs:
+        k8sClient.filter_pods_info(allPods, job_name=workSpec.batchID)
+    print('{0:30} : {1} lookups in {2:.3f} sec'.format(label, nWorkers, time.time() - sTime))
+
+kwarg = dict(k8s_namespace='default', k8s_config_file=configFile)
+expected = [statusMap[phases[i % 3]] for i in range(nWorkers)]
+check('list pods', K8sMonitor(**kwarg), expected)
+monitor = K8sMonitor(usePodWatch=True, podWatchTimeout=2, **kwarg)
+check('watch', monitor, expected)
+
+# pod updates and deletions via watch
+for i in range(0, nWorkers, 2):
+    fakeApi.set_pod('job-{0}-abcde'.format(i), 'job-{0}'.format(i), 'Succeeded')
+    expected[i] = WorkSpec.ST_finished
+for i in range(1, nWorkers, 10):
+    fakeApi.remove_pod('job-{0}-abcde'.format(i))
+    expected[i] = WorkSpec.ST_cancelled
+# longer than podWatchTimeout to see the watch restarted
+time.sleep(3)
+check('watch after updates', monitor, expected)
+
+# sweeper deletes pods of deleted jobs with label selectors
+sweeper = K8sSweeper(**kwarg)
+sTime = time.time()
+retList = sweeper.kill_workers(workSpecs)
+assert all(tmpStat for tmpStat, errStr in retList)
+assert not fakeApi.pods
+print('{0:30} : {1} workers in {2:.3f} sec with {3} delete calls'.format('kill_workers', nWorkers,
+                                                                         time.time() - sTime, fakeApi.nDelete))
+shutil.rmtree(tmpDir)
@@ -0,0 +1,108 @@
+import sys
+import time
+import inspect
+import logging
+import cProfile
+import pstats
+
+from pandalogger.LogWrapper import LogWrapper
+from pandaharvester.harvestercore import core_utils
+from pandaharvester.harvestercore.work_spec import WorkSpec
+
+# compare eager message construction and make_logger with inspect.stack() against level-gated lazy logging,
+# in a loop like a monitor cycle with debug disabled
+# usage: python lazyLoggingTest.py [nWorkers] [nCycles]
+
+nWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+nCycles = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+_logger = core_utils.setup_logger('lazyLoggingTest')
+_logger.setLevel(logging.INFO)
+
+workSpecs = []
+filesToStageOut = dict(('file_{0}'.format(i), [{'path': '/tmp/file_{0}'.format(i)}]) for i in range(10))
+for i in range(nWorkers):
+    workSpec = WorkSpec()
+    workSpec.workerID = i
+    workSpec.status = WorkSpec.ST_running
+    workSpecs.append(workSpec)
+
+
+# old make_logger
+def make_logger_eager(tmp_log, token=None, method_name=None, hook=None):
+    if method_name is None:
+        tmpStr = inspect.stack()[1][3]
+    else:
+        tmpStr = method_name
+    if token is not None:
+        tmpStr += ' <{0}>'.format(token)
+    else:
+        tmpStr += ' :'
+    return LogWrapper(tmp_log, tmpStr, seeMem=False, hook=hook)
+
+
+def cycle_eager():
+    mainLog = make_logger_eager(_logger)
+    mainLog.debug('got {0}'.format(str(workSpecs)))
+    for workSpec in workSpecs:
+        tmpLog = make_logger_eager(_logger, 'workerID={0}'.format(workSpec.workerID))
+        tmpLog.debug('newStatus={0} postProcessed={1} files={2}'.format(workSpec.status, workSpec.is_post_processed(),
+                                                                        str(filesToStageOut)))
+
+
+def cycle_lazy():
+    mainLog = core_utils.make_logger(_logger)
+    mainLog.debug('got %s', workSpecs)
+    for workSpec in workSpecs:
+        tmpLog = core_utils.make_logger(_logger, 'workerID={0}'.format(workSpec.workerID))
+        tmpLog.debug('newStatus=%s postProcessed=%s files=%s', workSpec.status, workSpec.is_post_processed(),
+                     filesToStageOut)
+
+
+for label, func in [('eager', cycle_eager), ('lazy', cycle_lazy)]:
+    profile = cProfile.Profile()
+    sTime = time.time()
+    profile.enable()
+    for i in range(nCycles):
+        func()
+    profile.disable()
+    print('nWorkers={0} nCycles={1} {2:6} : {3:.3f} sec, {4} function calls'.format(
+        nWorkers, nCycles, label, time.time() - sTime, pstats.Stats(profile).total_calls))
+
+# messages are still built when enabled
+_logger.setLevel(logging.DEBUG)
+tmpLog = core_utils.make_logger(_logger, method_name='check')
+assert tmpLog.is_enabled_for(logging.DEBUG)
+assert tmpLog.make_message('a=%s b=%s', (1, [2])) == 'a=1 b=[2]'
+assert tmpLog.make_message(lambda: 'c={0}'.format(3), ()) == 'c=3'
+assert tmpLog.make_message('100%', ()) == '100%'
+assert core_utils.make_logger(_logger).prefix == '<module> :'
+
+# minMessageLevel is normalized as in DBInterface.add_dialog_message, even if lowercase or invalid
+from pandaharvester.harvesterconfig import harvester_config
+
+
+class DummyHook(object):
+    def __init__(self):
+        self.messages = []
+
+    def add_dialog_message(self, message, level, module_name, identifier=None):
+        self.messages.append((level, message))
+
+
+_logger.setLevel(logging.CRITICAL)
+for minMessageLevel, minLevel in [('error', logging.ERROR), ('Info', logging.INFO), ('WARNING', logging.WARNING),
+                                  ('basicConfig', logging.WARNING), ('unknown', logging.WARNING)]:
+    harvester_config.propagator.minMessageLevel = minMessageLevel
+    core_utils.dialogMinLevel = core_utils.get_dialog_min_level()
+    assert core_utils.dialogMinLevel == minLevel, (minMessageLevel, core_utils.dialogMinLevel)
+    hook = DummyHook()
+    tmpLog = core_utils.make_logger(_logger, method_name='check', hook=hook)
+    tmpLog.debug('d')
+    tmpLog.info('i')
+    tmpLog.warning('w')
+    tmpLog.error('e')
+    assert [level for level, message in hook.messages if level != 'DEBUG'] == \
+        [level for level, levelNum in [('INFO', logging.INFO), ('WARNING', logging.WARNING), ('ERROR', logging.ERROR)]
+         if levelNum >= minLevel], (minMessageLevel, hook.messages)
+print('minMessageLevel normalization OK')
@@ -0,0 +1,133 @@
+import os
+import ssl
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import json
+
+try:
+    from urllib.parse import parse_qs
+except ImportError:
+    from urlparse import parse_qs
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+from pandaharvester.harvesterconfig import harvester_config
+from pandaharvester.harvestercore.job_spec import JobSpec
+from pandaharvester.harvestercommunicator.panda_communicator import PandaCommunicator
+
+# measure per-call latency of PandaCommunicator against a local HTTPS server requiring client certificates
+# with and without keep-alive sessions, and update_jobs with and without concurrent chunks
+# usage: python pandaSessionTest.py [nCalls] [nJobs]
+
+nCalls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+nJobs = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+# server-side processing time of updateJobsInBulk in sec
+bulkDelay = 0.2
+
+# self-signed certificate used as server cert, client cert, and CA
+tmpDir = tempfile.mkdtemp()
+certFile = os.path.join(tmpDir, 'cert.pem')
+keyFile = os.path.join(tmpDir, 'key.pem')
+subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                       '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost',
+                       '-keyout', keyFile, '-out', certFile],
+                      stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # not to wait for delayed ACK between header and body on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.endswith('updateJobsInBulk'):
+            time.sleep(bulkDelay)
+            jobList = json.loads(parse_qs(data.decode())['jobList'][0])
+            retMaps = [{'content': json.dumps({'StatusCode': 0, 'PandaID': tmpData['jobId']})}
+                       for tmpData in jobList]
+            body = json.dumps([True, retMaps]).encode()
+        else:
+            body = b'{"StatusCode": 0}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+server = Server(('localhost', 0), Handler)
+context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+context.load_cert_chain(certFile, keyFile)
+context.load_verify_locations(certFile)
+context.verify_mode = ssl.CERT_REQUIRED
+server.socket = context.wrap_socket(server.socket, server_side=True)
+thr = threading.Thread(target=server.serve_forever)
+thr.daemon = True
+thr.start()
+
+harvester_config.pandacon.pandaURLSSL = 'https://localhost:{0}/server/panda'.format(server.server_address[1])
+harvester_config.pandacon.ca_cert = certFile
+harvester_config.pandacon.cert_file = certFile
+harvester_config.pandacon.key_file = keyFile
+harvester_config.pandacon.verbose = False
+
+for useSession in [False, True]:
+    harvester_config.pandacon.useSession = useSession
+    communicator = PandaCommunicator()
+    sTime = time.time()
+    for i in range(nCalls):
+        tmpStat, tmpRes = communicator.post_ssl('isAlive', {'dummy': i})
+        assert tmpStat, tmpRes
+    timeConsumed = time.time() - sTime
+    print('useSession={0} : {1} calls, {2:.2f} ms / call'.format(useSession, nCalls,
+                                                               1000. * timeConsumed / nCalls))
+    communicator.close_sessions()
+
+# session is renewed when certificate is modified
+harvester_config.pandacon.useSession = True
+communicator = PandaCommunicator()
+communicator.post_ssl('isAlive', {})
+oldSession = communicator.get_session((certFile, keyFile))
+os.utime(certFile, (time.time() + 10, time.time() + 10))
+communicator.post_ssl('isAlive', {})
+print('session renewed after cert change : {0}'.format(communicator.get_session((certFile, keyFile)) is not oldSession))
+
+
+# update jobs
+jobSpecs = []
+for i in range(nJobs):
+    jobSpec = JobSpec()
+    jobSpec.PandaID = i
+    jobSpec.computingSite = 'TEST'
+    jobSpec.status = 'running'
+    jobSpec.jobAttributes = {}
+    jobSpecs.append(jobSpec)
+for nThreads in [1, 4]:
+    harvester_config.pandacon.nUpdateJobsThreads = nThreads
+    communicator = PandaCommunicator()
+    sTime = time.time()
+    retList = communicator.update_jobs(jobSpecs, 'test')
+    timeConsumed = time.time() - sTime
+    assert [retMap['PandaID'] for retMap in retList] == list(range(nJobs))
+    print('nUpdateJobsThreads={0} : updated {1} jobs in {2:.2f} sec'.format(nThreads, nJobs, timeConsumed))
+    communicator.close_sessions()
+
+server.shutdown()
+shutil.rmtree(tmpDir)
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import stat
+import shutil
+import tempfile
+
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestermonitor.pbs_monitor import PBSMonitor
+from pandaharvester.harvestersweeper.pbs_sweeper import PBSSweeper
+
+# compare per-worker and bulk operations of PBSMonitor and PBSSweeper with fake qstat and qdel
+# which take serverTime sec per invocation
+# usage: python pbsPluginTest.py [nWorkers] [serverTime]
+
+nWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+serverTime = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+
+# running if jobID % 3 == 0, completed if jobID % 3 == 1, otherwise unknown.
+# the command fails without output when given the job in PBS_TEST_BROKEN_JOB
+fakeCommand = """#!{python}
+import os
+import sys
+import time
+time.sleep({serverTime})
+with open(os.path.join(os.path.dirname(sys.argv[0]), 'counter'), 'a') as f:
+    f.write(os.path.basename(sys.argv[0]) + '\\n')
+name = os.path.basename(sys.argv[0])
+jobIDs = [a for a in sys.argv[1:] if not a.startswith('-')]
+if os.environ.get('PBS_TEST_BROKEN_JOB') in jobIDs:
+    sys.stderr.write('{{0}}: cannot connect to server\\n'.format(name))
+    sys.exit(1)
+retCode = 0
+for jobID in jobIDs:
+    state = {{0: 'R', 1: 'C'}}.get(int(jobID.split('.')[0]) % 3)
+    if state is None:
+        sys.stderr.write('{{0}}: Unknown Job Id Error {{1}}\\n'.format(name, jobID))
+        retCode = 153
+    elif name == 'qdel':
+        pass
+    elif '-f' in sys.argv:
+        print('Job Id: {{0}}.example.org'.format(jobID))
+        print('    Job_Name = pilot')
+        print('    job_state = {{0}}'.format(state))
+        print('    queue = batch')
+        print('')
+    else:
+        print('Job ID                    Name             User            Time Use S Queue')
+        print('------------------------- ---------------- --------------- -------- - -----')
+        print('{{0:25}} pilot            atlas           00:00:01 {{1}} batch'.format(jobID, state))
+sys.exit(retCode)
+"""
+
+tmpDir = tempfile.mkdtemp()
+binDir = os.path.join(tmpDir, 'bin')
+os.makedirs(binDir)
+for name in ['qstat', 'qdel']:
+    tmpPath = os.path.join(binDir, name)
+    with open(tmpPath, 'w') as f:
+        f.write(fakeCommand.format(python=sys.executable, serverTime=serverTime))
+    os.chmod(tmpPath, os.stat(tmpPath).st_mode | stat.S_IEXEC)
+os.environ['PATH'] = binDir + os.pathsep + os.environ['PATH']
+counterFile = os.path.join(binDir, 'counter')
+
+workSpecs = []
+for i in range(nWorkers):
+    workSpec = WorkSpec()
+    workSpec.workerID = i
+    workSpec.batchID = '{0}.server'.format(1000 + i)
+    workSpec.status = WorkSpec.ST_submitted
+    workSpecs.append(workSpec)
+expectedStatus = [(WorkSpec.ST_running if i % 3 == 0 else WorkSpec.ST_finished) for i in range(1000, 1000 + nWorkers)]
+# the broken job is left unchanged while the others are checked one by one
+brokenJobID = '{0}.server'.format(1000 + nWorkers - 1)
+expectedBrokenShard = expectedStatus[:-1] + [WorkSpec.ST_submitted]
+expectedKill = [(i % 3 != 2) for i in range(1000, 1000 + nWorkers)]
+
+
+def run(label, func, expected):
+    if os.path.exists(counterFile):
+        os.remove(counterFile)
+    sTime = time.time()
+    retList = func()
+    timeConsumed = time.time() - sTime
+    assert retList == expected
+    with open(counterFile) as f:
+        nCommands = len(f.readlines())
+    print('{0:30} : {1:.1f} workers/sec with {2} commands'.format(label, nWorkers / timeConsumed, nCommands))
+
+
+def check(monitor):
+    tmpStat, retList = monitor.check_workers(workSpecs)
+    assert tmpStat
+    return [newStatus for newStatus, errStr in retList]
+
+
+sweeper = PBSSweeper()
+run('qstat one by one', lambda: check(PBSMonitor()), expectedStatus)
+run('qstat in bulk', lambda: check(PBSMonitor(useBulkQuery=True)), expectedStatus)
+# a failed shard falls back to one by one even if other shards reported unknown jobs
+os.environ['PBS_TEST_BROKEN_JOB'] = brokenJobID
+run('qstat in bulk, broken shard', lambda: check(PBSMonitor(useBulkQuery=True,
+                                                            maxJobsPerQuery=max(1, nWorkers // 5))),
+    expectedBrokenShard)
+del os.environ['PBS_TEST_BROKEN_JOB']
+run('qdel one by one', lambda: [sweeper.kill_worker(workSpec)[0] for workSpec in workSpecs], expectedKill)
+run('qdel in bulk', lambda: [tmpStat for tmpStat, errStr in sweeper.kill_workers(workSpecs)], expectedKill)
+shutil.rmtree(tmpDir)
@@ -0,0 +1,104 @@
+import sys
+import time
+import threading
+
+from pandaharvester.harvestercore.plugin_base import PluginBase
+from pandaharvester.harvestercore.plugin_factory import PluginFactory
+
+# measure time agents spend in PluginFactory.get_plugin for plugins with heavy setup, with and without
+# instance caching
+# usage: python pluginFactoryTest.py [nQueues] [nCycles] [setupTime]
+
+nQueues = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+nCycles = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+setupTime = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+nThreads = 3
+
+
+# plugin with heavy setup like a client for batch system
+class HeavyPlugin(PluginBase):
+    def __init__(self, **kwarg):
+        PluginBase.__init__(self, **kwarg)
+        time.sleep(setupTime)
+
+
+class CachedPlugin(HeavyPlugin):
+    instanceCacheable = True
+    threadSafe = True
+
+
+class PerThreadPlugin(HeavyPlugin):
+    instanceCacheable = True
+
+
+def make_conf(class_name, queue_name, param=0):
+    return {'module': '__main__', 'name': class_name, 'queueName': queue_name, 'param': param}
+
+
+# agent threads get plugins per queue in each cycle
+def run(class_name):
+    pluginFactory = PluginFactory(no_db=True)
+
+    def agent():
+        for i in range(nCycles):
+            for j in range(nQueues):
+                pluginFactory.get_plugin(make_conf(class_name, 'QUEUE_{0}'.format(j)))
+
+    sTime = time.time()
+    threads = [threading.Thread(target=agent) for i in range(nThreads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = pluginFactory.get_stats()['__main__.{0}'.format(class_name)]
+    print('nQueues={0} nCycles={1} nThreads={2} {3:16} : {4:.3f} sec, stats {5}'.format(
+        nQueues, nCycles, nThreads, class_name, time.time() - sTime, stats))
+    return stats
+
+
+assert run('HeavyPlugin')['constructed'] == nQueues * nCycles * nThreads
+assert run('CachedPlugin')['constructed'] == nQueues
+assert run('PerThreadPlugin')['constructed'] == nQueues * nThreads
+
+pluginFactory = PluginFactory(no_db=True)
+# shared and reused
+impl = pluginFactory.get_plugin(make_conf('CachedPlugin', 'QUEUE_0'))
+assert pluginFactory.get_plugin(make_conf('CachedPlugin', 'QUEUE_0')) is impl
+# evicted when queue config changes
+newImpl = pluginFactory.get_plugin(make_conf('CachedPlugin', 'QUEUE_0', param=1))
+assert newImpl is not impl and newImpl.param == 1
+assert pluginFactory.get_plugin(make_conf('CachedPlugin', 'QUEUE_0', param=1)) is newImpl
+assert pluginFactory.get_stats()['__main__.CachedPlugin']['evicted'] == 1
+
+# evicted in all threads when queues are removed or rebuilt by QueueConfigMapper
+from pandaharvester.harvestercore import plugin_factory
+
+evictedBefore = pluginFactory.get_stats()['__main__.PerThreadPlugin']['evicted']
+gotten = []
+toEvict = threading.Event()
+evicted = threading.Event()
+
+
+def agent_to_evict():
+    gotten.append(pluginFactory.get_plugin(make_conf('PerThreadPlugin', 'QUEUE_REMOVED')))
+    toEvict.set()
+    evicted.wait()
+    gotten.append(pluginFactory.get_plugin(make_conf('PerThreadPlugin', 'QUEUE_REMOVED')))
+
+
+thread = threading.Thread(target=agent_to_evict)
+thread.start()
+toEvict.wait()
+pluginFactory.evict_instances(['QUEUE_REMOVED'])
+evicted.set()
+thread.join()
+assert gotten[0] is not gotten[1]
+assert pluginFactory.get_stats()['__main__.PerThreadPlugin']['evicted'] == evictedBefore + 1
+assert pluginFactory.get_plugin(make_conf('CachedPlugin', 'QUEUE_1')) is not None
+pluginFactory.evict_instances(['QUEUE_1'])
+assert not [cacheKey for cacheKey in plugin_factory.sharedInstances if cacheKey[1] == 'QUEUE_1']
+# instances of finished threads are not kept
+del thread, gotten
+import gc
+gc.collect()
+assert len(plugin_factory.instanceMaps) <= 2
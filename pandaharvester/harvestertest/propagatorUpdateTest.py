@@ -0,0 +1,181 @@
+import sys
+import time
+import datetime
+
+from pandaharvester.harvesterconfig import harvester_config
+from pandaharvester.harvestercore import db_proxy
+from pandaharvester.harvestercore.db_proxy import DBProxy
+from pandaharvester.harvestercore.job_spec import JobSpec
+from pandaharvester.harvestercore.file_spec import FileSpec
+from pandaharvester.harvestercore.work_spec import WorkSpec
+
+# compare per-row update_job/update_worker and update_jobs_bulk/update_workers_bulk as used by propagator
+# on the DB defined in panda_harvester.cfg
+# usage: python propagatorUpdateTest.py [nJobs]
+
+nJobs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+# offset of IDs not to collide with real jobs and workers
+idOffset = 10 ** 12
+lockedBy = 'propagatorUpdateTest'
+
+proxy = DBProxy()
+
+# count round-trips
+nExec = [0]
+origExecute = proxy.execute
+origExecuteMany = proxy.executemany
+origCommit = proxy.commit
+
+
+def counting_execute(sql, varmap=None):
+    nExec[0] += 1
+    return origExecute(sql, varmap)
+
+
+def counting_executemany(sql, varmap_list):
+    nExec[0] += 1
+    return origExecuteMany(sql, varmap_list)
+
+
+proxy.execute = counting_execute
+proxy.executemany = counting_executemany
+
+
+def clean_up():
+    varMap = dict()
+    varMap[':low'] = idOffset
+    for tableName, keyName in [(db_proxy.jobTableName, 'PandaID'), (db_proxy.fileTableName, 'PandaID'),
+                               (db_proxy.workTableName, 'workerID')]:
+        origExecute('DELETE FROM {0} WHERE {1}>=:low'.format(tableName, keyName), varMap)
+    origCommit()
+
+
+# every tenth job is locked by another propagator
+def populate():
+    clean_up()
+    sqlJ = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.jobTableName, JobSpec.column_names(),
+                                              JobSpec.bind_values_expression())
+    sqlF = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.fileTableName, FileSpec.column_names(),
+                                              FileSpec.bind_values_expression())
+    sqlW = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.workTableName, WorkSpec.column_names(),
+                                              WorkSpec.bind_values_expression())
+    varMapsJ, varMapsF, varMapsW = [], [], []
+    for i in range(nJobs):
+        jobSpec = JobSpec()
+        jobSpec.PandaID = idOffset + i
+        jobSpec.status = 'running'
+        jobSpec.propagatorLock = lockedBy if i % 10 != 0 else 'another'
+        varMapsJ.append(jobSpec.values_map())
+        fileSpec = FileSpec()
+        fileSpec.fileID = idOffset + i
+        fileSpec.PandaID = jobSpec.PandaID
+        fileSpec.fileType = 'input'
+        fileSpec.status = 'ready'
+        varMapsF.append(fileSpec.values_map())
+        workSpec = WorkSpec()
+        workSpec.workerID = idOffset + i
+        workSpec.status = WorkSpec.ST_running
+        varMapsW.append(workSpec.values_map())
+    origExecuteMany(sqlJ, varMapsJ)
+    origExecuteMany(sqlF, varMapsF)
+    origExecuteMany(sqlW, varMapsW)
+    origCommit()
+
+
+# specs changed like propagator does. a third of jobs and workers are finished
+def make_specs():
+    timeNow = datetime.datetime.utcnow().replace(microsecond=0)
+    jobSpecs, workSpecs = [], []
+    for i in range(nJobs):
+        jobSpec = JobSpec()
+        jobSpec.PandaID = idOffset + i
+        jobSpec.status = 'running'
+        jobSpec.reset_changed_list()
+        jobSpec.propagatorLock = None
+        if i % 3 == 0:
+            jobSpec.status = 'finished'
+            jobSpec.propagatorTime = None
+            jobSpec.subStatus = 'done'
+            jobSpec.modificationTime = timeNow
+        jobSpecs.append(jobSpec)
+        workSpec = WorkSpec()
+        workSpec.workerID = idOffset + i
+        workSpec.status = WorkSpec.ST_running
+        workSpec.reset_changed_list()
+        if i % 3 == 0:
+            workSpec.status = WorkSpec.ST_finished
+            workSpec.disable_propagation()
+        workSpecs.append(workSpec)
+    return jobSpecs, workSpecs
+
+
+def dump():
+    varMap = dict()
+    varMap[':low'] = idOffset
+    retVal = []
+    for sql in ['SELECT PandaID,status,subStatus,propagatorLock FROM {0} WHERE PandaID>=:low ORDER BY PandaID',
+                'SELECT fileID,status,todelete FROM {1} WHERE PandaID>=:low ORDER BY fileID',
+                'SELECT workerID,status,lastUpdate FROM {2} WHERE workerID>=:low ORDER BY workerID']:
+        origExecute(sql.format(db_proxy.jobTableName, db_proxy.fileTableName, db_proxy.workTableName), varMap)
+        retVal.append(proxy.cur.fetchall())
+    origCommit()
+    return retVal
+
+
+def run(label, func):
+    populate()
+    jobSpecs, workSpecs = make_specs()
+    nExec[0] = 0
+    sTime = time.time()
+    retVal = func(jobSpecs, workSpecs)
+    timeConsumed = time.time() - sTime
+    print('engine={0} nJobs={1} {2:12} : {3} statements in {4:.3f} sec'.format(
+        harvester_config.db.engine, nJobs, label, nExec[0], timeConsumed))
+    return retVal, dump()
+
+
+def one_by_one(job_specs, work_specs):
+    retJobs = [proxy.update_job(jobSpec, {'propagatorLock': lockedBy}) for jobSpec in job_specs]
+    retWorkers = [proxy.update_worker(workSpec, {'workerID': workSpec.workerID}) for workSpec in work_specs]
+    return retJobs, retWorkers
+
+
+def bulk(job_specs, work_specs):
+    retJobs = proxy.update_jobs_bulk(job_specs, {'propagatorLock': lockedBy})
+    retWorkers = proxy.update_workers_bulk(work_specs)
+    return retJobs, retWorkers
+
+
+retOneByOne = run('one by one', one_by_one)
+retBulk = run('bulk', bulk)
+assert retOneByOne == retBulk
+clean_up()
+
+# other processes cannot change rows between SELECT and UPDATE, since FOR UPDATE is removed for sqlite
+if harvester_config.db.engine == 'sqlite':
+    import sqlite3
+    populate()
+    jobSpecs, workSpecs = make_specs()
+    origGetIDs = proxy._get_ids_to_update
+    otherResult = []
+
+    def get_ids_and_steal_lock(*args):
+        retVal = origGetIDs(*args)
+        otherCon = sqlite3.connect(harvester_config.db.database_filename, timeout=0.2)
+        try:
+            otherCon.execute('UPDATE {0} SET propagatorLock=:lock WHERE PandaID=:PandaID'.format(
+                db_proxy.jobTableName), {'lock': 'another', 'PandaID': idOffset + 3})
+            otherCon.commit()
+            otherResult.append('updated')
+        except sqlite3.OperationalError:
+            otherResult.append('blocked')
+        otherCon.close()
+        return retVal
+
+    proxy._get_ids_to_update = get_ids_and_steal_lock
+    retJobs = proxy.update_jobs_bulk(jobSpecs, {'propagatorLock': lockedBy})
+    proxy._get_ids_to_update = origGetIDs
+    assert otherResult == ['blocked']
+    assert retJobs[3] == 1 and dump()[0][3]['status'] == 'finished'
+    clean_up()
@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import shutil
+import datetime
+import tempfile
+import threading
+
+from pandaharvester.harvesterconfig import harvester_config
+from pandaharvester.harvestercore.db_proxy import DBProxy
+from pandaharvester.harvestercore.queue_config_mapper import QueueConfigMapper
+
+# measure startup and reload time of QueueConfigMapper with many queues in a local queue config file,
+# and the longest time a reader waits in get_queue during reloads. Fake PanDA queues are cached under
+# the test key and resolved by PandaQueuesDict on the DB defined in panda_harvester.cfg. Note that pq_table is
+# overwritten, so use a test DB
+# usage: python queueConfigReloadTest.py [nQueues] [nChanged]
+
+nQueues = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+nChanged = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+nTemplates = 20
+
+cacherKey = 'panda_queues.json_queueConfigReloadTest'
+
+# plugin sections of templates
+pluginSections = {'preparator': 'pandaharvester.harvesterpreparator.dummy_preparator.DummyPreparator',
+                  'submitter': 'pandaharvester.harvestersubmitter.dummy_submitter.DummySubmitter',
+                  'workerMaker': 'pandaharvester.harvesterworkermaker.simple_worker_maker.SimpleWorkerMaker',
+                  'messenger': 'pandaharvester.harvestermessenger.shared_file_messenger.SharedFileMessenger',
+                  'stager': 'pandaharvester.harvesterstager.dummy_stager.DummyStager',
+                  'monitor': 'pandaharvester.harvestermonitor.dummy_monitor.DummyMonitor',
+                  'sweeper': 'pandaharvester.harvestersweeper.dummy_sweeper.DummySweeper'}
+
+
+def make_queue_config(n_changed):
+    queueConfigJson = dict()
+    for i in range(nTemplates):
+        templateDict = {'isTemplateQueue': True, 'prodSourceLabel': 'managed', 'maxWorkers': 100,
+                        'common': {'payloadType': 'atlas_pilot_wrapper'}}
+        for key, val in pluginSections.items():
+            moduleName, className = val.rsplit('.', 1)
+            templateDict[key] = {'module': moduleName, 'name': className, 'param_{0}'.format(i): i}
+        queueConfigJson['TEMPLATE_{0}'.format(i)] = templateDict
+    for i in range(nQueues):
+        queueDict = {'templateQueueName': 'TEMPLATE_{0}'.format(i % nTemplates),
+                     'nQueueLimitWorker': 10 + (1 if i < n_changed else 0),
+                     'submitter': {'nCorePerNode': 8}}
+        queueConfigJson['QUEUE_{0}'.format(i)] = queueDict
+    return queueConfigJson
+
+
+def write_queue_config(n_changed):
+    tmpFileName = confFilePath + '.tmp'
+    with open(tmpFileName, 'w') as f:
+        json.dump(make_queue_config(n_changed), f)
+    os.rename(tmpFileName, confFilePath)
+
+
+# reader calling get_queue during reloads
+maxWait = [0]
+toStop = threading.Event()
+
+
+def reader(mapper):
+    while not toStop.is_set():
+        sTime = time.time()
+        mapper.get_queue('QUEUE_0')
+        maxWait[0] = max(maxWait[0], time.time() - sTime)
+        time.sleep(0.001)
+
+
+def reload(label, mapper):
+    maxWait[0] = 0
+    # expire the current config
+    mapper.lastUpdate = datetime.datetime(2000, 1, 1)
+    sTime = time.time()
+    mapper.load_data()
+    timeConsumed = time.time() - sTime
+    # wait for the reader to come back
+    time.sleep(0.1)
+    print('nQueues={0} {1:22} : {2:.3f} sec, reader waited max {3:.3f} sec'.format(
+        nQueues, label, timeConsumed, maxWait[0]))
+
+
+tmpDir = tempfile.mkdtemp()
+confFilePath = os.path.join(tmpDir, 'panda_queueconfig.json')
+write_queue_config(0)
+harvester_config.qconf.configFile = confFilePath
+harvester_config.qconf.queueList = ['ALL']
+proxy = DBProxy()
+pandaQueues = dict()
+for i in range(nQueues):
+    pandaQueues['PQ_{0}'.format(i)] = {'nickname': 'PQ_{0}'.format(i), 'panda_resource': 'QUEUE_{0}'.format(i)}
+proxy.refresh_cache(cacherKey, None, pandaQueues)
+from pandaharvester.harvestermisc import info_utils
+origInit = info_utils.PandaQueuesDict.__init__
+info_utils.PandaQueuesDict.__init__ = lambda self, **kwarg: origInit(self, cacher_key=cacherKey, **kwarg)
+
+queueConfigMapper = QueueConfigMapper()
+sTime = time.time()
+queueConfigMapper.load_data()
+print('nQueues={0} {1:22} : {2:.3f} sec'.format(nQueues, 'startup', time.time() - sTime))
+assert queueConfigMapper.get_queue('QUEUE_1').pandaQueueName == 'PQ_1'
+readerThread = threading.Thread(target=reader, args=(queueConfigMapper,))
+readerThread.start()
+reload('reload without changes', queueConfigMapper)
+write_queue_config(nChanged)
+reload('reload with {0} changes'.format(nChanged), queueConfigMapper)
+assert queueConfigMapper.get_queue('QUEUE_0').nQueueLimitWorker == 11
+assert queueConfigMapper.get_queue('QUEUE_{0}'.format(nChanged)).nQueueLimitWorker == 10
+toStop.set()
+readerThread.join()
+# same as full rebuild
+if hasattr(queueConfigMapper, 'queueHashes'):
+    incrementalConfig = dict((queueName, str(queueConfig))
+                             for queueName, queueConfig in queueConfigMapper.get_all_queues().items())
+    queueConfigMapper.sourceHashes = dict()
+    queueConfigMapper.queueHashes = dict()
+    reload('full rebuild', queueConfigMapper)
+    fullConfig = dict((queueName, str(queueConfig))
+                      for queueName, queueConfig in queueConfigMapper.get_all_queues().items())
+    assert incrementalConfig == fullConfig
+# clean up
+shutil.rmtree(tmpDir)
+proxy.execute('DELETE FROM cache_table WHERE mainKey=:mainKey', {':mainKey': cacherKey})
+proxy.execute('DELETE FROM pq_table')
+proxy.commit()
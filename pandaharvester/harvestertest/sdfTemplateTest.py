@@ -0,0 +1,95 @@
+import os
+import re
+import sys
+import time
+import tempfile
+
+from pandaharvester.harvestersubmitter.htcondor_submitter import sdf_template_cache
+
+# compare reading and formatting an SDF template per worker with the SDF template cache
+# usage: python sdfTemplateTest.py [nWorkers]
+
+nWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+template = """executable = {executableFile}
+arguments = -s {computingSite} -h {pandaQueueName} -u {prodSourceLabel} -f false -C 0 -p 25443 -w https://pandaserver.cern.ch
+initialdir = {accessPoint}
+universe = grid
+log = {logDir}/{logSubdir}/grid.$(Cluster).$(Process).log
+output = {logDir}/{logSubdir}/grid.$(Cluster).$(Process).out
+error = {logDir}/{logSubdir}/grid.$(Cluster).$(Process).err
+transfer_executable = True
+x509userproxy = {x509UserProxy}
+environment = "PANDA_JSID=harvester-{harvesterID} HARVESTER_ID={harvesterID} HARVESTER_WORKER_ID={workerID} GTAG={gtag}"
++harvesterID = "{harvesterID}"
+transfer_input_files = pandaJobData.out
+
+grid_resource = condor {ceHostname} {ceEndpoint}
++remote_jobuniverse = 5
++remote_ShouldTransferFiles = "YES"
++remote_WhenToTransferOutput = "ON_EXIT_OR_EVICT"
++remote_TransferOutput = ""
+#+remote_RequestCpus = {nCoreTotal}
+#+remote_RequestMemory = {requestRam}
++ioIntensity = {ioIntensity}
+
++xcount = {nCoreTotal}
++maxMemory = {requestRam}
++remote_queue = "{ceQueueName}"
++maxWallTime = {requestWalltimeMinute}
+
+periodic_remove = (JobStatus == 2 && (CurrentTime - EnteredCurrentStatus) > 604800)
+
++sdfPath = "{sdfPath}"
+
+queue 1
+"""
+
+tmpFile = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.sdf')
+tmpFile.write(template)
+tmpFile.close()
+
+commonFields = dict(executableFile='/usr/bin/runpilot2-wrapper.sh', pandaQueueName='CERN-PROD',
+                    logDir='/data/condor_logs', logSubdir='19-01-01_00', x509UserProxy='/data/proxy',
+                    harvesterID='CERN_central_A', ceHostname='ce503.cern.ch', ceEndpoint='ce503.cern.ch:9619',
+                    ceQueueName='nordugrid-Condor-grid')
+
+
+def worker_fields(i):
+    return dict(computingSite='CERN-PROD', prodSourceLabel='managed', accessPoint='/data/workers/{0}'.format(i),
+                workerID=i, gtag='https://logs/{0}.out'.format(i), nCoreTotal=8, requestRam=16000, ioIntensity=0,
+                requestWalltimeMinute=2880, sdfPath='/data/workers/{0}/submit.sdf'.format(i))
+
+
+# read, split, and format per worker as before
+def render_without_cache(i):
+    with open(tmpFile.name) as f:
+        sdf_template_raw = f.read()
+    sdf_template_str_list = []
+    for _line in sdf_template_raw.split('\n'):
+        if _line.startswith('#'):
+            continue
+        sdf_template_str_list.append(_line)
+        re.match('log = (.+)', _line)
+        re.match('output = (.+)', _line)
+        re.match('error = (.+)', _line)
+    sdf_template = '\n'.join(sdf_template_str_list)
+    return sdf_template.format(**dict(commonFields, **worker_fields(i)))
+
+
+# cached template with common fields filled once
+def render_with_cache(i):
+    sdf_template = sdf_template_cache.get(tmpFile.name)[0]
+    return sdf_template.partial(**commonFields).render(**worker_fields(i))
+
+
+for i in range(10):
+    assert render_without_cache(i) == render_with_cache(i)
+for label, func in [('without cache', render_without_cache), ('with cache', render_with_cache)]:
+    sTime = time.time()
+    for i in range(nWorkers):
+        func(i)
+    timeConsumed = time.time() - sTime
+    print('{0:15} : {1} SDFs in {2:.3f} sec, {3:.1f} us / SDF'.format(label, nWorkers, timeConsumed,
+                                                                        1e6 * timeConsumed / nWorkers))
+os.remove(tmpFile.name)
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestermessenger import shared_file_messenger
+from pandaharvester.harvestermessenger.shared_file_messenger import SharedFileMessenger
+
+# compare file system calls of per-worker messenger methods and the bulk get_monitor_info
+# of SharedFileMessenger over a synthetic tree of access points
+# usage: python sharedFileMessengerTest.py [nWorkers] [baseDir]
+
+nWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+baseDir = tempfile.mkdtemp(dir=sys.argv[2] if len(sys.argv) > 2 else None)
+heartbeatLimit = 60
+
+# count calls of file system functions
+counter = dict()
+
+
+def count_calls(module, func_name):
+    origFunc = getattr(module, func_name)
+
+    def wrapped(*args, **kwargs):
+        counter[func_name] = counter.get(func_name, 0) + 1
+        return origFunc(*args, **kwargs)
+    setattr(module, func_name, wrapped)
+
+
+for funcName in ['stat', 'lstat', 'listdir', 'scandir', 'rename', 'remove']:
+    if hasattr(os, funcName):
+        count_calls(os, funcName)
+count_calls(builtins, 'open')
+
+# make access points with attributes, job report, and heartbeat. some have job requests or kill requests
+jobReport = {'exitCode': 0, 'resource': {'machine': {'node': 'node001'}},
+             'files': {'output': [{'subFiles': [{'name': 'out_{0}.root'.format(i)} for i in range(50)]}]}}
+workSpecs = []
+for i in range(nWorkers):
+    workSpec = WorkSpec()
+    workSpec.workerID = i
+    workSpec.accessPoint = os.path.join(baseDir, str(i))
+    workSpec.mapType = WorkSpec.MT_OneToOne
+    workSpec.eventsRequest = WorkSpec.EV_noEvents
+    workSpec.pandaid_list = [1000 + i]
+    os.makedirs(workSpec.accessPoint)
+    with open(os.path.join(workSpec.accessPoint, shared_file_messenger.jsonAttrsFileName), 'w') as f:
+        json.dump({'jobStatus': 'running', 'coreCount': 8}, f)
+    with open(os.path.join(workSpec.accessPoint, shared_file_messenger.jsonJobReport), 'w') as f:
+        json.dump(jobReport, f)
+    with open(os.path.join(workSpec.accessPoint, shared_file_messenger.heartbeatFile), 'w') as f:
+        f.write('{}')
+    if i % 100 == 0:
+        with open(os.path.join(workSpec.accessPoint, shared_file_messenger.killWorkerFile), 'w') as f:
+            f.write('{}')
+    if i % 50 == 1:
+        with open(os.path.join(workSpec.accessPoint, shared_file_messenger.jsonJobRequestFileName), 'w') as f:
+            json.dump({'nJobs': i % 7}, f)
+    workSpecs.append(workSpec)
+
+messenger = SharedFileMessenger()
+
+
+# per-worker methods as called by monitor
+def get_messenger_info(workspec):
+    retMap = dict()
+    retMap['jobRequested'] = messenger.job_requested(workspec)
+    retMap['killRequested'] = messenger.kill_requested(workspec)
+    retMap['isAlive'] = messenger.is_alive(workspec, heartbeatLimit)
+    retMap['workAttributes'] = messenger.get_work_attributes(workspec)
+    retMap['filesToStageOut'] = messenger.get_files_to_stage_out(workspec)
+    return retMap
+
+
+def run(label, func):
+    counter.clear()
+    sTime = time.time()
+    retList = func()
+    timeConsumed = time.time() - sTime
+    print('{0:30} : {1} workers in {2:.2f} sec, {3:.1f} calls/worker {4}'.format(
+        label, nWorkers, timeConsumed, sum(counter.values()) / float(nWorkers),
+        ' '.join(['{0}={1}'.format(k, v) for k, v in sorted(counter.items())])))
+    return retList
+
+
+retOneByOne = run('per-worker methods', lambda: [get_messenger_info(workSpec) for workSpec in workSpecs])
+retBulk = run('get_monitor_info first cycle', lambda: messenger.get_monitor_info(workSpecs, heartbeatLimit))
+assert retOneByOne == retBulk
+retBulk = run('get_monitor_info next cycle', lambda: messenger.get_monitor_info(workSpecs, heartbeatLimit))
+assert retOneByOne == retBulk
+# job requests only, without reading other files
+retOneByOne = run('job_requested', lambda: [messenger.job_requested(workSpec) for workSpec in workSpecs])
+retBulk = run('get_job_requested_bulk', lambda: messenger.get_job_requested_bulk(workSpecs))
+assert retOneByOne == retBulk
+assert set(counter) <= set(['stat', 'listdir', 'scandir', 'open'])
+shutil.rmtree(baseDir)
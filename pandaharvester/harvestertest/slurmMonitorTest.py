@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import stat
+import shutil
+import tempfile
+import threading
+
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestermonitor.slurm_monitor import SlurmMonitor
+
+# compare per-worker and bulk checks of SlurmMonitor with fake sacct and squeue
+# which take ctldTime sec per invocation
+# usage: python slurmMonitorTest.py [nWorkers] [ctldTime]
+
+nWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+ctldTime = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+nThreads = 4
+
+# batchID -> state; running if batchID is even, otherwise finished
+fakeCommand = """#!{python}
+import os
+import sys
+import time
+time.sleep({ctldTime})
+with open(os.path.join(os.path.dirname(sys.argv[0]), 'counter'), 'a') as f:
+    f.write(os.path.basename(sys.argv[0]) + '\\n')
+states = {{0: 'RUNNING', 1: 'COMPLETED'}}
+name = os.path.basename(sys.argv[0])
+args = dict([a.split('=', 1) for a in sys.argv[1:] if '=' in a])
+if name == 'squeue':
+    for i in range(0, {nWorkers}, 2):
+        print('{{0}}|RUNNING'.format(1000 + i))
+elif '--parsable2' in sys.argv:
+    for batchID in args['--jobs'].split(','):
+        state = states[int(batchID) % 2]
+        print('{{0}}|{{1}}|0:0'.format(batchID, state))
+        print('{{0}}.batch|{{1}}|0:0'.format(batchID, state))
+else:
+    batchID = args['--jobs']
+    state = states[int(batchID) % 2]
+    print('       JobID    JobName  Partition    Account  AllocCPUS      State ExitCode ')
+    print('------------ ---------- ---------- ---------- ---------- ---------- -------- ')
+    print('{{0:>12}}      pilot      batch      atlas          8 {{1:>10}}      0:0 '.format(batchID, state))
+"""
+
+tmpDir = tempfile.mkdtemp()
+binDir = os.path.join(tmpDir, 'bin')
+os.makedirs(binDir)
+for name in ['sacct', 'squeue']:
+    tmpPath = os.path.join(binDir, name)
+    with open(tmpPath, 'w') as f:
+        f.write(fakeCommand.format(python=sys.executable, ctldTime=ctldTime, nWorkers=nWorkers))
+    os.chmod(tmpPath, os.stat(tmpPath).st_mode | stat.S_IEXEC)
+os.environ['PATH'] = binDir + os.pathsep + os.environ['PATH']
+counterFile = os.path.join(binDir, 'counter')
+
+workSpecs = []
+for i in range(nWorkers):
+    workSpec = WorkSpec()
+    workSpec.workerID = i
+    workSpec.batchID = str(1000 + i)
+    workSpec.status = WorkSpec.ST_submitted
+    workSpecs.append(workSpec)
+expected = [(WorkSpec.ST_running if i % 2 == 0 else WorkSpec.ST_finished) for i in range(nWorkers)]
+
+
+def run(label, monitor, n_threads=1):
+    if os.path.exists(counterFile):
+        os.remove(counterFile)
+    chunkSize = nWorkers // n_threads
+    chunks = [workSpecs[i:i + chunkSize] for i in range(0, nWorkers, chunkSize)]
+    results = [None] * len(chunks)
+
+    def check(idx):
+        results[idx] = monitor.check_workers(chunks[idx])
+
+    sTime = time.time()
+    thrList = [threading.Thread(target=check, args=(idx,)) for idx in range(len(chunks))]
+    for thr in thrList:
+        thr.start()
+    for thr in thrList:
+        thr.join()
+    timeConsumed = time.time() - sTime
+    statusList = []
+    for tmpStat, retList in results:
+        assert tmpStat
+        statusList += [newStatus for newStatus, errStr in retList]
+    assert statusList == expected
+    with open(counterFile) as f:
+        nCommands = len(f.readlines())
+    print('{0:30} : {1} workers in {2:.2f} sec with {3} commands'.format(label, nWorkers, timeConsumed, nCommands))
+
+
+run('one by one', SlurmMonitor())
+run('bulk', SlurmMonitor(useBulkQuery=True))
+monitor = SlurmMonitor(useBulkQuery=True)
+monitor.cacheEnable = True
+monitor.cacheRefreshInterval = 60
+run('bulk with cache, {0} threads'.format(nThreads), monitor, nThreads)
+shutil.rmtree(tmpDir)
@@ -0,0 +1,60 @@
+import sys
+import time
+import datetime
+import collections
+
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestercore.job_spec import JobSpec
+from pandaharvester.harvestercore.file_spec import FileSpec
+
+# measure CPU time of common SpecBase operations
+# usage: python specBaseTest.py [nObjects]
+
+nObjects = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+
+def measure(label, func):
+    sTime = time.time()
+    func()
+    print('{0:40} : {1:.3f} sec'.format(label, time.time() - sTime))
+
+
+for cls in [WorkSpec, JobSpec, FileSpec]:
+    print('{0} x {1}'.format(cls.__name__, nObjects))
+    # DB rows as they come from the cursor
+    tmpObj = cls()
+    tmpObj.modificationTime = datetime.datetime.utcnow()
+    rowMap = dict([(attr[1:], val) for attr, val in tmpObj.values_map().items()])
+    Row = collections.namedtuple('Row', tmpObj.attributes)
+    row = Row(**rowMap)
+    objList = []
+
+    def construct():
+        for i in range(nObjects):
+            objList.append(cls())
+
+    def pack():
+        for obj in objList:
+            obj.pack(row)
+
+    def set_attributes():
+        for obj in objList:
+            obj.modificationTime = None
+            obj.modificationTime = tmpObj.modificationTime
+
+    def values_map():
+        for obj in objList:
+            obj.values_map()
+            obj.values_map(only_changed=True)
+
+    def sql_fragments():
+        for i in range(nObjects):
+            cls.column_names()
+            cls.column_names(prefix='t')
+            cls.bind_values_expression()
+
+    measure('constructor', construct)
+    measure('pack', pack)
+    measure('setattr', set_attributes)
+    measure('values_map', values_map)
+    measure('column_names/bind_values_expression', sql_fragments)
@@ -0,0 +1,130 @@
+import sys
+import time
+
+from pandaharvester.harvesterconfig import harvester_config
+from pandaharvester.harvestercore import db_proxy
+from pandaharvester.harvestercore.db_proxy import DBProxy
+from pandaharvester.harvestercore.job_spec import JobSpec
+from pandaharvester.harvestercore.file_spec import FileSpec
+from pandaharvester.harvestercore.event_spec import EventSpec
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestercore.job_worker_relation_spec import JobWorkerRelationSpec
+
+# compare per-worker delete_worker and delete_workers as used by sweeper on the DB defined in panda_harvester.cfg
+# usage: python sweeperCleanupTest.py [nWorkers] [nJobsPerWorker]
+
+nWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+nJobsPerWorker = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+# offset of IDs not to collide with real jobs and workers
+idOffset = 10 ** 12
+
+proxy = DBProxy()
+
+# count round-trips
+nExec = [0]
+origExecute = proxy.execute
+
+
+def counting_execute(sql, varmap=None):
+    nExec[0] += 1
+    return origExecute(sql, varmap)
+
+
+proxy.execute = counting_execute
+
+tableList = [(db_proxy.jobTableName, 'PandaID'), (db_proxy.fileTableName, 'PandaID'),
+             (db_proxy.eventTableName, 'PandaID'), (db_proxy.jobWorkerTableName, 'PandaID'),
+             (db_proxy.workTableName, 'workerID')]
+
+
+def clean_up():
+    varMap = dict()
+    varMap[':low'] = idOffset
+    for tableName, keyName in tableList:
+        origExecute('DELETE FROM {0} WHERE {1}>=:low'.format(tableName, keyName), varMap)
+    proxy.commit()
+
+
+# each worker has jobs with a file and events. Every tenth worker is not swept
+def populate():
+    clean_up()
+    sqlJ = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.jobTableName, JobSpec.column_names(),
+                                              JobSpec.bind_values_expression())
+    sqlF = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.fileTableName, FileSpec.column_names(),
+                                              FileSpec.bind_values_expression())
+    sqlE = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.eventTableName, EventSpec.column_names(),
+                                              EventSpec.bind_values_expression())
+    sqlR = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.jobWorkerTableName, JobWorkerRelationSpec.column_names(),
+                                              JobWorkerRelationSpec.bind_values_expression())
+    sqlW = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.workTableName, WorkSpec.column_names(),
+                                              WorkSpec.bind_values_expression())
+    varMapsJ, varMapsF, varMapsE, varMapsR, varMapsW = [], [], [], [], []
+    for i in range(nWorkers):
+        workSpec = WorkSpec()
+        workSpec.workerID = idOffset + i
+        workSpec.status = WorkSpec.ST_finished
+        varMapsW.append(workSpec.values_map())
+        for j in range(nJobsPerWorker):
+            pandaID = idOffset + i * nJobsPerWorker + j
+            jobSpec = JobSpec()
+            jobSpec.PandaID = pandaID
+            jobSpec.status = 'finished'
+            varMapsJ.append(jobSpec.values_map())
+            fileSpec = FileSpec()
+            fileSpec.fileID = pandaID
+            fileSpec.PandaID = pandaID
+            fileSpec.fileType = 'output'
+            varMapsF.append(fileSpec.values_map())
+            eventSpec = EventSpec()
+            eventSpec.eventRangeID = str(pandaID)
+            eventSpec.PandaID = pandaID
+            eventSpec.fileID = pandaID
+            varMapsE.append(eventSpec.values_map())
+            relationSpec = JobWorkerRelationSpec()
+            relationSpec.PandaID = pandaID
+            relationSpec.workerID = workSpec.workerID
+            varMapsR.append(relationSpec.values_map())
+    for sql, varMaps in [(sqlJ, varMapsJ), (sqlF, varMapsF), (sqlE, varMapsE), (sqlR, varMapsR),
+                         (sqlW, varMapsW)]:
+        proxy.executemany(sql, varMaps)
+    proxy.commit()
+
+
+def dump():
+    varMap = dict()
+    varMap[':low'] = idOffset
+    retVal = []
+    for tableName, keyName in tableList:
+        origExecute('SELECT {1} FROM {0} WHERE {1}>=:low ORDER BY {1}'.format(tableName, keyName), varMap)
+        retVal.append(proxy.cur.fetchall())
+    proxy.commit()
+    return retVal
+
+
+def run(label, func):
+    populate()
+    workerIDs = [idOffset + i for i in range(nWorkers) if i % 10 != 0]
+    nExec[0] = 0
+    sTime = time.time()
+    func(workerIDs)
+    timeConsumed = time.time() - sTime
+    print('engine={0} nWorkers={1} nJobsPerWorker={2} {3:12} : {4} statements in {5:.3f} sec'.format(
+        harvester_config.db.engine, nWorkers, nJobsPerWorker, label, nExec[0], timeConsumed))
+    return dump()
+
+
+def one_by_one(worker_ids):
+    for workerID in worker_ids:
+        assert proxy.delete_worker(workerID)
+
+
+def bulk(worker_ids):
+    assert proxy.delete_workers(worker_ids)
+
+
+retOneByOne = run('one by one', one_by_one)
+retBulk = run('bulk', bulk)
+assert retOneByOne == retBulk
+assert len(retBulk[-1]) == len(range(0, nWorkers, 10))
+clean_up()
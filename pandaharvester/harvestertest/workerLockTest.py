@@ -0,0 +1,98 @@
+import sys
+import time
+import datetime
+
+from pandaharvester.harvesterconfig import harvester_config
+from pandaharvester.harvestercore import db_proxy
+from pandaharvester.harvestercore.db_proxy import DBProxy
+from pandaharvester.harvestercore.work_spec import WorkSpec
+from pandaharvester.harvestercore.job_worker_relation_spec import JobWorkerRelationSpec
+
+# compare get_workers_to_update and get_workers_to_update_bulk on the DB defined in panda_harvester.cfg
+# usage: python workerLockTest.py [nWorkers ...]
+
+nWorkersList = [int(x) for x in sys.argv[1:]]
+if not nWorkersList:
+    nWorkersList = [10000, 100000]
+
+# offset of IDs not to collide with real workers and jobs
+idOffset = 10 ** 12
+queueName = 'HARVESTER_WORKER_LOCK_TEST'
+lockedBy = 'workerLockTest'
+
+proxy = DBProxy()
+
+# count round-trips
+nExec = [0]
+origExecute = proxy.execute
+
+
+def counting_execute(sql, varmap=None):
+    nExec[0] += 1
+    return origExecute(sql, varmap)
+
+
+proxy.execute = counting_execute
+
+
+def clean_up():
+    varMap = dict()
+    varMap[':low'] = idOffset
+    sqlW = 'DELETE FROM {0} WHERE workerID>=:low'.format(db_proxy.workTableName)
+    origExecute(sqlW, varMap)
+    sqlR = 'DELETE FROM {0} WHERE workerID>=:low'.format(db_proxy.jobWorkerTableName)
+    origExecute(sqlR, varMap)
+    proxy.commit()
+
+
+def populate(n_workers):
+    clean_up()
+    timeOld = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    sqlW = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.workTableName, WorkSpec.column_names(),
+                                              WorkSpec.bind_values_expression())
+    sqlR = 'INSERT INTO {0} ({1}) {2}'.format(db_proxy.jobWorkerTableName, JobWorkerRelationSpec.column_names(),
+                                              JobWorkerRelationSpec.bind_values_expression())
+    varMapsW = []
+    varMapsR = []
+    for i in range(n_workers):
+        workSpec = WorkSpec()
+        workSpec.workerID = idOffset + i
+        workSpec.computingSite = queueName
+        workSpec.status = WorkSpec.ST_running
+        workSpec.modificationTime = timeOld
+        # one OneToMany set of 5 workers every 100 workers
+        if i % 100 < 5:
+            workSpec.mapType = WorkSpec.MT_MultiWorkers
+            pandaID = idOffset + i - i % 100
+        else:
+            workSpec.mapType = WorkSpec.MT_OneToOne
+            pandaID = idOffset + i
+        varMapsW.append(workSpec.values_map())
+        relSpec = JobWorkerRelationSpec()
+        relSpec.PandaID = pandaID
+        relSpec.workerID = workSpec.workerID
+        varMapsR.append(relSpec.values_map())
+    proxy.executemany(sqlW, varMapsW)
+    proxy.executemany(sqlR, varMapsR)
+    proxy.commit()
+
+
+for nWorkers in nWorkersList:
+    for methodName in ['get_workers_to_update', 'get_workers_to_update_bulk']:
+        populate(nWorkers)
+        method = getattr(proxy, methodName)
+        nExec[0] = 0
+        nLocked = 0
+        sTime = time.time()
+        # lock all workers in cycles of maxWorkers like the monitor does
+        while True:
+            retVal = method(harvester_config.monitor.maxWorkers, 0, harvester_config.monitor.lockInterval, lockedBy)
+            if not retVal:
+                break
+            for configIdWorkSpecs in retVal.values():
+                for workSpecsList in configIdWorkSpecs.values():
+                    nLocked += sum([len(workSpecs) for workSpecs in workSpecsList])
+        timeConsumed = time.time() - sTime
+        print('engine={0} nWorkers={1} method={2} : locked {3} workers with {4} queries in {5:.3f} sec'.format(
+            harvester_config.db.engine, nWorkers, methodName, nLocked, nExec[0], timeConsumed))
+clean_up()